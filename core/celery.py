@@ -0,0 +1,59 @@
+"""
+Celery application for core project.
+
+Workers are started with ``celery -A core worker``; tasks are discovered from
+each installed app's ``tasks`` module and configured from the ``CELERY_*``
+settings in ``core/settings.py``.
+
+Tasks are routed (``CELERY_TASK_ROUTES``) to one queue per kind of work --
+``payments``, ``email`` and ``sweeps`` -- so each can be given
+its own workers and scaled apart from the web processes::
+
+    celery -A core worker -Q payments -c 8
+    celery -A core worker -Q email -c 4
+    celery -A core worker -Q sweeps -c 2
+
+Every task run is counted per queue, task and outcome in
+``core.metrics.TASK_RUNS`` and served at ``/metrics/``.
+"""
+
+import os
+import time
+
+from celery import Celery
+from celery.signals import task_postrun, task_prerun
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+app = Celery('core')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+
+def task_queue(name):
+    """Queue a task is routed to"""
+    return app.amqp.router.route({}, name)['queue'].name
+
+
+def task_queues():
+    """Queue of every registered project task, keyed by task name"""
+    app.loader.import_default_modules()
+    return {name: task_queue(name) for name in app.tasks if not name.startswith('celery.')}
+
+
+@task_prerun.connect
+def _start_task_timer(task=None, **kwargs):
+    task.request.metrics_started = time.perf_counter()
+
+
+@task_postrun.connect
+def _record_task_run(task=None, state=None, **kwargs):
+    from core.metrics import TASK_RUNS
+
+    started = getattr(task.request, 'metrics_started', None)
+    if started is None:
+        return
+    # Eagerly run tasks have no delivery info; fall back to the route.
+    queue = (task.request.delivery_info or {}).get('routing_key') or task_queue(task.name)
+    outcome = {'SUCCESS': 'success', 'RETRY': 'retry'}.get(state, 'failure')
+    TASK_RUNS.record(queue, task.name, outcome, time.perf_counter() - started)
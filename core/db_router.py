@@ -0,0 +1,78 @@
+"""
+Read-replica routing for core project.
+
+Reads go to the primary unless the current request opted in with
+``use_replica()`` (done by ``ReplicaRoutingMiddleware`` for safe requests
+under ``DATABASE_REPLICA_PATHS``). Payment flows therefore always read their
+own writes, while dashboard and admin listings can be served by the replica.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def use_replica():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReadReplicaRouter:
+    # Sessions and auth stay on the primary so a fresh login is always seen.
+    replica_apps = {'escrow'}
+
+    def db_for_read(self, model, **hints):
+        if (
+            _replica_reads.get()
+            and model._meta.app_label in self.replica_apps
+            and 'replica' in connections.databases
+        ):
+            return 'replica'
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica mirrors the primary, so objects from either are related.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaRoutingMiddleware:
+    # Async-capable so ASGI requests to async views stay on the event loop
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _reads_replica(self, request):
+        return request.method in ('GET', 'HEAD') and request.path.startswith(tuple(settings.DATABASE_REPLICA_PATHS))
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self._reads_replica(request):
+            with use_replica():
+                return self.get_response(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self._reads_replica(request):
+            with use_replica():
+                return await self.get_response(request)
+        return await self.get_response(request)
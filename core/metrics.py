@@ -0,0 +1,312 @@
+"""
+Request instrumentation for core project.
+
+``MetricsMiddleware`` records per-view latency and SQL query counts,
+``observe()`` times calls to external services (Paystack, SMTP) and
+``InstrumentedDjangoTemplates`` times template rendering. Everything is kept
+in an in-process registry and exposed in Prometheus text format at
+``/metrics/``; each worker process serves its own numbers, so scrape every
+process (or aggregate by instance label). Celery task throughput per queue
+is the exception: workers count it in the shared cache (``TASK_RUNS``).
+
+Requests slower than ``METRICS_SLOW_REQUEST_MS`` or running more than
+``METRICS_SLOW_REQUEST_QUERIES`` queries are logged to ``core.metrics.slow``
+with their breakdown.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import bisect
+import hmac
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger('core.metrics.slow')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+REGISTRY = []
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed set of label names"""
+
+    def __init__(self, name, documentation, labelnames, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0, 0.0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, (counts, total, value_sum) in series:
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key))
+            prefix = f'{labels},' if labels else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {total}')
+            lines.append(f'{self.name}_sum{{{labels}}} {value_sum}')
+        return lines
+
+
+class TaskCounters:
+    """Celery task runs and runtime per queue, task and outcome.
+
+    Tasks run in worker processes nobody scrapes, so the counts are kept in
+    the shared cache and every web process serves the same totals.
+    """
+
+    OUTCOMES = ('success', 'retry', 'failure')
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        REGISTRY.append(self)
+
+    def _key(self, queue, task, outcome, field):
+        return f'metrics:{self.name}:{queue}:{task}:{outcome}:{field}'
+
+    def record(self, queue, task, outcome, seconds):
+        try:
+            for field, amount in (('runs', 1), ('ms', round(seconds * 1000))):
+                key = self._key(queue, task, outcome, field)
+                cache.add(key, 0, timeout=None)
+                cache.incr(key, amount)
+        except Exception as e:
+            logger.warning('Could not record task metrics: %s', e)
+
+    def _keys(self):
+        from core.celery import task_queues
+
+        return {
+            (queue, task, outcome): (self._key(queue, task, outcome, 'runs'), self._key(queue, task, outcome, 'ms'))
+            for task, queue in task_queues().items()
+            for outcome in self.OUTCOMES
+        }
+
+    def clear(self):
+        cache.delete_many([key for pair in self._keys().values() for key in pair])
+
+    def render(self):
+        series = self._keys()
+        values = cache.get_many([key for pair in series.values() for key in pair])
+        runs = [f'# HELP {self.name}_runs_total {self.documentation}', f'# TYPE {self.name}_runs_total counter']
+        seconds = [f'# HELP {self.name}_seconds_total Time spent running tasks.', f'# TYPE {self.name}_seconds_total counter']
+        for (queue, task, outcome), (runs_key, ms_key) in sorted(series.items()):
+            if runs_key not in values:
+                continue
+            labels = f'queue="{_escape(queue)}",task="{_escape(task)}",outcome="{outcome}"'
+            runs.append(f'{self.name}_runs_total{{{labels}}} {values[runs_key]}')
+            seconds.append(f'{self.name}_seconds_total{{{labels}}} {values.get(ms_key, 0) / 1000}')
+        return runs + seconds
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+REQUEST_DURATION = Histogram(
+    'escrow_http_request_duration_seconds', 'Time spent handling a request.', ('view', 'method', 'status'),
+)
+REQUEST_QUERIES = Histogram(
+    'escrow_http_request_queries', 'SQL queries run while handling a request.', ('view',), QUERY_BUCKETS,
+)
+EXTERNAL_DURATION = Histogram(
+    'escrow_external_call_duration_seconds', 'Time spent in calls to external services.',
+    ('service', 'operation', 'outcome'),
+)
+TEMPLATE_DURATION = Histogram(
+    'escrow_template_render_duration_seconds', 'Time spent rendering templates.', ('template',),
+)
+TASK_RUNS = TaskCounters('escrow_celery_task', 'Celery tasks run, by queue and outcome.')
+
+# Per-request breakdown used for slow-request logging
+_request_stats = ContextVar('request_stats', default=None)
+
+
+def _record(kind, name, seconds):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats[kind].append((name, seconds))
+
+
+@contextmanager
+def observe(service, operation):
+    """Time a call to an external service, e.g. ``observe('paystack', 'verify')``"""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        seconds = time.perf_counter() - started
+        EXTERNAL_DURATION.observe(seconds, service=service, operation=operation, outcome=outcome)
+        _record('external', f'{service}.{operation}', seconds)
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            seconds = time.perf_counter() - started
+            name = self.origin.template_name or 'string'
+            TEMPLATE_DURATION.observe(seconds, template=name)
+            _record('templates', name, seconds)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend that times every render"""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name).template, self)
+
+
+class MetricsMiddleware:
+    # Async-capable so ASGI requests to async views stay on the event loop
+    sync_capable = True
+    async_capable = True
+
+    # Anything else is labelled "other" so junk verbs cannot mint new series
+    METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'}
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        for alias in settings.DATABASES:
+            _install_query_counter(connections[alias])
+        stats = _new_stats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self._record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        # The view's ORM calls run in sync_to_async threads, which inherit
+        # this context, so their queries are counted against this request.
+        stats = _new_stats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        self._record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def _record(self, request, response, stats, seconds):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        method = request.method if request.method in self.METHODS else 'other'
+        REQUEST_DURATION.observe(seconds, view=view, method=method, status=response.status_code)
+        REQUEST_QUERIES.observe(stats['queries'], view=view)
+
+        if (
+            seconds * 1000 >= settings.METRICS_SLOW_REQUEST_MS
+            or stats['queries'] >= settings.METRICS_SLOW_REQUEST_QUERIES
+        ):
+            slow_logger.warning(
+                'Slow request %s %s (%s): %.1fms, %d queries in %.1fms, external %s, templates %s',
+                method, request.path, view, seconds * 1000,
+                stats['queries'], stats['db_seconds'] * 1000,
+                _format_calls(stats['external']), _format_calls(stats['templates']),
+            )
+
+
+def _new_stats():
+    return {'queries': 0, 'db_seconds': 0.0, 'external': [], 'templates': []}
+
+
+def _count_query(execute, sql, params, many, context):
+    """Execute wrapper charging each query to the request in the current context"""
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats['queries'] += 1
+        stats['db_seconds'] += time.perf_counter() - started
+
+
+def _install_query_counter(connection, **kwargs):
+    """Give a connection its one permanent query counter.
+
+    Installed first in the list, so execute_wrapper() blocks entered
+    before it still pop their own wrapper.
+    """
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _count_query)
+
+
+connection_created.connect(_install_query_counter)
+
+
+def _format_calls(calls):
+    return ', '.join(f'{name}={seconds * 1000:.1f}ms' for name, seconds in calls) or '-'
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; requires METRICS_TOKEN as a bearer token.
+
+    Without a token configured it is only served with DEBUG on.
+    """
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden()
+
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4')
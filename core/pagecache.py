@@ -0,0 +1,51 @@
+"""
+Full-page caching for public pages.
+
+``cache_anonymous_page`` stores the rendered page once and serves it to
+every anonymous visitor with no flash messages waiting. Signed-in users and
+requests with pending messages get a freshly rendered page, so the stored
+copy never depends on who asked for it and is keyed by URL alone rather
+than by cookie. Responses still carry ``Vary: Cookie`` so browsers and
+proxies do not hand the anonymous page to a signed-in user.
+"""
+
+from functools import wraps
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+
+def page_cache_key(request):
+    url = request.build_absolute_uri()
+    return f'pagecache:{hashlib.md5(url.encode()).hexdigest()}'
+
+
+def _cacheable(request):
+    return (
+        settings.PAGE_CACHE_TIMEOUT
+        and request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def cache_anonymous_page(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _cacheable(request):
+            response = view(request, *args, **kwargs)
+            patch_vary_headers(response, ['Cookie'])
+            return response
+
+        key = page_cache_key(request)
+        response = cache.get(key)
+        if response is None:
+            response = view(request, *args, **kwargs)
+            patch_vary_headers(response, ['Cookie'])
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+        return response
+    return wrapper
@@ -0,0 +1,150 @@
+"""
+Sliding-window rate limiting for core project.
+
+``ratelimit()`` decorates a view with one limit; stack it for several
+(per IP, per account, per object). Limits are checked before the view
+runs, so rejected requests cost no database queries or password hashing.
+
+Hits are kept in a redis sorted set per key (``RATELIMIT_URL``), or in
+process memory with a ``locmem://`` URL for tests. If redis cannot be
+reached requests are let through rather than locking everyone out.
+"""
+
+from collections import defaultdict, deque
+from functools import wraps
+import logging
+import math
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+UNITS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """'5/15m' -> (5, 900): at most 5 hits in any 15 minute window"""
+    count, period = rate.split('/')
+    number = period[:-1] or '1'
+    return int(count), int(number) * UNITS[period[-1]]
+
+
+class LocMemRateLimiter:
+    """In-process limiter used by tests and single-process development"""
+
+    def __init__(self):
+        self._hits = defaultdict(deque)
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window, now=None):
+        """Record a hit if allowed. Returns (allowed, retry_after_seconds)."""
+        now = time.time() if now is None else now
+        with self._lock:
+            hits = self._hits[key]
+            while hits and hits[0] <= now - window:
+                hits.popleft()
+            if len(hits) >= limit:
+                return False, hits[0] + window - now
+            hits.append(now)
+            return True, 0
+
+    def clear(self):
+        with self._lock:
+            self._hits.clear()
+
+
+class RedisRateLimiter:
+    """Limiter backed by redis sorted sets shared by all web processes"""
+
+    # Trim, count and add atomically so concurrent requests cannot overshoot.
+    SCRIPT = """
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1] - ARGV[2])
+    if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+        return redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')[2]
+    end
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[4])
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return false
+    """
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def hit(self, key, limit, window, now=None):
+        now = time.time() if now is None else now
+        oldest = self.script(keys=[f'ratelimit:{key}'], args=[now, window, limit, uuid.uuid4().hex])
+        if oldest is None:
+            return True, 0
+        return False, float(oldest) + window - now
+
+
+_limiters = {}
+
+
+def get_limiter():
+    url = settings.RATELIMIT_URL
+    if url not in _limiters:
+        _limiters[url] = LocMemRateLimiter() if url.startswith('locmem://') else RedisRateLimiter(url)
+    return _limiters[url]
+
+
+def client_ip(request, **kwargs):
+    """The client address from RATELIMIT_IP_META.
+
+    For a forwarded-for list, each proxy appends the address it received the
+    request from, so only the last RATELIMIT_TRUSTED_PROXIES entries can be
+    trusted; earlier ones are whatever the client sent. The entry that many
+    hops from the right is the client's.
+    """
+    addresses = [address.strip() for address in request.META.get(settings.RATELIMIT_IP_META, '').split(',')]
+    return addresses[max(len(addresses) - settings.RATELIMIT_TRUSTED_PROXIES, 0)]
+
+
+def post_field(name):
+    """Key on a submitted form field, case-insensitively (e.g. an email)"""
+    def key(request, **kwargs):
+        return (request.POST.get(name) or '').strip().lower()
+    return key
+
+
+def view_kwarg(name):
+    """Key on a URL parameter, e.g. the transaction being confirmed"""
+    def key(request, **kwargs):
+        return str(kwargs.get(name) or '')
+    return key
+
+
+def ratelimit(scope, key, rate, methods=('POST',)):
+    """Allow at most `rate` requests per key(request, **kwargs) within `scope`.
+
+    Requests with other methods, or for which key() is empty, are not
+    counted. Over the limit the view is not called and a 429 is returned.
+    """
+    limit, window = parse_rate(rate)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if settings.RATELIMIT_ENABLED and request.method in methods:
+                value = key(request, **kwargs)
+                if value:
+                    try:
+                        allowed, retry_after = get_limiter().hit(f'{scope}:{value}', limit, window)
+                    except Exception as e:
+                        logger.warning('Rate limiter unavailable, allowing request: %s', e)
+                        allowed = True
+                    if not allowed:
+                        logger.info('Rate limit %s exceeded for %s', scope, value)
+                        response = HttpResponse('Too many attempts. Please try again later.', status=429)
+                        response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                        return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
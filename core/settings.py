@@ -10,9 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
+import sys
 
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -29,6 +31,8 @@ DEBUG = config('DEBUG', default=True, cast=bool)
 
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost,127.0.0.1').split(',')
 
+TESTING = 'test' in sys.argv
+
 
 # Application definition
 
@@ -52,6 +56,8 @@ DJANGO_VITE = {
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.metrics.MetricsMiddleware',
+    'core.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -67,7 +73,7 @@ ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.InstrumentedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -82,19 +88,106 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
+ASGI_APPLICATION = 'core.asgi.application'
+
+# Serve payment_page and paystack_callback as async views (use with ASGI)
+ASYNC_PAYMENT_VIEWS = config('ASYNC_PAYMENT_VIEWS', default=False, cast=bool)
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
+# DB_ENGINE=postgres switches to PostgreSQL; SQLite's single writer lock
+# serializes concurrent payment callbacks, so use it for development only.
+
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='escrow'),
+            'USER': config('DB_USER', default='escrow'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            # Keep connections open between requests and check them before reuse
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+            },
+        }
+    }
+
+    # Connection pooling (psycopg 3 with psycopg_pool, both in the
+    # requirements) replaces persistent connections.
+    DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=0, cast=int)
+    if DB_POOL_MAX_SIZE:
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+        }
+
+    # Optional streaming replica for dashboard and admin reads
+    DB_REPLICA_HOST = config('DB_REPLICA_HOST', default='')
+    if DB_REPLICA_HOST:
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+            'HOST': DB_REPLICA_HOST,
+            'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+
+DATABASE_ROUTERS = ['core.db_router.ReadReplicaRouter']
+
+# GET requests under these paths read from the replica, when one is configured
+DATABASE_REPLICA_PATHS = ['/dashboard/', '/admin/']
+
+
+# Cache
+# Set CACHE_URL (e.g. redis://localhost:6379/2) to share the cache between
+# processes. Transaction snapshot invalidation, the payment-initialization
+# and payout locks and the task counters all rely on every web and Celery
+# process seeing the same cache, so it is required unless DEBUG is on; the
+# per-process in-memory cache is only for development and tests.
+
+CACHE_URL = config('CACHE_URL', default='')
+
+if not CACHE_URL and not DEBUG and not TESTING:
+    raise ImproperlyConfigured('CACHE_URL must point at a shared cache (e.g. redis) when DEBUG is off.')
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+        'KEY_PREFIX': 'escrow',
+    } if CACHE_URL and not TESTING else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
 
+# Sessions and flash messages
+# With a shared cache, 'cached_db' serves session reads from redis and only
+# writes to the database when a session changes. Flash messages travel in a
+# signed cookie, so buyers who never sign in never get a session row.
+
+SESSION_BACKEND = config('SESSION_BACKEND', default='cached_db' if CACHE_URL else 'db')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_BACKEND}'
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -114,6 +207,11 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+if TESTING:
+    # Fast hashing keeps user fixtures from dominating test and benchmark runs
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -143,10 +241,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = '/'
 LOGIN_URL = '/login/'
 
+# Sellers sign in with their email; usernames still work for the admin.
+AUTHENTICATION_BACKENDS = [
+    'escrow.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 # Paystack Configuration
 PAYSTACK_SECRET_KEY = config('PAYSTACK_SECRET_KEY', default='')
 PAYSTACK_PUBLIC_KEY = config('PAYSTACK_PUBLIC_KEY', default='')
 PAYSTACK_WEBHOOK_SECRET = config('PAYSTACK_WEBHOOK_SECRET', default='')
+PAYSTACK_BASE_URL = config('PAYSTACK_BASE_URL', default='https://api.paystack.co')
+PAYSTACK_CONNECT_TIMEOUT = config('PAYSTACK_CONNECT_TIMEOUT', default=3.05, cast=float)
+PAYSTACK_READ_TIMEOUT = config('PAYSTACK_READ_TIMEOUT', default=10, cast=float)
+PAYSTACK_MAX_RETRIES = config('PAYSTACK_MAX_RETRIES', default=2, cast=int)
+PAYSTACK_BREAKER_THRESHOLD = config('PAYSTACK_BREAKER_THRESHOLD', default=5, cast=int)
+PAYSTACK_BREAKER_RESET_TIMEOUT = config('PAYSTACK_BREAKER_RESET_TIMEOUT', default=30, cast=float)
 
 # Site Configuration
 SITE_URL = config('SITE_URL', default='http://localhost:8000')
@@ -158,4 +268,109 @@ EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
-DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@escrow.com')
\ No newline at end of file
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@escrow.com')
+
+# Outbound email delivery: 'queue' hands confirmation codes to a Celery worker
+# that drains the outbox in batches, 'sync' sends inline in the request.
+EMAIL_DELIVERY_MODE = config('EMAIL_DELIVERY_MODE', default='queue')
+EMAIL_OUTBOX_URL = config('EMAIL_OUTBOX_URL', default='locmem://' if TESTING else 'redis://localhost:6379/1')
+EMAIL_BATCH_SIZE = config('EMAIL_BATCH_SIZE', default=50, cast=int)
+EMAIL_BATCH_DELAY = config('EMAIL_BATCH_DELAY', default=2, cast=int)
+# Longest a single drain may run; it holds the outbox lock for this long and
+# is killed past it so a stuck worker cannot keep its batch forever.
+EMAIL_DRAIN_TIMEOUT = config('EMAIL_DRAIN_TIMEOUT', default=300, cast=int)
+
+# Celery Configuration
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/0')
+CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default=None)
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=TESTING, cast=bool)
+CELERY_TASK_EAGER_PROPAGATES = TESTING
+CELERY_TIMEZONE = TIME_ZONE
+# Each kind of work has its own queue so it can get its own workers, e.g.
+# `celery -A core worker -Q payments -c 8` and `-Q sweeps -c 2`.
+# On redis, lower priority numbers are consumed first by workers that
+# listen on several queues.
+CELERY_TASK_ROUTES = {
+    'escrow.tasks.verify_payment': {'queue': 'payments', 'priority': 0},
+    'escrow.tasks.pay_out_sellers': {'queue': 'payments', 'priority': 0},
+    'escrow.tasks.reconcile_payments': {'queue': 'payments', 'priority': 0},
+    'escrow.tasks.drain_email_outbox': {'queue': 'email', 'priority': 3},
+    'escrow.tasks.sweep_expired_escrows': {'queue': 'sweeps', 'priority': 6},
+    'escrow.tasks.snapshot_seller_balances': {'queue': 'sweeps', 'priority': 6},
+    'escrow.tasks.clear_expired_sessions': {'queue': 'sweeps', 'priority': 6},
+}
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
+    # Unacknowledged (acks-late) tasks are redelivered after this long, so it
+    # must exceed the longest task runtime and retry countdown.
+    'visibility_timeout': 60 * 60,
+}
+# Payment tasks acknowledge late; don't let a worker hoard tasks it has not started.
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_BEAT_SCHEDULE = {
+    'drain-email-outbox': {
+        'task': 'escrow.tasks.drain_email_outbox',
+        'schedule': 60.0,
+    },
+    'sweep-expired-escrows': {
+        'task': 'escrow.tasks.sweep_expired_escrows',
+        'schedule': 15 * 60.0,
+    },
+    'pay-out-sellers': {
+        'task': 'escrow.tasks.pay_out_sellers',
+        'schedule': 60 * 60.0,
+    },
+    'reconcile-payments': {
+        'task': 'escrow.tasks.reconcile_payments',
+        'schedule': 60 * 60.0,
+    },
+    'snapshot-seller-balances': {
+        'task': 'escrow.tasks.snapshot_seller_balances',
+        'schedule': 60 * 60.0,
+    },
+    'clear-expired-sessions': {
+        'task': 'escrow.tasks.clear_expired_sessions',
+        'schedule': 24 * 60 * 60.0,
+    },
+}
+
+# Seconds before a payment the buyer's callback could not verify is checked again
+ESCROW_VERIFY_RETRY_DELAY = config('ESCROW_VERIFY_RETRY_DELAY', default=60, cast=int)
+
+# Paystack reconciliation: hours of charges re-listed each run (overlapping
+# the hourly schedule) and charges per list page (Paystack allows up to 100)
+ESCROW_RECONCILE_WINDOW_HOURS = config('ESCROW_RECONCILE_WINDOW_HOURS', default=3, cast=int)
+ESCROW_RECONCILE_PAGE_SIZE = config('ESCROW_RECONCILE_PAGE_SIZE', default=100, cast=int)
+
+# Expiry sweep
+ESCROW_SWEEP_CHUNK_SIZE = config('ESCROW_SWEEP_CHUNK_SIZE', default=1000, cast=int)
+ESCROW_REFUND_CONCURRENCY = config('ESCROW_REFUND_CONCURRENCY', default=4, cast=int)
+
+# Seller payouts (Paystack accepts at most 100 transfers per bulk call)
+ESCROW_PAYOUT_BATCH_SIZE = config('ESCROW_PAYOUT_BATCH_SIZE', default=100, cast=int)
+
+# Bulk payment-link uploads
+ESCROW_BULK_CHUNK_SIZE = config('ESCROW_BULK_CHUNK_SIZE', default=500, cast=int)
+ESCROW_BULK_MAX_ROWS = config('ESCROW_BULK_MAX_ROWS', default=50000, cast=int)
+
+# Streaming exports
+ESCROW_EXPORT_CHUNK_SIZE = config('ESCROW_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Seconds anonymous copies of public pages (home, confirmation) are cached
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=300, cast=int)
+
+# Request metrics (served at /metrics/ to holders of METRICS_TOKEN; without
+# a token only when DEBUG is on)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_SLOW_REQUEST_MS = config('METRICS_SLOW_REQUEST_MS', default=500, cast=int)
+METRICS_SLOW_REQUEST_QUERIES = config('METRICS_SLOW_REQUEST_QUERIES', default=20, cast=int)
+
+# Rate limiting for confirmation codes and sign-in
+RATELIMIT_ENABLED = config('RATELIMIT_ENABLED', default=True, cast=bool)
+RATELIMIT_URL = config('RATELIMIT_URL', default='locmem://' if TESTING else 'redis://localhost:6379/3')
+# Behind a proxy, e.g. HTTP_X_FORWARDED_FOR, with RATELIMIT_TRUSTED_PROXIES set
+# to the number of proxies that append to it (the client controls the rest)
+RATELIMIT_IP_META = config('RATELIMIT_IP_META', default='REMOTE_ADDR')
+RATELIMIT_TRUSTED_PROXIES = config('RATELIMIT_TRUSTED_PROXIES', default=1, cast=int)
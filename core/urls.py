@@ -18,8 +18,11 @@ from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
+from core.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('escrow.urls')),
     path('accounts/', include('django.contrib.auth.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
@@ -1,14 +1,66 @@
 from django.contrib import admin
-from .models import Seller, EscrowTransaction
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .models import Seller, EscrowTransaction, Payout
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that trusts PostgreSQL's row estimate for big unfiltered tables.
+
+    COUNT(*) over millions of rows scans the whole table on every changelist
+    page. Without filters or a search the planner's estimate is close enough
+    to number the pages; smaller tables and filtered lists are counted exactly.
+    """
+    ESTIMATE_THRESHOLD = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.ESTIMATE_THRESHOLD:
+                return row[0]
+        return super().count
+
 
 @admin.register(Seller)
 class SellerAdmin(admin.ModelAdmin):
     list_display = ['user', 'phone', 'created_at']
+    list_select_related = ['user']
     search_fields = ['user__username', 'phone']
 
 @admin.register(EscrowTransaction)
 class EscrowTransactionAdmin(admin.ModelAdmin):
     list_display = ['product_name', 'seller', 'status', 'total_amount', 'created_at']
     list_filter = ['status', 'created_at']
-    search_fields = ['product_name', 'seller__user__username']
-    readonly_fields = ['id', 'created_at', 'paid_at', 'confirmed_at']
+    list_select_related = ['seller__user']
+    # product_name is matched by a trigram index on PostgreSQL; the other
+    # fields are exact matches served by unique/btree indexes.
+    search_fields = ['product_name', 'seller__user__username__exact', 'paystack_reference__exact']
+    date_hierarchy = 'created_at'
+    ordering = ['-created_at', '-id']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ['seller', 'logistics_payout', 'product_payout']
+    readonly_fields = ['id', 'total_amount', 'platform_fee', 'seller_amount', 'created_at', 'paid_at', 'confirmed_at']
+
+    @admin.display(description='Total amount', ordering='total_kobo')
+    def total_amount(self, obj):
+        return obj.total_amount
+
+@admin.register(Payout)
+class PayoutAdmin(admin.ModelAdmin):
+    list_display = ['id', 'seller', 'amount', 'status', 'created_at', 'completed_at']
+    list_filter = ['status', 'created_at']
+    list_select_related = ['seller__user']
+    search_fields = ['id', 'transfer_code', 'seller__user__username']
+    raw_id_fields = ['seller']
+    readonly_fields = ['id', 'created_at', 'submitted_at', 'completed_at']
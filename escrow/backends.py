@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models.functions import Lower
+
+
+def users_with_email(email):
+    """Users whose email matches case-insensitively, via the LOWER(email) index.
+
+    The exclude() repeats the partial index's condition so the planner can
+    use it.
+    """
+    return get_user_model().objects.alias(email_lower=Lower('email')).filter(
+        email_lower=(email or '').lower()
+    ).exclude(email='')
+
+
+class EmailBackend(ModelBackend):
+    """Authenticate with email and password in one indexed user lookup"""
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if not email or password is None:
+            return None
+
+        user = users_with_email(email).first()
+        if user is None:
+            # Hash anyway so response time does not reveal unknown emails.
+            get_user_model()().set_password(password)
+            return None
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
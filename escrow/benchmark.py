@@ -0,0 +1,251 @@
+"""
+End-to-end benchmark of the payment lifecycle.
+
+Each iteration drives create -> pay -> callback -> confirm -> dashboard
+through the Django test client against a local fake Paystack, recording
+latency and SQL query count per step. Query counts are deterministic, so
+they are compared against a stored baseline: a change that adds queries to
+a step (an N+1 on the dashboard, say) fails the run.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import math
+from pathlib import Path
+import statistics
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connections
+from django.test import Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.pagecache import page_cache_key
+from services.fake_paystack import FakePaystack
+from .models import EscrowTransaction, Seller
+
+BASELINE_PATH = Path(__file__).with_name('benchmark_baseline.json')
+
+TRANSACTION_CONTROL = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+STEPS = [
+    'create_payment_link',
+    'payment_page',
+    'payment_initialize',
+    'payment_reinitialize',
+    'paystack_callback',
+    'confirm_delivery_page',
+    'confirm_delivery',
+    'seller_dashboard',
+]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class Recorder:
+    """Collects (latency, queries) samples per step from many threads"""
+
+    def __init__(self):
+        self.samples = {step: [] for step in STEPS}
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def measure(self, step, call, expected_status=200):
+        with CaptureQueriesContext(connections['default']) as queries:
+            started = time.perf_counter()
+            response = call()
+            latency = time.perf_counter() - started
+
+        # Transaction control differs by backend and by whether we are already
+        # in a transaction (as under TestCase), so only count statements.
+        count = sum(1 for query in queries if not query['sql'].startswith(TRANSACTION_CONTROL))
+        with self._lock:
+            self.samples[step].append((latency, count))
+            if response.status_code != expected_status:
+                self.errors.append(f'{step}: HTTP {response.status_code}')
+        return response
+
+    def summary(self, elapsed):
+        steps = {}
+        for step, samples in self.samples.items():
+            if not samples:
+                continue
+            latencies = [latency for latency, _ in samples]
+            counts = [count for _, count in samples]
+            steps[step] = {
+                'requests': len(samples),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+                'mean_queries': round(statistics.mean(counts), 2),
+                'max_queries': max(counts),
+            }
+        requests = sum(step['requests'] for step in steps.values())
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(requests / elapsed, 1) if elapsed else 0,
+            'errors': self.errors,
+            'steps': steps,
+        }
+
+
+def _make_seller():
+    user = User.objects.create_user(username=f'bench-{uuid.uuid4().hex[:12]}')
+    Seller.objects.create(user=user, phone='00000000000', bank_account='0000000000')
+    return user
+
+
+def _lifecycle(recorder, paystack, seller_client, buyer_client):
+    response = recorder.measure('create_payment_link', lambda: seller_client.post(reverse('create_payment_link'), {
+        'product_name': 'Benchmark sneakers',
+        'product_price': '10000.00',
+        'logistics_fee': '1500.00',
+        'buyer_email': 'buyer@example.com',
+    }), expected_status=302)
+    transaction_id = response.url.rstrip('/').rsplit('/', 1)[-1]
+
+    pay_url = reverse('payment_page', args=[transaction_id])
+    recorder.measure('payment_page', lambda: buyer_client.get(pay_url))
+    recorder.measure('payment_initialize', lambda: buyer_client.post(pay_url), expected_status=302)
+    # A reload or double-click reuses the stored checkout link
+    recorder.measure('payment_reinitialize', lambda: buyer_client.post(pay_url), expected_status=302)
+
+    paystack.charge(transaction_id)
+    recorder.measure('paystack_callback', lambda: buyer_client.get(
+        reverse('paystack_callback'), {'reference': transaction_id}
+    ), expected_status=302)
+
+    confirm_url = reverse('confirm_delivery', args=[transaction_id])
+    code = EscrowTransaction.objects.values_list('confirmation_code', flat=True).get(pk=transaction_id)
+    recorder.measure('confirm_delivery_page', lambda: buyer_client.get(confirm_url))
+    recorder.measure('confirm_delivery', lambda: buyer_client.post(
+        confirm_url, {'confirmation_code': code}
+    ), expected_status=302)
+
+    recorder.measure('seller_dashboard', lambda: seller_client.get(reverse('seller_dashboard')))
+
+
+def run_benchmark(iterations=20, concurrency=1):
+    """Run the lifecycle `iterations` times on `concurrency` threads.
+
+    With concurrency > 1 each thread uses its own database connection, so
+    only use it against a real (non-test-transaction) database.
+    """
+    recorder = Recorder()
+    local = threading.local()
+    users = []
+    users_lock = threading.Lock()
+
+    def clients():
+        if not hasattr(local, 'seller_client'):
+            user = _make_seller()
+            with users_lock:
+                users.append(user)
+            local.seller_client = Client(SERVER_NAME='localhost')
+            local.seller_client.force_login(user)
+            local.buyer_client = Client(SERVER_NAME='localhost')
+        return local.seller_client, local.buyer_client
+
+    with FakePaystack() as paystack, override_settings(
+        PAYSTACK_BASE_URL=paystack.url,
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        EMAIL_DELIVERY_MODE='sync',
+        RATELIMIT_ENABLED=False,  # every simulated buyer shares one address
+    ):
+        def iteration(_):
+            _lifecycle(recorder, paystack, *clients())
+
+        started = time.perf_counter()
+        try:
+            if concurrency == 1:
+                for i in range(iterations):
+                    iteration(i)
+            else:
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    list(pool.map(iteration, range(iterations)))
+        finally:
+            elapsed = time.perf_counter() - started
+            for user in users:
+                user.delete()
+
+    return recorder.summary(elapsed)
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(summary, path=BASELINE_PATH):
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def query_regressions(summary, baseline):
+    """Steps whose worst-case query count grew past the baseline"""
+    regressions = []
+    for step, result in summary['steps'].items():
+        allowed = baseline['steps'].get(step, {}).get('max_queries')
+        if allowed is not None and result['max_queries'] > allowed:
+            regressions.append(f"{step}: {result['max_queries']} queries (baseline {allowed})")
+    return regressions
+
+
+RENDER_PAGES = ['home', 'confirmation_success']
+RENDER_FRAGMENTS = [('site_header', [False]), ('site_header', [True]), ('site_footer', []), ('home_content', [])]
+
+# (name, fragment cache, page cache); each adds one layer on top of the
+# project's template settings
+RENDER_SCENARIOS = [
+    ('baseline', False, False),
+    ('+ fragment cache', True, False),
+    ('+ page cache', True, True),
+]
+
+
+def _clear_render_caches(fragments=True, pages=True):
+    keys = []
+    if fragments:
+        keys += [make_template_fragment_key(name, vary_on) for name, vary_on in RENDER_FRAGMENTS]
+    if pages:
+        factory = RequestFactory(SERVER_NAME='localhost')
+        keys += [page_cache_key(factory.get(reverse(page))) for page in RENDER_PAGES]
+    cache.delete_many(keys)
+
+
+def run_render_benchmark(iterations=200):
+    """Anonymous render latency of the public pages as each caching layer is added"""
+    client = Client(SERVER_NAME='localhost')
+    results = {}
+
+    for name, fragments, page in RENDER_SCENARIOS:
+        results[name] = {}
+        timeout = settings.PAGE_CACHE_TIMEOUT if page else 0
+        with override_settings(PAGE_CACHE_TIMEOUT=timeout, RATELIMIT_ENABLED=False):
+            _clear_render_caches()
+            for page_name in RENDER_PAGES:
+                url = reverse(page_name)
+                client.get(url)  # warm up
+                latencies = []
+                for _ in range(iterations):
+                    _clear_render_caches(fragments=not fragments, pages=not page)
+                    started = time.perf_counter()
+                    client.get(url)
+                    latencies.append(time.perf_counter() - started)
+                results[name][page_name] = {
+                    'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+                    'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+                }
+        _clear_render_caches()
+
+    return results
@@ -0,0 +1,102 @@
+"""
+Bulk payment-link creation for high-volume sellers.
+
+Uploads are CSV (a header row naming EscrowTransactionForm fields) or JSON
+Lines (one object per line). Rows are read lazily, validated with
+EscrowTransactionForm and inserted with bulk_create one chunk at a time,
+each chunk in its own transaction, so memory stays flat however large the
+upload is. A row's result is yielded once its chunk has committed.
+"""
+
+import codecs
+import csv
+from itertools import islice
+import json
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.urls import reverse
+
+from .forms import EscrowTransactionForm
+from .models import EscrowTransaction, TransactionEvent
+
+RESULT_FIELDS = ['row', 'status', 'id', 'payment_url', 'errors']
+
+
+def upload_format(content_type, name=''):
+    """'jsonl' for JSON uploads, otherwise 'csv'"""
+    if 'json' in (content_type or '') or name.endswith(('.json', '.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+
+def iter_rows(stream, fmt):
+    """Yield (data, error) for each row of a binary line-iterable stream"""
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+
+    if fmt == 'csv':
+        for data in csv.DictReader(lines):
+            yield data, None
+        return
+
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield None, f'Invalid JSON: {e}'
+            continue
+        if isinstance(data, dict):
+            yield data, None
+        else:
+            yield None, 'Each line must be a JSON object.'
+
+
+def _error(number, errors):
+    return {'row': number, 'status': 'error', 'id': None, 'payment_url': None, 'errors': errors}
+
+
+def create_payment_links(seller, rows, chunk_size=None, max_rows=None):
+    """Validate and insert (data, error) rows for `seller`, yielding per-row results"""
+    chunk_size = chunk_size or settings.ESCROW_BULK_CHUNK_SIZE
+    max_rows = max_rows or settings.ESCROW_BULK_MAX_ROWS
+    numbered = enumerate(islice(rows, max_rows + 1), start=1)
+
+    while chunk := list(islice(numbered, chunk_size)):
+        results, instances = [], []
+        truncated = False
+
+        for number, (data, error) in chunk:
+            if number > max_rows:
+                truncated = True
+                break
+            if error:
+                results.append(_error(number, {'__all__': [error]}))
+                continue
+
+            form = EscrowTransactionForm(data)
+            if not form.is_valid():
+                results.append(_error(number, {field: list(errors) for field, errors in form.errors.items()}))
+                continue
+
+            instance = form.save(commit=False)
+            instance.seller = seller
+            instances.append(instance)
+            results.append({
+                'row': number,
+                'status': 'created',
+                'id': str(instance.id),
+                'payment_url': reverse('payment_page', args=[instance.id]),
+                'errors': None,
+            })
+
+        if instances:
+            with db_transaction.atomic():
+                EscrowTransaction.objects.bulk_create(instances)
+                TransactionEvent.objects.bulk_create(map(TransactionEvent.created, instances))
+        yield from results
+
+        if truncated:
+            yield _error(max_rows + 1, {'__all__': [f'Uploads are limited to {max_rows} rows.']})
+            return
@@ -0,0 +1,53 @@
+"""
+Streaming exports of escrow transactions.
+
+Rows are read with values_list().iterator(chunk_size) (a server-side
+cursor on PostgreSQL), and amounts are the stored kobo columns. No model instances are built and no more than one chunk is
+held in memory, so an export of millions of rows starts sending at once.
+
+Values are returned as stored; the CSV writer (streaming.csv_lines) quotes
+text that a spreadsheet would run as a formula, while JSONL keeps it raw.
+"""
+
+from django.conf import settings
+
+from .money import kobo_to_naira
+
+EXPORT_FIELDS = [
+    'id', 'seller_id', 'product_name', 'status', 'product_price', 'logistics_fee',
+    'total_amount', 'platform_fee', 'seller_amount', 'buyer_email',
+    'created_at', 'paid_at', 'confirmed_at', 'refunded_at',
+]
+
+_COLUMNS = [
+    'id', 'seller_id', 'product_name', 'status', 'price_kobo', 'logistics_kobo',
+    'total_kobo', 'fee_kobo', 'net_kobo', 'buyer_email',
+    'created_at', 'paid_at', 'confirmed_at', 'refunded_at',
+]
+_KOBO_COLUMNS = {index for index, name in enumerate(_COLUMNS) if name.endswith('_kobo')}
+
+
+def _format(value, index):
+    if index in _KOBO_COLUMNS:
+        return kobo_to_naira(value)
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def export_rows(queryset, chunk_size=None):
+    """Yield one list of EXPORT_FIELDS values per transaction, oldest first"""
+    rows = (
+        queryset.order_by('created_at', 'id')
+        .values_list(*_COLUMNS)
+        .iterator(chunk_size=chunk_size or settings.ESCROW_EXPORT_CHUNK_SIZE)
+    )
+    for row in rows:
+        yield [_format(value, index) for index, value in enumerate(row)]
+
+
+def export_dicts(queryset, chunk_size=None):
+    for row in export_rows(queryset, chunk_size):
+        yield dict(zip(EXPORT_FIELDS, row))
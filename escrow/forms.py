@@ -1,8 +1,11 @@
 from .models import EscrowTransaction, Seller
+from .money import NairaField
+from datetime import datetime, time, timedelta
 import random
 from django import forms
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
+from django.utils import timezone
 
 class UserRegForm(UserCreationForm):
     class Meta:
@@ -11,6 +14,10 @@ class UserRegForm(UserCreationForm):
 
 
 class EscrowTransactionForm(forms.ModelForm):
+    # Entered in naira, cleaned to integer kobo
+    product_price = NairaField(max_digits=10, min_value=0, widget=forms.NumberInput(attrs={'class': 'form-control'}))
+    logistics_fee = NairaField(max_digits=10, min_value=0, widget=forms.NumberInput(attrs={'class': 'form-control'}))
+
     class Meta:
         model = EscrowTransaction
         fields = [
@@ -19,11 +26,16 @@ class EscrowTransactionForm(forms.ModelForm):
         ]
         widgets = {
             'product_name': forms.TextInput(attrs={'class': 'form-control'}),
-            'product_price': forms.NumberInput(attrs={'class': 'form-control'}),
-            'logistics_fee': forms.NumberInput(attrs={'class': 'form-control'}),
             'buyer_phone': forms.TextInput(attrs={'class': 'form-control'}),
             'buyer_email': forms.EmailInput(attrs={'class': 'form-control'}),
         }
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name, attname in (('product_price', 'price_kobo'), ('logistics_fee', 'logistics_kobo')):
+            if cleaned_data.get(name) is not None:
+                setattr(self.instance, attname, cleaned_data[name])
+        return cleaned_data
 class SellerRegistrationForm(forms.ModelForm):
     class Meta:
         model = Seller
@@ -42,4 +54,28 @@ class PaymentForm(forms.Form):
         code = self.cleaned_data.get('confirmation_code')
         if not code.isdigit():
             raise forms.ValidationError("Confirmation code must be numeric.")
-        return code
\ No newline at end of file
+        return code
+
+class TransactionFilterForm(forms.Form):
+    status = forms.ChoiceField(
+        choices=[('', 'All statuses')] + EscrowTransaction.STATUS_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+
+    def filter(self, queryset):
+        """Apply the cleaned filters as index-friendly range lookups"""
+        data = self.cleaned_data
+        if data.get('status'):
+            queryset = queryset.filter(status=data['status'])
+        if data.get('date_from'):
+            queryset = queryset.filter(created_at__gte=_start_of_day(data['date_from']))
+        if data.get('date_to'):
+            queryset = queryset.filter(created_at__lt=_start_of_day(data['date_to'] + timedelta(days=1)))
+        return queryset
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
@@ -0,0 +1,89 @@
+"""
+Seller balances from the transaction event ledger.
+
+Every status change appends a TransactionEvent moving the transaction's
+net amount from one balance bucket to another; an amount edit moves the old
+amount out and the new one in. A balance is the latest
+SellerBalanceSnapshot plus the events after it, so reading one costs two
+indexed queries however long the seller's history is. Snapshots are taken
+periodically by take_balance_snapshots().
+"""
+
+from datetime import timedelta
+
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import EscrowTransactionQuerySet, Seller, SellerBalanceSnapshot, TransactionEvent
+from .money import kobo_to_naira
+
+BUCKETS = EscrowTransactionQuerySet.STATUS_BUCKETS
+
+# Events younger than this may still be committing out of id order, so
+# snapshots stop short of them.
+SNAPSHOT_LAG = timedelta(minutes=1)
+
+
+def _fold(events):
+    """Kobo and count deltas per bucket over an event queryset, in one query"""
+    aggregates = {'last_event_id': Max('id')}
+    for bucket, statuses in BUCKETS.items():
+        entered, left = Q(to_status__in=statuses), Q(from_status__in=statuses)
+        aggregates[f'{bucket}_in'] = Coalesce(Sum('net_kobo', filter=entered), 0)
+        aggregates[f'{bucket}_out'] = Coalesce(Sum('net_kobo', filter=left), 0)
+        aggregates[f'{bucket}_entered'] = Count('id', filter=entered)
+        aggregates[f'{bucket}_left'] = Count('id', filter=left)
+
+    result = events.aggregate(**aggregates)
+    deltas = {'last_event_id': result['last_event_id']}
+    for bucket in BUCKETS:
+        deltas[f'{bucket}_kobo'] = result[f'{bucket}_in'] - result[f'{bucket}_out']
+        deltas[f'{bucket}_count'] = result[f'{bucket}_entered'] - result[f'{bucket}_left']
+    return deltas
+
+
+def _latest_snapshot(seller_id):
+    return SellerBalanceSnapshot.objects.filter(seller_id=seller_id).order_by('-last_event_id').first()
+
+
+def _balance_kobo(seller_id, until=None):
+    snapshot = _latest_snapshot(seller_id)
+    events = TransactionEvent.objects.filter(seller_id=seller_id)
+    if snapshot:
+        events = events.filter(id__gt=snapshot.last_event_id)
+    if until is not None:
+        # Fold by id so no committed event is skipped, up to the newest one
+        # old enough that every lower id has committed.
+        bound = events.filter(created_at__lt=until).aggregate(bound=Max('id'))['bound']
+        events = events.filter(id__lte=bound or 0)
+
+    deltas = _fold(events)
+    balance = {'last_event_id': deltas['last_event_id'] or (snapshot.last_event_id if snapshot else 0)}
+    for bucket in BUCKETS:
+        for suffix in ('kobo', 'count'):
+            field = f'{bucket}_{suffix}'
+            balance[field] = (getattr(snapshot, field) if snapshot else 0) + deltas[field]
+    return balance, deltas['last_event_id'] is not None
+
+
+def seller_balance(seller_id):
+    """Net amounts and counts per status bucket, shaped like QuerySet.totals()"""
+    balance, _ = _balance_kobo(seller_id)
+    result = {}
+    for bucket in BUCKETS:
+        result[bucket] = kobo_to_naira(balance[f'{bucket}_kobo'])
+        result[f'{bucket}_count'] = balance[f'{bucket}_count']
+    return result
+
+
+def take_balance_snapshots(now=None):
+    """Snapshot every seller with events since their last snapshot. Returns the count taken."""
+    until = (now or timezone.now()) - SNAPSHOT_LAG
+    taken = 0
+    for seller_id in Seller.objects.order_by('pk').values_list('pk', flat=True).iterator():
+        balance, changed = _balance_kobo(seller_id, until=until)
+        if changed:
+            SellerBalanceSnapshot.objects.create(seller_id=seller_id, **balance)
+            taken += 1
+    return taken
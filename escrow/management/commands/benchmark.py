@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from escrow.benchmark import BASELINE_PATH, load_baseline, query_regressions, run_benchmark, save_baseline
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the create -> pay -> callback -> confirm lifecycle and fail if any '
+        'step runs more SQL queries than the stored baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Lifecycles to run')
+        parser.add_argument('--concurrency', type=int, default=1, help='Concurrent client threads')
+        parser.add_argument('--baseline', default=str(BASELINE_PATH), help='Baseline JSON file')
+        parser.add_argument('--save-baseline', action='store_true', help='Store this run as the new baseline')
+
+    def handle(self, *args, **options):
+        summary = run_benchmark(options['iterations'], options['concurrency'])
+
+        self.stdout.write(f"{'step':<24}{'p50 ms':>10}{'p99 ms':>10}{'queries':>10}")
+        for step, result in summary['steps'].items():
+            self.stdout.write(
+                f"{step:<24}{result['p50_ms']:>10}{result['p99_ms']:>10}{result['max_queries']:>10}"
+            )
+        self.stdout.write(f"throughput: {summary['throughput_rps']} req/s over {summary['elapsed_s']}s")
+
+        if summary['errors']:
+            raise CommandError(f"{len(summary['errors'])} failed request(s): {summary['errors'][:5]}")
+
+        if options['save_baseline']:
+            save_baseline(summary, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        try:
+            baseline = load_baseline(options['baseline'])
+        except FileNotFoundError:
+            self.stdout.write(self.style.WARNING('No baseline found; run with --save-baseline to create one.'))
+            return
+
+        regressions = query_regressions(summary, baseline)
+        if regressions:
+            raise CommandError('Query count regression:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Query counts within baseline.'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from escrow.benchmark import RENDER_PAGES, run_render_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Compare anonymous render times of the public pages with and without each caching layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Requests per page and scenario')
+
+    def handle(self, *args, **options):
+        results = run_render_benchmark(options['iterations'])
+
+        self.stdout.write(f"{'scenario':<20}" + ''.join(f'{page + " p50/p99 ms":>36}' for page in RENDER_PAGES))
+        for scenario, pages in results.items():
+            cells = ''.join(f"{pages[page]['p50_ms']:>26} / {pages[page]['p99_ms']:<7}" for page in RENDER_PAGES)
+            self.stdout.write(f'{scenario:<20}{cells}')
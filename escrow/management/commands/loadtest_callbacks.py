@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import threading
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from escrow.benchmark import percentile
+from escrow.models import EscrowTransaction, Seller, TransactionEvent
+from services.fake_paystack import FakePaystack
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire concurrent Paystack callbacks at the configured database and report '
+        'throughput. Run once per DB_ENGINE to compare backends.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Number of callbacks to send')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent client threads')
+
+    def handle(self, *args, **options):
+        total, concurrency = options['requests'], options['concurrency']
+
+        user = User.objects.create_user(username=f'loadtest-{uuid.uuid4().hex[:12]}')
+        seller = Seller.objects.create(user=user, phone='00000000000', bank_account='0000000000')
+        transactions = EscrowTransaction.objects.bulk_create([
+            EscrowTransaction(
+                seller=seller,
+                product_name='Load test',
+                product_price=Decimal('1000.00'),
+                logistics_fee=Decimal('100.00'),
+                buyer_email='buyer@example.com',
+            )
+            for _ in range(total)
+        ])
+        TransactionEvent.objects.bulk_create(map(TransactionEvent.created, transactions))
+
+        try:
+            with FakePaystack() as paystack, override_settings(
+                PAYSTACK_BASE_URL=paystack.url,
+                EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                EMAIL_DELIVERY_MODE='sync',
+            ):
+                for transaction in transactions:
+                    paystack.add_transaction(str(transaction.id), 110000)
+
+                started = time.perf_counter()
+                results = self._run([str(t.id) for t in transactions], concurrency)
+                elapsed = time.perf_counter() - started
+        finally:
+            user.delete()
+
+        latencies = [latency for latency, ok in results if ok] or [0]
+        errors = sum(1 for _, ok in results if not ok)
+
+        self.stdout.write(
+            f'{connection.vendor}: {total} callbacks on {concurrency} threads in {elapsed:.2f}s '
+            f'-> {(total - errors) / elapsed:.1f} req/s, '
+            f'p50 {percentile(latencies, 50) * 1000:.1f}ms, p99 {percentile(latencies, 99) * 1000:.1f}ms, '
+            f'{errors} error(s)'
+        )
+
+    def _run(self, references, concurrency):
+        local = threading.local()
+        url = reverse('paystack_callback')
+
+        def callback(reference):
+            if not hasattr(local, 'client'):
+                local.client = Client(raise_request_exception=False, SERVER_NAME='localhost')
+            started = time.perf_counter()
+            response = local.client.get(url, {'reference': reference})
+            ok = response.status_code == 302 and '/success/' in response.url
+            return time.perf_counter() - started, ok
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(callback, references))
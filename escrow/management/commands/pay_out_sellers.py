@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from escrow.payouts import run_payouts
+
+
+class Command(BaseCommand):
+    help = 'Transfer released escrow funds to sellers in Paystack bulk-transfer batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Transfers per Paystack bulk call')
+
+    def handle(self, *args, **options):
+        created, submitted, failed = run_payouts(batch_size=options['batch_size'])
+        self.stdout.write(f'Created {created} payout(s), submitted {submitted}, {failed} failed.')
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from escrow.reconcile import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Mark paid any pending transactions Paystack reports as successfully charged'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, help='How far back to list charges')
+        parser.add_argument('--per-page', type=int, help='Charges per Paystack list call')
+
+    def handle(self, *args, **options):
+        start = None
+        if options['hours']:
+            start = timezone.now() - timedelta(hours=options['hours'])
+
+        report = reconcile(start=start, per_page=options['per_page'])
+        self.stdout.write(f"Checked {report['checked']} charge(s), marked {report['applied']} transaction(s) paid.")
+        for mismatch in report['mismatches']:
+            self.stdout.write(f"{mismatch['reference']}: {mismatch['problem']} ({mismatch['detail']})")
+
+        if report['error']:
+            raise CommandError(f"Reconciliation stopped early: {report['error']}")
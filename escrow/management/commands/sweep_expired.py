@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from escrow.sweeper import expire_overdue, refund_expired
+
+
+class Command(BaseCommand):
+    help = 'Expire paid escrows past their deadline and refund the buyers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Rows per bulk update / refund batch')
+        parser.add_argument('--concurrency', type=int, help='Parallel Paystack refund calls')
+        parser.add_argument('--skip-refunds', action='store_true', help='Only mark overdue escrows as expired')
+
+    def handle(self, *args, **options):
+        expired = expire_overdue(chunk_size=options['chunk_size'])
+        self.stdout.write(f'Expired {expired} overdue transaction(s).')
+
+        if options['skip_refunds']:
+            return
+
+        refunded, failed = refund_expired(chunk_size=options['chunk_size'], concurrency=options['concurrency'])
+        self.stdout.write(f'Refunded {refunded} transaction(s), {failed} failed.')
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrow', '0002_escrowtransaction_deadline_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='escrowtransaction',
+            index=models.Index(fields=['seller', '-created_at'], name='escrow_seller_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='escrowtransaction',
+            index=models.Index(fields=['seller', 'status'], name='escrow_seller_status_idx'),
+        ),
+    ]
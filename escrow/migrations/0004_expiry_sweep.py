@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrow', '0003_seller_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escrowtransaction',
+            name='refunded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='escrowtransaction',
+            index=models.Index(fields=['status', 'deadline'], name='escrow_status_deadline_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:20
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrow', '0004_expiry_sweep'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seller',
+            name='recipient_code',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.CreateModel(
+            name='Payout',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('status', models.CharField(choices=[('pending', 'Pending Submission'), ('processing', 'Processing'), ('paid', 'Paid'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('transfer_code', models.CharField(blank=True, max_length=100)),
+                ('failure_reason', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='payouts', to='escrow.seller')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='escrowtransaction',
+            name='logistics_payout',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='logistics_transactions', to='escrow.payout'),
+        ),
+        migrations.AddField(
+            model_name='escrowtransaction',
+            name='product_payout',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='product_transactions', to='escrow.payout'),
+        ),
+        migrations.AddIndex(
+            model_name='payout',
+            index=models.Index(fields=['status', 'created_at'], name='escrow_payout_status_idx'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_events(apps, schema_editor):
+    """Seed the ledger with one event per existing transaction at its current status"""
+    EscrowTransaction = apps.get_model('escrow', 'EscrowTransaction')
+    TransactionEvent = apps.get_model('escrow', 'TransactionEvent')
+    fee_basis_points = int(Decimal('2.5') * 100)
+
+    rows = EscrowTransaction.objects.order_by('created_at').values_list(
+        'id', 'seller_id', 'status', 'product_price', 'created_at'
+    ).iterator(chunk_size=2000)
+    batch = []
+    for pk, seller_id, status, product_price, created_at in rows:
+        price_kobo = int(product_price * 100)
+        batch.append(TransactionEvent(
+            transaction_id=pk, seller_id=seller_id, to_status=status, created_at=created_at,
+            net_kobo=price_kobo - (price_kobo * fee_basis_points + 5000) // 10000,
+        ))
+        if len(batch) == 2000:
+            TransactionEvent.objects.bulk_create(batch)
+            batch = []
+    TransactionEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrow', '0005_payouts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_event_id', models.BigIntegerField()),
+                ('pending_kobo', models.BigIntegerField(default=0)),
+                ('held_kobo', models.BigIntegerField(default=0)),
+                ('released_kobo', models.BigIntegerField(default=0)),
+                ('refunded_kobo', models.BigIntegerField(default=0)),
+                ('pending_count', models.IntegerField(default=0)),
+                ('held_count', models.IntegerField(default=0)),
+                ('released_count', models.IntegerField(default=0)),
+                ('refunded_count', models.IntegerField(default=0)),
+                ('taken_at', models.DateTimeField(auto_now_add=True)),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='escrow.seller')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['seller', '-last_event_id'], name='escrow_snapshot_seller_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TransactionEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, max_length=20)),
+                ('to_status', models.CharField(max_length=20)),
+                ('net_kobo', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='escrow.seller')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='escrow.escrowtransaction')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['seller', 'id'], name='escrow_event_seller_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_events, migrations.RunPython.noop),
+    ]
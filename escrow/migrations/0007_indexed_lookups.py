@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('escrow', '0006_transaction_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='escrowtransaction',
+            index=models.Index(fields=['paystack_reference'], name='escrow_paystack_ref_idx'),
+        ),
+        # One account per email, case-insensitively; users without an email
+        # (e.g. created with createsuperuser) are exempt. Fails if existing
+        # accounts share an email, which must be resolved first.
+        migrations.RunSQL(
+            "CREATE UNIQUE INDEX auth_user_email_lower_uniq ON auth_user (LOWER(email)) WHERE NOT (email = '')",
+            'DROP INDEX auth_user_email_lower_uniq',
+        ),
+    ]
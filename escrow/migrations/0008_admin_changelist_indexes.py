@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:31
+
+from django.db import migrations, models
+
+
+# Admin search on product_name is an icontains, i.e.
+# UPPER(product_name::text) LIKE UPPER('%term%'), which only a trigram
+# index on the same expression can serve. pg_trgm is PostgreSQL only;
+# other databases keep scanning.
+TRIGRAM_INDEX = (
+    'CREATE INDEX IF NOT EXISTS escrow_product_name_trgm_idx ON escrow_escrowtransaction '
+    'USING gin ((UPPER(product_name::text)) gin_trgm_ops)'
+)
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(TRIGRAM_INDEX)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS escrow_product_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrow', '0007_indexed_lookups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='escrowtransaction',
+            index=models.Index(fields=['-created_at', '-id'], name='escrow_created_idx'),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrow', '0008_admin_changelist_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escrowtransaction',
+            name='paystack_access_code',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='escrowtransaction',
+            name='paystack_authorization_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:02
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast, Round
+
+import escrow.money
+
+
+def _kobo(field):
+    return Cast(Round(F(field) * 100), models.BigIntegerField())
+
+
+def _naira(field):
+    return F(field) * Decimal('0.01')
+
+
+def decimals_to_kobo(apps, schema_editor):
+    EscrowTransaction = apps.get_model('escrow', 'EscrowTransaction')
+    Payout = apps.get_model('escrow', 'Payout')
+    EscrowTransaction.objects.update(price_kobo=_kobo('product_price'), logistics_kobo=_kobo('logistics_fee'))
+    Payout.objects.update(amount_kobo=_kobo('amount'))
+
+
+def kobo_to_decimals(apps, schema_editor):
+    EscrowTransaction = apps.get_model('escrow', 'EscrowTransaction')
+    Payout = apps.get_model('escrow', 'Payout')
+    EscrowTransaction.objects.update(product_price=_naira('price_kobo'), logistics_fee=_naira('logistics_kobo'))
+    Payout.objects.update(amount=_naira('amount_kobo'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrow', '0009_paystack_authorization'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escrowtransaction',
+            name='price_kobo',
+            field=escrow.money.KoboField(default=0, verbose_name='product price'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='escrowtransaction',
+            name='logistics_kobo',
+            field=escrow.money.KoboField(default=0, verbose_name='logistics fee'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='payout',
+            name='amount_kobo',
+            field=escrow.money.KoboField(default=0, verbose_name='amount'),
+        ),
+        # Nullable so that reversing can re-add the columns before refilling them
+        migrations.AlterField(
+            model_name='escrowtransaction',
+            name='product_price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AlterField(
+            model_name='escrowtransaction',
+            name='logistics_fee',
+            field=models.DecimalField(decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(decimals_to_kobo, kobo_to_decimals),
+        migrations.RemoveIndex(
+            model_name='escrowtransaction',
+            name='escrow_seller_status_idx',
+        ),
+        migrations.RemoveField(
+            model_name='escrowtransaction',
+            name='product_price',
+        ),
+        migrations.RemoveField(
+            model_name='escrowtransaction',
+            name='logistics_fee',
+        ),
+        migrations.RemoveField(
+            model_name='payout',
+            name='amount',
+        ),
+        migrations.AddField(
+            model_name='escrowtransaction',
+            name='total_kobo',
+            field=models.GeneratedField(
+                db_persist=True, expression=F('price_kobo') + F('logistics_kobo'),
+                output_field=models.BigIntegerField(),
+            ),
+        ),
+        migrations.AddField(
+            model_name='escrowtransaction',
+            name='fee_kobo',
+            field=models.GeneratedField(
+                db_persist=True, expression=escrow.money.platform_fee_expression('price_kobo'),
+                output_field=models.BigIntegerField(),
+            ),
+        ),
+        migrations.AddField(
+            model_name='escrowtransaction',
+            name='net_kobo',
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=F('price_kobo') - escrow.money.platform_fee_expression('price_kobo'),
+                output_field=models.BigIntegerField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='escrowtransaction',
+            index=models.Index(fields=['seller', 'status', 'net_kobo'], name='escrow_seller_status_net_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='escrowtransaction',
+            index=models.Index(fields=['total_kobo'], name='escrow_total_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrow', '0010_integer_kobo_amounts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='escrowtransaction',
+            name='refund_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
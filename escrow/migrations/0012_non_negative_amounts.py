@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrow', '0011_refund_claims'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='escrowtransaction',
+            constraint=models.CheckConstraint(condition=models.Q(('logistics_kobo__gte', 0), ('price_kobo__gte', 0)), name='escrow_amounts_non_negative'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrow', '0012_non_negative_amounts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transactionevent',
+            name='transaction',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='events', to='escrow.escrowtransaction'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('escrow', '0013_protect_ledger_events'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transactionevent',
+            name='transaction',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='events', to='escrow.escrowtransaction'),
+        ),
+    ]
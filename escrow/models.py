@@ -1,15 +1,66 @@
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction as db_transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from functools import partial
+import random
+import string
 import uuid
-from decimal import Decimal
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal
+
+from .money import (
+    PLATFORM_FEE_BASIS_POINTS, KoboField, kobo_to_naira, naira_to_kobo, platform_fee_expression, platform_fee_kobo,
+)
+
+
+class EscrowTransactionQuerySet(models.QuerySet):
+    # Seller-facing status buckets used by dashboard totals
+    STATUS_BUCKETS = {
+        'pending': ['pending'],
+        'held': ['paid'],
+        'released': ['confirmed'],
+        'refunded': ['refunded', 'expired'],
+    }
+
+    def totals(self):
+        """Seller net amounts and counts per status bucket, in one query"""
+        aggregates = {}
+        for bucket, statuses in self.STATUS_BUCKETS.items():
+            in_bucket = Q(status__in=statuses)
+            aggregates[bucket] = Coalesce(Sum('net_kobo', filter=in_bucket), 0)
+            aggregates[f'{bucket}_count'] = Count('pk', filter=in_bucket)
+
+        result = self.aggregate(**aggregates)
+        for bucket in self.STATUS_BUCKETS:
+            result[bucket] = kobo_to_naira(result[bucket])
+        return result
+    
+    def delete(self):
+        """Delete, appending an event that takes each row out of the ledger"""
+        with db_transaction.atomic():
+            removed = self._ledger_removals()
+            result = super().delete()
+        EscrowTransaction.invalidate_cached([event.transaction_id for event in removed])
+        return result
+    
+    def _ledger_removals(self):
+        rows = self.select_for_update().values_list('pk', 'seller_id', 'status', 'net_kobo')
+        return TransactionEvent.objects.bulk_create([
+            TransactionEvent(
+                transaction_id=pk, seller_id=seller_id, from_status=status, to_status='', net_kobo=net_kobo,
+            )
+            for pk, seller_id, status, net_kobo in rows
+        ])
 
 class Seller(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     phone = models.CharField(max_length=15)
     bank_account = models.CharField(max_length=50)
     bank_name = models.CharField(max_length=100, blank=True)
+    recipient_code = models.CharField(max_length=50, blank=True)  # Paystack transfer recipient
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -18,8 +69,7 @@ class Seller(models.Model):
     @property
     def total_earnings(self):
         """Calculate total confirmed earnings"""
-        confirmed = self.escrowtransaction_set.filter(status='confirmed')
-        return sum(t.seller_amount for t in confirmed)
+        return self.escrowtransaction_set.totals()['released']
 
 class EscrowTransaction(models.Model):
     STATUS_CHOICES = [
@@ -30,15 +80,44 @@ class EscrowTransaction(models.Model):
         ('expired', 'Expired - Auto Refund'),
     ]
     
-    PLATFORM_FEE_PERCENT = Decimal('2.5')  # 2.5% platform fee
+    # Valid source statuses for each target status
+    TRANSITIONS = {
+        'paid': ['pending'],
+        'confirmed': ['paid'],
+        'refunded': ['paid'],
+        'expired': ['paid'],
+    }
+    
+    PLATFORM_FEE_PERCENT = Decimal(PLATFORM_FEE_BASIS_POINTS) / 100  # 2.5% platform fee
+    CONFIRMATION_WINDOW = timedelta(days=3)  # 2 days + 1 day grace
+    
+    # Fields cached for the public payment, success and confirm pages
+    SNAPSHOT_FIELDS = [
+        'id', 'seller', 'product_name', 'price_kobo', 'logistics_kobo', 'total_kobo',
+        'buyer_email', 'status', 'confirmation_code', 'paid_at', 'deadline',
+        'paystack_authorization_url', 'paystack_access_code',
+    ]
+    SNAPSHOT_TIMEOUT = 5 * 60
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     seller = models.ForeignKey(Seller, on_delete=models.CASCADE)
     
     # Product details
     product_name = models.CharField(max_length=200)
-    product_price = models.DecimalField(max_digits=10, decimal_places=2)
-    logistics_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    price_kobo = KoboField('product price')
+    logistics_kobo = KoboField('logistics fee')
+    
+    # Derived amounts, computed by the database whenever a row is written
+    total_kobo = models.GeneratedField(
+        expression=F('price_kobo') + F('logistics_kobo'), output_field=models.BigIntegerField(), db_persist=True,
+    )
+    fee_kobo = models.GeneratedField(
+        expression=platform_fee_expression('price_kobo'), output_field=models.BigIntegerField(), db_persist=True,
+    )
+    net_kobo = models.GeneratedField(
+        expression=F('price_kobo') - platform_fee_expression('price_kobo'),
+        output_field=models.BigIntegerField(), db_persist=True,
+    )
     
     # Buyer details
     buyer_phone = models.CharField(max_length=15, blank=True)
@@ -50,6 +129,9 @@ class EscrowTransaction(models.Model):
     
     # Payment tracking
     paystack_reference = models.CharField(max_length=100, blank=True)
+    # Checkout link from the first initialization, reused on later visits
+    paystack_authorization_url = models.URLField(max_length=500, blank=True)
+    paystack_access_code = models.CharField(max_length=100, blank=True)
     logistics_released = models.BooleanField(default=False)
     product_released = models.BooleanField(default=False)
     
@@ -58,21 +140,75 @@ class EscrowTransaction(models.Model):
     paid_at = models.DateTimeField(null=True, blank=True)
     confirmed_at = models.DateTimeField(null=True, blank=True)
     deadline = models.DateTimeField(null=True, blank=True)
+    refunded_at = models.DateTimeField(null=True, blank=True)
+    # Set while the refund sweep owns the row; kept if the outcome is unknown
+    refund_claimed_at = models.DateTimeField(null=True, blank=True)
+    
+    # Payouts that moved the released amounts to the seller's bank
+    logistics_payout = models.ForeignKey(
+        'Payout', null=True, blank=True, on_delete=models.SET_NULL, related_name='logistics_transactions'
+    )
+    product_payout = models.ForeignKey(
+        'Payout', null=True, blank=True, on_delete=models.SET_NULL, related_name='product_transactions'
+    )
+    
+    objects = EscrowTransactionQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['seller', '-created_at'], name='escrow_seller_created_idx'),
+            # Covers the per-status balance sums
+            models.Index(fields=['seller', 'status', 'net_kobo'], name='escrow_seller_status_net_idx'),
+            models.Index(fields=['status', 'deadline'], name='escrow_status_deadline_idx'),
+            models.Index(fields=['paystack_reference'], name='escrow_paystack_ref_idx'),
+            models.Index(fields=['-created_at', '-id'], name='escrow_created_idx'),
+            models.Index(fields=['total_kobo'], name='escrow_total_idx'),
+        ]
+        constraints = [
+            # The fee formula rounds as SQL and Python agree only for amounts >= 0
+            models.CheckConstraint(
+                condition=Q(price_kobo__gte=0, logistics_kobo__gte=0), name='escrow_amounts_non_negative',
+            ),
+        ]
+    
+    # Naira views of the stored amounts. Unsaved instances have no database
+    # computed amounts yet, so those are worked out here instead.
+    
+    @property
+    def product_price(self):
+        """Product price in naira; assigning naira sets price_kobo"""
+        return kobo_to_naira(self.price_kobo)
+    
+    @product_price.setter
+    def product_price(self, value):
+        self.price_kobo = naira_to_kobo(value)
+    
+    @property
+    def logistics_fee(self):
+        return kobo_to_naira(self.logistics_kobo)
+    
+    @logistics_fee.setter
+    def logistics_fee(self, value):
+        self.logistics_kobo = naira_to_kobo(value)
     
     @property
     def total_amount(self):
         """Total amount buyer pays"""
-        return self.product_price + self.logistics_fee
+        if 'total_kobo' in self.__dict__:
+            return kobo_to_naira(self.total_kobo)
+        return kobo_to_naira(self.price_kobo + self.logistics_kobo)
     
     @property
     def platform_fee(self):
         """Platform fee (2.5% of product price only)"""
-        return (self.product_price * self.PLATFORM_FEE_PERCENT / 100).quantize(Decimal('0.01'))
+        if 'fee_kobo' in self.__dict__:
+            return kobo_to_naira(self.fee_kobo)
+        return kobo_to_naira(platform_fee_kobo(self.price_kobo))
     
     @property
     def seller_amount(self):
         """Amount seller receives after platform fee"""
-        return self.product_price - self.platform_fee
+        return kobo_to_naira(self.net_kobo_value())
     
     @property
     def is_expired(self):
@@ -84,8 +220,261 @@ class EscrowTransaction(models.Model):
     def set_deadline(self):
         """Set deadline to 2 days + 1 day grace from payment"""
         if self.paid_at:
-            self.deadline = self.paid_at + timedelta(days=3)
-            self.save()
+            self.deadline = self.paid_at + self.CONFIRMATION_WINDOW
+            self.save(update_fields=['deadline'])
+    
+    def _transition(self, to_status, **fields):
+        """Apply a status transition as one conditional UPDATE.
+        
+        The row only changes if its current status is a valid source for
+        to_status, so concurrent callbacks, webhook retries and refreshes
+        cannot process the same event twice. Returns True if this call won;
+        the instance is updated in memory only then.
+        """
+        sources = self.TRANSITIONS[to_status]
+        from_status = self.status if self.status in sources else sources[0]
+        fields['status'] = to_status
+        with db_transaction.atomic():
+            won = type(self).objects.filter(pk=self.pk, status__in=sources).update(**fields)
+            if won:
+                TransactionEvent.objects.create(
+                    transaction_id=self.pk, seller_id=self.seller_id, from_status=from_status,
+                    to_status=to_status, net_kobo=self.net_kobo_value(),
+                )
+        
+        if won:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.invalidate_cached([self.pk])
+        return bool(won)
+    
+    @staticmethod
+    def new_confirmation_code():
+        return ''.join(random.choices(string.digits, k=6))
+    
+    def mark_paid(self, reference):
+        """pending -> paid: issue the confirmation code and release logistics"""
+        paid_at = timezone.now()
+        return self._transition(
+            'paid',
+            confirmation_code=self.new_confirmation_code(),
+            paid_at=paid_at,
+            deadline=paid_at + self.CONFIRMATION_WINDOW,
+            paystack_reference=reference,
+            logistics_released=True,  # Release logistics fee immediately
+        )
+    
+    def confirm(self):
+        """paid -> confirmed: buyer received the goods, release product payment"""
+        return self._transition('confirmed', confirmed_at=timezone.now(), product_released=True)
+    
+    def refund(self):
+        """paid -> refunded"""
+        return self._transition('refunded', refunded_at=timezone.now())
+    
+    def expire(self):
+        """paid -> expired: deadline passed without confirmation"""
+        return self._transition('expired')
+    
+    def net_kobo_value(self):
+        """seller_amount in kobo, as recorded on ledger events"""
+        if 'net_kobo' in self.__dict__:
+            return self.net_kobo
+        return self.price_kobo - platform_fee_kobo(self.price_kobo)
+    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        ledger_may_change = not adding and (
+            update_fields is None or {'status', 'price_kobo'} & set(update_fields)
+        )
+        
+        with db_transaction.atomic():
+            previous = None
+            if ledger_may_change:
+                previous = type(self).objects.filter(pk=self.pk).values_list('status', 'net_kobo').first()
+            super().save(*args, **kwargs)
+            if not adding:
+                # Derived amounts are only read back on insert; drop any stale copy.
+                for name in ('total_kobo', 'fee_kobo', 'net_kobo'):
+                    self.__dict__.pop(name, None)
+            TransactionEvent.objects.bulk_create(self._ledger_events(adding, previous))
+        self.invalidate_cached([self.pk])
+    
+    def _ledger_events(self, adding, previous):
+        """Events moving the ledger from `previous` (status, net_kobo) to this row"""
+        net_kobo = self.net_kobo_value()
+        event = partial(TransactionEvent, transaction_id=self.pk, seller_id=self.seller_id)
+        if adding:
+            return [event(from_status='', to_status=self.status, net_kobo=net_kobo)]
+        if previous is None:
+            return []
+        previous_status, previous_net = previous
+        if previous_net != net_kobo:
+            # Amount edited: take the old amount out of its bucket and put
+            # the new one in, so snapshots plus events still match the rows.
+            return [
+                event(from_status=previous_status, to_status='', net_kobo=previous_net),
+                event(from_status='', to_status=self.status, net_kobo=net_kobo),
+            ]
+        if previous_status != self.status:
+            return [event(from_status=previous_status, to_status=self.status, net_kobo=net_kobo)]
+        return []
+    
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        with db_transaction.atomic():
+            type(self).objects.filter(pk=pk)._ledger_removals()
+            result = super().delete(*args, **kwargs)
+        self.invalidate_cached([pk])
+        return result
+    
+    @staticmethod
+    def snapshot_key(pk):
+        return f'escrow:transaction:v2:{pk}'
+    
+    @classmethod
+    def invalidate_cached(cls, pks):
+        """Drop cached snapshots; call after any UPDATE that bypasses save()"""
+        cache.delete_many([cls.snapshot_key(pk) for pk in pks])
+    
+    @classmethod
+    def _snapshot_attnames(cls):
+        return [cls._meta.get_field(name).attname for name in cls.SNAPSHOT_FIELDS]
+    
+    @classmethod
+    def _from_snapshot(cls, snapshot):
+        return cls.from_db(None, list(snapshot), list(snapshot.values()))
+    
+    def _snapshot(self):
+        return {attname: getattr(self, attname) for attname in self._snapshot_attnames()}
+    
+    @classmethod
+    def get_cached(cls, pk):
+        """Read-through cached copy of a transaction for public pages.
+        
+        Only SNAPSHOT_FIELDS are loaded; touching any other field costs one
+        query. Raises DoesNotExist like get().
+        """
+        snapshot = cache.get(cls.snapshot_key(pk))
+        if snapshot is not None:
+            return cls._from_snapshot(snapshot)
+        
+        transaction = cls.objects.only(*cls.SNAPSHOT_FIELDS).get(pk=pk)
+        cache.set(cls.snapshot_key(pk), transaction._snapshot(), cls.SNAPSHOT_TIMEOUT)
+        return transaction
+    
+    @classmethod
+    async def aget_cached(cls, pk):
+        """Async variant of get_cached"""
+        snapshot = await cache.aget(cls.snapshot_key(pk))
+        if snapshot is not None:
+            return cls._from_snapshot(snapshot)
+        
+        transaction = await cls.objects.only(*cls.SNAPSHOT_FIELDS).aget(pk=pk)
+        await cache.aset(cls.snapshot_key(pk), transaction._snapshot(), cls.SNAPSHOT_TIMEOUT)
+        return transaction
     
     def __str__(self):
         return f"{self.product_name} - {self.status}"
+
+
+class Payout(models.Model):
+    """One transfer of released escrow funds to a seller's bank account"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending Submission'),
+        ('processing', 'Processing'),
+        ('paid', 'Paid'),
+        ('failed', 'Failed'),
+    ]
+    
+    # The id doubles as the Paystack transfer reference (idempotency key).
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    seller = models.ForeignKey(Seller, on_delete=models.PROTECT, related_name='payouts')
+    amount_kobo = KoboField('amount', default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    transfer_code = models.CharField(max_length=100, blank=True)
+    failure_reason = models.CharField(max_length=255, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='escrow_payout_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Payout {self.id} - {self.status}"
+    
+    @property
+    def amount(self):
+        return kobo_to_naira(self.amount_kobo)
+
+
+class TransactionEvent(models.Model):
+    """Append-only record of a transaction entering a status.
+    
+    Written in the same database transaction as every status change
+    (creation included), amount edit and delete, so the ledger replays to
+    the current state. An edit is recorded as the old amount leaving its
+    bucket (to_status '') and the new one entering it; a delete as the
+    amount leaving. Events outlive their transaction, since snapshots may
+    already have folded them, and go only with the seller.
+    """
+    transaction = models.ForeignKey(
+        EscrowTransaction, null=True, on_delete=models.SET_NULL, related_name='events',
+    )
+    seller = models.ForeignKey(Seller, on_delete=models.CASCADE, related_name='events')
+    from_status = models.CharField(max_length=20, blank=True)  # '' on creation
+    to_status = models.CharField(max_length=20)
+    net_kobo = models.BigIntegerField()  # seller_amount moved between balance buckets
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['seller', 'id'], name='escrow_event_seller_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.transaction_id}: {self.from_status or 'new'} -> {self.to_status}"
+    
+    @classmethod
+    def created(cls, transaction):
+        """Unsaved creation event for a transaction inserted with bulk_create"""
+        return cls(
+            transaction_id=transaction.pk, seller_id=transaction.seller_id,
+            to_status=transaction.status, net_kobo=transaction.net_kobo_value(),
+        )
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Transaction events are append-only.')
+        super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        raise ValueError('Transaction events are append-only.')
+
+
+class SellerBalanceSnapshot(models.Model):
+    """A seller's balance buckets folded over every event up to last_event_id"""
+    seller = models.ForeignKey(Seller, on_delete=models.CASCADE, related_name='balance_snapshots')
+    last_event_id = models.BigIntegerField()
+    pending_kobo = models.BigIntegerField(default=0)
+    held_kobo = models.BigIntegerField(default=0)
+    released_kobo = models.BigIntegerField(default=0)
+    refunded_kobo = models.BigIntegerField(default=0)
+    pending_count = models.IntegerField(default=0)
+    held_count = models.IntegerField(default=0)
+    released_count = models.IntegerField(default=0)
+    refunded_count = models.IntegerField(default=0)
+    taken_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['seller', '-last_event_id'], name='escrow_snapshot_seller_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.seller_id} @ event {self.last_event_id}"
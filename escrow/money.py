@@ -0,0 +1,67 @@
+"""
+Money as integer kobo.
+
+Amounts are stored in KoboField columns, summed in SQL and sent to Paystack
+as whole kobo, so nothing is rounded between a seller entering a price and
+the buyer being charged, the fee taken or the seller paid. Naira only
+exists at the edges: NairaField parses form input, the ``naira`` template
+filter and kobo_to_naira() format output.
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django import forms
+from django.db import models
+from django.db.models import F
+
+# 2.5% of the product price, in hundredths of a percent
+PLATFORM_FEE_BASIS_POINTS = 250
+
+
+def kobo_to_naira(kobo):
+    """Convert an integer kobo amount to a two-place naira Decimal"""
+    return Decimal(kobo).scaleb(-2)
+
+
+def naira_to_kobo(amount):
+    """Whole kobo in a naira amount (Decimal, str or int), rounded half-up"""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), ROUND_HALF_UP))
+
+
+def platform_fee_kobo(price_kobo):
+    """Fee on a product price, rounded half-up to the kobo"""
+    return (price_kobo * PLATFORM_FEE_BASIS_POINTS + 5000) // 10000
+
+
+def platform_fee_expression(field):
+    """platform_fee_kobo() in SQL; amounts are never negative, so / floors"""
+    return (F(field) * PLATFORM_FEE_BASIS_POINTS + 5000) / 10000
+
+
+class NairaField(forms.DecimalField):
+    """Form field taking a naira amount and cleaning it to integer kobo"""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_digits', 12)
+        kwargs.setdefault('decimal_places', 2)
+        super().__init__(**kwargs)
+
+    def prepare_value(self, value):
+        if isinstance(value, int):
+            return kobo_to_naira(value)
+        return value
+
+    def clean(self, value):
+        value = super().clean(value)
+        return None if value is None else naira_to_kobo(value)
+
+    def has_changed(self, initial, data):
+        return super().has_changed(self.prepare_value(initial), data)
+
+
+class KoboField(models.BigIntegerField):
+    """Integer kobo column, edited in naira"""
+
+    def formfield(self, **kwargs):
+        # Skip BigIntegerField's limits, which are in kobo, not naira.
+        return models.Field.formfield(self, **{'form_class': NairaField, 'min_value': 0, **kwargs})
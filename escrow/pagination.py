@@ -0,0 +1,39 @@
+import base64
+from datetime import datetime
+import uuid
+
+from django.db.models import Q
+
+
+def encode_cursor(transaction):
+    """Opaque cursor pointing just past the given transaction"""
+    raw = f'{transaction.created_at.isoformat()}|{transaction.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, pk) from a cursor, raising ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), uuid.UUID(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from e
+
+
+def keyset_page(queryset, cursor=None, page_size=25):
+    """Newest-first page of a transaction queryset, seeking on (created_at, id).
+
+    Unlike OFFSET pagination, the cost of fetching a page does not grow with
+    how deep into the history it is. Returns (rows, next_cursor).
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
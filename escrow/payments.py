@@ -0,0 +1,141 @@
+"""
+Initializing and finalizing buyer payments.
+
+A transaction is initialized with Paystack once: the checkout link is kept
+on the transaction and reused by reloads and double-clicks, and a
+per-transaction cache lock makes concurrent first requests wait for one
+outbound call instead of each making their own (Paystack rejects a repeated
+reference anyway).
+
+A charge is finalized by whichever of the browser callback, the Paystack
+webhook or the ``verify_payment`` task gets there first: ``mark_paid`` is a
+conditional update, so only the winner queues the confirmation code email
+and running any of them again is harmless.
+"""
+
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from services.email_service import queue_confirmation_code_email
+from services.paystack import PaystackService
+from .models import EscrowTransaction
+
+# Held while calling Paystack; longer than the client's retries can take
+INITIALIZE_LOCK_TIMEOUT = 60
+# How long a concurrent request waits for the first one to finish
+INITIALIZE_WAIT = 10
+INITIALIZE_POLL_INTERVAL = 0.1
+BUSY = {'success': False, 'message': 'Payment is already being set up, please try again.'}
+
+
+def _initialize_lock_key(pk):
+    return f'escrow:initialize:{pk}'
+
+
+def _stored_authorization(transaction):
+    return {
+        'success': True,
+        'authorization_url': transaction.paystack_authorization_url,
+        'access_code': transaction.paystack_access_code,
+        'reference': str(transaction.pk),
+    }
+
+
+def _current_authorization(pk):
+    return EscrowTransaction.objects.only('paystack_authorization_url', 'paystack_access_code').get(pk=pk)
+
+
+def _store_authorization(transaction, result):
+    EscrowTransaction.objects.filter(pk=transaction.pk).update(
+        paystack_authorization_url=result['authorization_url'],
+        paystack_access_code=result['access_code'],
+    )
+    EscrowTransaction.invalidate_cached([transaction.pk])
+
+
+def initialize_payment(transaction, paystack_service=None):
+    """Paystack checkout link for a pending transaction, initializing it at most once"""
+    if transaction.paystack_authorization_url:
+        return _stored_authorization(transaction)
+
+    key = _initialize_lock_key(transaction.pk)
+    deadline = time.monotonic() + INITIALIZE_WAIT
+    while not cache.add(key, 1, timeout=INITIALIZE_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            return BUSY
+        time.sleep(INITIALIZE_POLL_INTERVAL)
+
+    try:
+        # Whoever held the lock may have stored the link meanwhile; ask the
+        # database, as a cached snapshot can predate it.
+        current = _current_authorization(transaction.pk)
+        if current.paystack_authorization_url:
+            return _stored_authorization(current)
+
+        paystack_service = paystack_service or PaystackService()
+        result = paystack_service.initialize_payment(transaction)
+        if result['success']:
+            _store_authorization(transaction, result)
+        return result
+    finally:
+        cache.delete(key)
+
+
+async def ainitialize_payment(transaction, paystack_service=None):
+    """Async variant of initialize_payment"""
+    if transaction.paystack_authorization_url:
+        return _stored_authorization(transaction)
+
+    key = _initialize_lock_key(transaction.pk)
+    deadline = time.monotonic() + INITIALIZE_WAIT
+    while not await cache.aadd(key, 1, timeout=INITIALIZE_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            return BUSY
+        await asyncio.sleep(INITIALIZE_POLL_INTERVAL)
+
+    try:
+        current = await sync_to_async(_current_authorization)(transaction.pk)
+        if current.paystack_authorization_url:
+            return _stored_authorization(current)
+
+        paystack_service = paystack_service or PaystackService()
+        result = await paystack_service.ainitialize_payment(transaction)
+        if result['success']:
+            await sync_to_async(_store_authorization)(transaction, result)
+        return result
+    finally:
+        await cache.adelete(key)
+
+
+def finalize_payment(transaction, reference):
+    """Mark the transaction paid and send the code, if no one else already did.
+
+    Returns whether this call made the transition.
+    """
+    if transaction.mark_paid(reference):
+        # Queue confirmation code email for the background mailer
+        queue_confirmation_code_email(transaction)
+        return True
+    return False
+
+
+def verify_pending_payment(transaction_id, paystack_service=None):
+    """Ask Paystack about a still-pending transaction and finalize it if paid.
+
+    Returns None if the transaction is no longer pending (nothing to do),
+    otherwise whether Paystack reported a successful charge.
+    """
+    transaction = EscrowTransaction.objects.filter(pk=transaction_id, status='pending').first()
+    if transaction is None:
+        return None
+
+    paystack_service = paystack_service or PaystackService()
+    reference = str(transaction.pk)
+    if not paystack_service.verify_payment(reference)['success']:
+        return False
+
+    finalize_payment(transaction, reference)
+    return True
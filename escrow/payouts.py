@@ -0,0 +1,196 @@
+"""
+Seller payouts for released escrow funds.
+
+A payout run first registers a Paystack transfer recipient for sellers
+who do not have one yet, then claims every released-but-unpaid amount into
+one Payout per seller (logistics fees once paid, product amounts net of the platform fee
+once confirmed), then submits pending payouts to Paystack in bulk-transfer
+batches. The payout id is the transfer reference, so resubmitting after a
+crash or timeout cannot pay twice. Paystack's transfer webhooks settle the
+payout; a failed or reversed transfer releases its transactions to be
+claimed again by the next run.
+"""
+
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from services.paystack import PaystackService
+from .models import EscrowTransaction, Payout, Seller
+
+logger = logging.getLogger(__name__)
+
+PAYOUT_LOCK_KEY = 'escrow:payouts:lock'
+PAYOUT_LOCK_TIMEOUT = 60 * 60
+
+
+def _unpaid_logistics():
+    return EscrowTransaction.objects.filter(logistics_released=True, logistics_payout__isnull=True)
+
+
+def _unpaid_products():
+    return EscrowTransaction.objects.filter(product_released=True, product_payout__isnull=True)
+
+
+def create_recipients(paystack_service=None):
+    """Register a transfer recipient for sellers with released funds but no recipient_code.
+
+    The bank is looked up by the name the seller gave; sellers whose bank
+    cannot be matched are logged and left for a later run. Returns the
+    number of recipients created.
+    """
+    payable = set(_unpaid_logistics().values_list('seller_id', flat=True).distinct())
+    payable |= set(_unpaid_products().values_list('seller_id', flat=True).distinct())
+    sellers = list(
+        Seller.objects.filter(pk__in=payable, recipient_code='').exclude(bank_name='').select_related('user')
+    )
+    if not sellers:
+        return 0
+
+    paystack_service = paystack_service or PaystackService()
+    banks = paystack_service.list_banks()
+    if not banks['success']:
+        logger.warning('Could not list banks for %d new payout recipients: %s', len(sellers), banks['message'])
+        return 0
+
+    codes = {}
+    for bank in banks['data']:
+        codes[bank['name'].lower()] = codes[bank['slug']] = bank['code']
+
+    created = 0
+    for seller in sellers:
+        bank_code = codes.get(seller.bank_name.strip().lower())
+        if bank_code is None:
+            logger.warning('No Paystack bank matches %r for seller %s', seller.bank_name, seller.pk)
+            continue
+
+        result = paystack_service.create_transfer_recipient(
+            seller.user.get_full_name() or seller.user.username, seller.bank_account, bank_code,
+        )
+        if not result['success']:
+            logger.warning('Could not create transfer recipient for seller %s: %s', seller.pk, result['message'])
+            continue
+        created += Seller.objects.filter(pk=seller.pk, recipient_code='').update(
+            recipient_code=result['data']['recipient_code']
+        )
+
+    return created
+
+
+def create_payouts():
+    """Claim released, unpaid amounts into one pending Payout per seller.
+
+    Costs a handful of queries per seller regardless of how many
+    transactions they have. Sellers without a transfer recipient are left
+    for a later run. Returns the number of payouts created.
+    """
+    payable = ~Q(seller__recipient_code='')
+    seller_ids = set(_unpaid_logistics().filter(payable).values_list('seller_id', flat=True).distinct())
+    seller_ids |= set(_unpaid_products().filter(payable).values_list('seller_id', flat=True).distinct())
+
+    for seller_id in sorted(seller_ids):
+        with db_transaction.atomic():
+            payout = Payout.objects.create(seller_id=seller_id)
+            _unpaid_logistics().filter(seller_id=seller_id).update(logistics_payout=payout)
+            _unpaid_products().filter(seller_id=seller_id).update(product_payout=payout)
+
+            amounts = EscrowTransaction.objects.filter(
+                Q(logistics_payout=payout) | Q(product_payout=payout)
+            ).aggregate(
+                logistics=Coalesce(Sum('logistics_kobo', filter=Q(logistics_payout=payout)), 0),
+                product=Coalesce(Sum('net_kobo', filter=Q(product_payout=payout)), 0),
+            )
+            payout.amount_kobo = amounts['logistics'] + amounts['product']
+            if not payout.amount_kobo:
+                # Nothing to transfer (e.g. free items); settle without calling Paystack.
+                payout.status, payout.completed_at = 'paid', timezone.now()
+            payout.save(update_fields=['amount_kobo', 'status', 'completed_at'])
+
+    return len(seller_ids)
+
+
+def submit_payouts(batch_size=None, paystack_service=None):
+    """Send pending payouts to Paystack, batch_size transfers per call.
+
+    Returns (submitted, failed); failed payouts stay pending and are
+    resubmitted under the same reference next run.
+    """
+    batch_size = batch_size or settings.ESCROW_PAYOUT_BATCH_SIZE
+    paystack_service = paystack_service or PaystackService()
+    pending = list(Payout.objects.filter(status='pending').select_related('seller').order_by('created_at', 'id'))
+    submitted = failed = 0
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        result = paystack_service.bulk_transfer([
+            {
+                'amount': payout.amount_kobo,
+                'reference': str(payout.id),
+                'recipient': payout.seller.recipient_code,
+                'reason': 'Escrow payout',
+            }
+            for payout in batch
+        ])
+        if not result['success']:
+            logger.warning('Bulk transfer of %d payouts failed: %s', len(batch), result['message'])
+            failed += len(batch)
+            continue
+
+        queued = {item['reference']: item for item in result['data']}
+        now = timezone.now()
+        accepted = []
+        for payout in batch:
+            item = queued.get(str(payout.id))
+            if item is None:
+                failed += 1
+                continue
+            payout.status, payout.transfer_code, payout.submitted_at = 'processing', item.get('transfer_code', ''), now
+            accepted.append(payout)
+
+        Payout.objects.bulk_update(accepted, ['status', 'transfer_code', 'submitted_at'])
+        submitted += len(accepted)
+
+    return submitted, failed
+
+
+def settle_payout(reference, succeeded, reason=''):
+    """Record a transfer.success / transfer.failed outcome. Returns True if applied."""
+    try:
+        payout_id = uuid.UUID(reference)
+    except (TypeError, ValueError):
+        return False
+
+    unsettled = Payout.objects.filter(pk=payout_id, status__in=['pending', 'processing'])
+    if succeeded:
+        return bool(unsettled.update(status='paid', completed_at=timezone.now()))
+
+    with db_transaction.atomic():
+        if not unsettled.update(status='failed', failure_reason=reason[:255], completed_at=timezone.now()):
+            return False
+        # Free the transactions so the next run pays them out again.
+        EscrowTransaction.objects.filter(logistics_payout=payout_id).update(logistics_payout=None)
+        EscrowTransaction.objects.filter(product_payout=payout_id).update(product_payout=None)
+    return True
+
+
+def run_payouts(batch_size=None, paystack_service=None):
+    """Create and submit payouts; returns (created, submitted, failed)"""
+    # Overlapping runs would claim and submit the same funds concurrently.
+    if not cache.add(PAYOUT_LOCK_KEY, 1, timeout=PAYOUT_LOCK_TIMEOUT):
+        logger.info('Payout run already in progress, skipping')
+        return 0, 0, 0
+
+    try:
+        paystack_service = paystack_service or PaystackService()
+        create_recipients(paystack_service)
+        created = create_payouts()
+        submitted, failed = submit_payouts(batch_size, paystack_service)
+        return created, submitted, failed
+    finally:
+        cache.delete(PAYOUT_LOCK_KEY)
@@ -0,0 +1,136 @@
+"""
+Reconciliation of pending transactions against Paystack.
+
+A buyer who pays but never returns to the callback, when the webhook is
+also lost, leaves the transaction pending. reconcile() pages through
+Paystack's successful charges for a time window instead of verifying one
+reference at a time: each page is matched with a single in_bulk query, and
+the pending transactions on it are marked paid with one conditional UPDATE,
+like mark_paid() but for the whole page. Charges that do not line up are
+reported rather than applied:
+
+- ``unknown``: the reference is not one of our transactions
+- ``amount``: Paystack charged a different amount than the transaction total
+"""
+
+from datetime import timedelta
+import logging
+import uuid
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from services.email_service import queue_confirmation_code_email
+from services.paystack import PaystackService
+from .models import EscrowTransaction, TransactionEvent
+
+logger = logging.getLogger(__name__)
+
+
+def reconcile(start=None, end=None, per_page=None, paystack_service=None):
+    """Apply successful Paystack charges created in [start, end] that we missed.
+
+    The window defaults to the last ESCROW_RECONCILE_WINDOW_HOURS.
+
+    Returns a report dict: charges ``checked``, transactions ``applied``,
+    ``mismatches`` (reference, problem, detail) and ``error`` if a page
+    could not be fetched, in which case reconciliation stops there.
+    """
+    end = end or timezone.now()
+    start = start or end - timedelta(hours=settings.ESCROW_RECONCILE_WINDOW_HOURS)
+    per_page = per_page or settings.ESCROW_RECONCILE_PAGE_SIZE
+    paystack_service = paystack_service or PaystackService()
+    report = {'checked': 0, 'applied': 0, 'mismatches': [], 'error': None}
+    page = 1
+
+    while True:
+        result = paystack_service.list_transactions(start, end, page=page, per_page=per_page)
+        if not result['success']:
+            logger.warning('Reconciliation stopped at page %d: %s', page, result['message'])
+            report['error'] = result['message']
+            return report
+
+        report['checked'] += len(result['data'])
+        report['applied'] += _reconcile_page(result['data'], report['mismatches'])
+
+        if not result['data'] or page >= result['meta'].get('pageCount', page):
+            return report
+        page += 1
+
+
+def _reconcile_page(charges, mismatches):
+    by_id = {}
+    for charge in charges:
+        try:
+            by_id[uuid.UUID(charge['reference'])] = charge
+        except (ValueError, TypeError):
+            mismatches.append(_mismatch(charge, 'unknown', 'not an escrow reference'))
+
+    transactions = EscrowTransaction.objects.in_bulk(list(by_id))
+    payable = []
+    for pk, charge in by_id.items():
+        transaction = transactions.get(pk)
+        if transaction is None:
+            mismatches.append(_mismatch(charge, 'unknown', 'no such transaction'))
+        elif charge['amount'] != transaction.total_kobo:
+            mismatches.append(_mismatch(
+                charge, 'amount', f"charged {charge['amount']} kobo, expected {transaction.total_kobo}",
+            ))
+        elif transaction.status == 'pending':
+            payable.append(transaction)
+
+    return _mark_paid(payable)
+
+
+def _mismatch(charge, problem, detail):
+    return {'reference': charge.get('reference'), 'problem': problem, 'detail': detail}
+
+
+def _mark_paid(transactions):
+    """pending -> paid for many transactions at once; returns how many won"""
+    if not transactions:
+        return 0
+
+    now = timezone.now()
+    codes = {transaction.pk: EscrowTransaction.new_confirmation_code() for transaction in transactions}
+    fields = {
+        'status': 'paid',
+        'paid_at': now,
+        'deadline': now + EscrowTransaction.CONFIRMATION_WINDOW,
+        'logistics_released': True,
+    }
+
+    with db_transaction.atomic():
+        # Lock first so a callback or webhook finishing meanwhile cannot win
+        # the same row; whatever it already paid is skipped.
+        won = set(
+            EscrowTransaction.objects.select_for_update()
+            .filter(pk__in=codes, status='pending').values_list('pk', flat=True)
+        )
+        if not won:
+            return 0
+        EscrowTransaction.objects.filter(pk__in=won).update(
+            confirmation_code=Case(*[When(pk=pk, then=Value(codes[pk])) for pk in won]),
+            paystack_reference=Case(*[When(pk=pk, then=Value(str(pk))) for pk in won]),
+            **fields,
+        )
+        TransactionEvent.objects.bulk_create([
+            TransactionEvent(
+                transaction_id=transaction.pk, seller_id=transaction.seller_id, from_status='pending',
+                to_status='paid', net_kobo=transaction.net_kobo,
+            )
+            for transaction in transactions if transaction.pk in won
+        ])
+    EscrowTransaction.invalidate_cached(won)
+
+    for transaction in transactions:
+        if transaction.pk in won:
+            for name, value in fields.items():
+                setattr(transaction, name, value)
+            transaction.confirmation_code = codes[transaction.pk]
+            transaction.paystack_reference = str(transaction.pk)
+            queue_confirmation_code_email(transaction)
+    logger.info('Reconciliation marked %d transaction(s) paid', len(won))
+    return len(won)
@@ -0,0 +1,39 @@
+"""
+Line generators for StreamingHttpResponse bodies.
+
+Each yields one encoded line at a time so a response of any size is
+written to the client as it is produced.
+"""
+
+import csv
+import json
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+# Leading characters spreadsheet apps treat as the start of a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_safe(value):
+    """Quote user text that a spreadsheet would otherwise evaluate as a formula"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_lines(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([csv_safe(value) for value in row])
+
+
+def jsonl_lines(objects):
+    for obj in objects:
+        yield json.dumps(obj, default=str) + '\n'
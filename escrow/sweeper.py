@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from services.paystack import PaystackService
+from .models import EscrowTransaction, TransactionEvent
+
+logger = logging.getLogger(__name__)
+
+# How long a sweep owns the rows it claimed for refunding
+REFUND_CLAIM_TIMEOUT = timedelta(hours=1)
+
+
+def expire_overdue(now=None, chunk_size=None):
+    """Move paid transactions past their deadline to 'expired'.
+
+    Each chunk is one indexed (status, deadline) lookup, one bulk UPDATE and
+    one bulk insert of ledger events, so memory use is bounded by
+    chunk_size. The rows are locked for the chunk's transaction, so none can
+    be confirmed between the lookup and the UPDATE.
+    """
+    now = now or timezone.now()
+    chunk_size = chunk_size or settings.ESCROW_SWEEP_CHUNK_SIZE
+    overdue = EscrowTransaction.objects.filter(status='paid', deadline__lt=now)
+    expired = 0
+
+    while True:
+        with db_transaction.atomic():
+            rows = list(
+                overdue.select_for_update().order_by('deadline')
+                .values_list('id', 'seller_id', 'net_kobo')[:chunk_size]
+            )
+            if not rows:
+                return expired
+            ids = [pk for pk, _, _ in rows]
+            expired += EscrowTransaction.objects.filter(id__in=ids, status='paid').update(status='expired')
+            TransactionEvent.objects.bulk_create([
+                TransactionEvent(
+                    transaction_id=pk, seller_id=seller_id, from_status='paid', to_status='expired', net_kobo=net_kobo,
+                )
+                for pk, seller_id, net_kobo in rows
+            ])
+        EscrowTransaction.invalidate_cached(ids)
+
+
+def _claim_refunds(chunk_size, now):
+    """Claim the next chunk of expired, unrefunded rows for this sweep.
+
+    Rows are locked with SKIP LOCKED and stamped in one short transaction,
+    so concurrent sweeps in any process claim different rows. A claim older
+    than REFUND_CLAIM_TIMEOUT belongs to a sweep that died or failed and is
+    taken over.
+    """
+    claimable = EscrowTransaction.objects.filter(status='expired', refunded_at__isnull=True).filter(
+        Q(refund_claimed_at__isnull=True) | Q(refund_claimed_at__lt=now - REFUND_CLAIM_TIMEOUT)
+    )
+    with db_transaction.atomic():
+        rows = list(
+            claimable.select_for_update(skip_locked=True).order_by('id')
+            .values_list('id', 'paystack_reference', 'price_kobo', 'refund_claimed_at')[:chunk_size]
+        )
+        EscrowTransaction.objects.filter(id__in=[row[0] for row in rows]).update(refund_claimed_at=now)
+    return rows
+
+
+def _refund(row, paystack_service):
+    pk, reference, price_kobo, claimed_at = row
+    reference = reference or str(pk)
+
+    # POST /refund is not idempotent. A row claimed before may have been
+    # refunded by a sweep that crashed before recording it, so ask first.
+    if claimed_at is not None:
+        existing = paystack_service.find_refunds(reference)
+        if not existing['success']:
+            logger.warning('Could not check earlier refunds for %s: %s', pk, existing['message'])
+            return pk, False
+        if any(refund.get('status') != 'failed' for refund in existing['data']):
+            return pk, True
+
+    # Logistics was released to the seller at payment; refund the product only.
+    result = paystack_service.refund_payment(reference, price_kobo)
+    if not result['success']:
+        logger.warning('Refund failed for %s: %s', pk, result['message'])
+    return pk, result['success']
+
+
+def refund_expired(chunk_size=None, concurrency=None, paystack_service=None):
+    """Issue Paystack refunds for expired transactions not yet refunded.
+
+    Each chunk is claimed in the database before Paystack is called, so
+    overlapping sweeps never refund the same row, and refunds run on at
+    most `concurrency` threads. Failed rows keep their claim and are
+    retried, after checking Paystack for an earlier refund, once it times
+    out. Returns (refunded, failed).
+    """
+    chunk_size = chunk_size or settings.ESCROW_SWEEP_CHUNK_SIZE
+    concurrency = concurrency or settings.ESCROW_REFUND_CONCURRENCY
+    paystack_service = paystack_service or PaystackService()
+    refunded = failed = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            rows = _claim_refunds(chunk_size, timezone.now())
+            if not rows:
+                return refunded, failed
+
+            results = list(pool.map(lambda row: _refund(row, paystack_service), rows))
+            succeeded = [pk for pk, success in results if success]
+            refunded += EscrowTransaction.objects.filter(
+                id__in=succeeded, refunded_at__isnull=True
+            ).update(refunded_at=timezone.now())
+            failed += len(rows) - len(succeeded)
@@ -0,0 +1,115 @@
+from smtplib import SMTPException
+
+from celery import shared_task
+from django.conf import settings
+from django.core.management import call_command
+from django.core.mail import get_connection
+
+from services.email_service import get_outbox, send_confirmation_code_emails
+from .ledger import take_balance_snapshots
+from .models import EscrowTransaction
+from .payments import verify_pending_payment
+from .payouts import run_payouts
+from .reconcile import reconcile
+from .sweeper import expire_overdue, refund_expired
+
+
+@shared_task(
+    autoretry_for=(SMTPException, OSError),
+    retry_backoff=True,
+    retry_backoff_max=300,
+    retry_jitter=True,
+    max_retries=8,
+    time_limit=settings.EMAIL_DRAIN_TIMEOUT,
+)
+def drain_email_outbox():
+    """Send queued confirmation code emails in batches over one connection.
+
+    Each id is acknowledged as soon as its email is sent, so a failure only
+    requeues the messages that have not gone out yet.
+    """
+    outbox = get_outbox()
+    sent = 0
+
+    with outbox.draining(settings.EMAIL_DRAIN_TIMEOUT) as claimed:
+        if not claimed:
+            return sent
+
+        batch = outbox.pop_batch(settings.EMAIL_BATCH_SIZE)
+        if not batch:
+            return sent
+
+        try:
+            with get_connection(fail_silently=False) as connection:
+                while batch:
+                    transactions = EscrowTransaction.objects.in_bulk(batch)
+                    by_id = {str(pk): transaction for pk, transaction in transactions.items()}
+                    while batch:
+                        pk = batch[0]
+                        sent += send_confirmation_code_emails(
+                            [by_id[pk]] if pk in by_id else [], connection=connection
+                        )
+                        outbox.ack(batch.pop(0))
+                    batch = outbox.pop_batch(settings.EMAIL_BATCH_SIZE)
+        except Exception:
+            # Put the unsent messages back in front so the retry picks them up first.
+            outbox.requeue(batch)
+            raise
+
+    return sent
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=5)
+def verify_payment(self, transaction_id):
+    """Finalize a payment the buyer's callback could not verify.
+
+    Acknowledged only once it finishes, so a worker crash means redelivery;
+    that is safe because finalizing is a no-op once the transaction has
+    left pending. Retries with backoff until Paystack reports the charge.
+    """
+    paid = verify_pending_payment(transaction_id)
+    if paid is False and self.request.retries < self.max_retries:
+        raise self.retry(countdown=settings.ESCROW_VERIFY_RETRY_DELAY * 2 ** self.request.retries)
+    return paid
+
+
+@shared_task
+def sweep_expired_escrows():
+    """Periodic expiry and auto-refund of overdue escrows"""
+    expired = expire_overdue()
+    refunded, failed = refund_expired()
+    return {'expired': expired, 'refunded': refunded, 'failed': failed}
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def pay_out_sellers():
+    """Periodic bulk transfer of released funds to sellers.
+
+    Safe to redeliver: runs hold a lock and payout ids double as transfer
+    references, so resubmitting cannot pay twice.
+    """
+    created, submitted, failed = run_payouts()
+    return {'created': created, 'submitted': submitted, 'failed': failed}
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def reconcile_payments():
+    """Periodic catch-up on charges whose callback and webhook both went missing.
+
+    Safe to redeliver: only pending transactions are marked paid.
+    """
+    report = reconcile()
+    return {'checked': report['checked'], 'applied': report['applied'],
+            'mismatches': len(report['mismatches']), 'error': report['error']}
+
+
+@shared_task
+def snapshot_seller_balances():
+    """Periodic balance snapshots so balance reads fold only recent events"""
+    return take_balance_snapshots()
+
+
+@shared_task
+def clear_expired_sessions():
+    """Delete expired sessions (a no-op for cache and cookie backends)"""
+    call_command('clearsessions')
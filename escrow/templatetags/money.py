@@ -0,0 +1,13 @@
+from django import template
+
+from escrow.money import kobo_to_naira
+
+register = template.Library()
+
+
+@register.filter
+def naira(kobo):
+    """Show an integer kobo amount in naira: {{ transaction.total_kobo|naira }} -> 11500.00"""
+    if kobo is None or kobo == '':
+        return ''
+    return kobo_to_naira(kobo)
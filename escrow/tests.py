@@ -1,3 +1,1472 @@
-from django.test import TestCase
+import asyncio
+import csv
+from datetime import timedelta
+from decimal import Decimal
+import hashlib
+import hmac
+import io
+import json
+import threading
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+import requests
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth import authenticate
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.db import IntegrityError, connection, transaction as db_transaction
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import metrics
+from core.celery import task_queues
+from core.db_router import ReadReplicaRouter, ReplicaRoutingMiddleware, use_replica
+from core.ratelimit import LocMemRateLimiter, client_ip, get_limiter, parse_rate
+from services import email_service
+from services.fake_paystack import FakePaystack
+from services.paystack import PaystackService
+from services.paystack_client import (
+    AsyncPaystackClient, CircuitBreaker, CircuitOpenError, PaystackClient, PaystackError,
+)
+from . import views
+from .admin import EstimatedCountPaginator
+from .benchmark import RENDER_SCENARIOS, load_baseline, query_regressions, run_benchmark, run_render_benchmark
+from .forms import EscrowTransactionForm
+from .ledger import seller_balance, take_balance_snapshots
+from .models import EscrowTransaction, Payout, Seller, SellerBalanceSnapshot, TransactionEvent
+from .payments import initialize_payment
+from .reconcile import reconcile
+from .payouts import run_payouts
+from .sweeper import REFUND_CLAIM_TIMEOUT, expire_overdue, refund_expired
+from .tasks import clear_expired_sessions, drain_email_outbox, verify_payment
+
+
+def make_seller(username='seller'):
+    user = User.objects.create_user(username=username, email=f'{username}@example.com', password='secret123')
+    return Seller.objects.create(user=user, phone='08000000000', bank_account='0123456789')
+
+
+@override_settings(METRICS_TOKEN='scrape-me')
+def scrape_metrics(client):
+    return client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-me').content.decode()
+
+
+def make_transaction(seller, **kwargs):
+    fields = {
+        'product_name': 'Sneakers',
+        'product_price': Decimal('10000.00'),
+        'logistics_fee': Decimal('1500.00'),
+        'buyer_email': 'buyer@example.com',
+    }
+    fields.update(kwargs)
+    return EscrowTransaction.objects.create(seller=seller, **fields)
+
+
+@override_settings(EMAIL_OUTBOX_URL='locmem://', EMAIL_BATCH_SIZE=2)
+class ConfirmationEmailQueueTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller()
+        self.outbox = email_service.get_outbox()
+        self.outbox.recover()
+        self.outbox.ack(*self.outbox.pop_batch(len(self.outbox)))
+
+    def paid_transaction(self, **kwargs):
+        return make_transaction(
+            self.seller, status='paid', confirmation_code='123456', paid_at=timezone.now(), **kwargs
+        )
+
+    @override_settings(EMAIL_DELIVERY_MODE='sync')
+    def test_sync_mode_sends_inline(self):
+        self.assertTrue(email_service.queue_confirmation_code_email(self.paid_transaction()))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(len(self.outbox), 0)
+
+    @override_settings(EMAIL_DELIVERY_MODE='queue')
+    def test_queue_mode_delivers_through_worker(self):
+        transaction = self.paid_transaction()
+        self.assertTrue(email_service.queue_confirmation_code_email(transaction))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('123456', mail.outbox[0].body)
+        self.assertEqual(mail.outbox[0].to, ['buyer@example.com'])
+
+    def test_drain_sends_all_batches_over_one_connection(self):
+        transactions = [self.paid_transaction() for _ in range(5)]
+        self.outbox.push(*(str(t.id) for t in transactions))
+
+        with mock.patch('escrow.tasks.get_connection', wraps=mail.get_connection) as get_connection:
+            self.assertEqual(drain_email_outbox(), 5)
+
+        get_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(len(self.outbox), 0)
+
+    def test_failed_batch_is_requeued(self):
+        transaction = self.paid_transaction()
+        self.outbox.push(str(transaction.id))
+
+        with mock.patch('escrow.tasks.send_confirmation_code_emails', side_effect=SMTPException):
+            with self.assertRaises(SMTPException):
+                drain_email_outbox()
+
+        self.assertEqual(self.outbox.pop_batch(10), [str(transaction.id)])
+
+    def test_failure_mid_batch_only_requeues_unsent_messages(self):
+        transactions = [self.paid_transaction() for _ in range(3)]
+        self.outbox.push(*(str(t.id) for t in transactions))
+        send = email_service.send_confirmation_code_emails
+
+        with mock.patch(
+            'escrow.tasks.send_confirmation_code_emails', side_effect=[send([transactions[0]]), SMTPException]
+        ):
+            with self.assertRaises(SMTPException):
+                drain_email_outbox()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(self.outbox.pop_batch(10), [str(t.id) for t in transactions[1:]])
+
+    def test_batch_of_a_dead_drain_is_recovered(self):
+        transaction = self.paid_transaction()
+        self.outbox.push(str(transaction.id))
+        self.outbox.pop_batch(10)
+
+        self.assertEqual(drain_email_outbox(), 1)
+        self.assertEqual(mail.outbox[0].to, ['buyer@example.com'])
+
+    def test_drain_skips_while_another_drain_runs(self):
+        self.outbox.push(str(self.paid_transaction().id))
+
+        with self.outbox.draining(60) as claimed:
+            self.assertTrue(claimed)
+            self.assertEqual(drain_email_outbox(), 0)
+
+        self.assertEqual(len(self.outbox), 1)
+
+
+WEBHOOK_SECRET = 'sk_test_webhook'
+
+CHARGE_SUCCESS = {
+    'event': 'charge.success',
+    'data': {
+        'id': 302961,
+        'domain': 'test',
+        'status': 'success',
+        'reference': None,
+        'amount': 1150000,
+        'gateway_response': 'Successful',
+        'paid_at': '2025-11-05T11:39:00.000Z',
+        'channel': 'card',
+        'currency': 'NGN',
+        'customer': {'email': 'buyer@example.com'},
+    },
+}
+
+
+def post_webhook(client, event, secret=WEBHOOK_SECRET):
+    body = json.dumps(event).encode()
+    signature = hmac.new(secret.encode(), body, hashlib.sha512).hexdigest()
+    return client.post(
+        reverse('paystack_webhook'), body,
+        content_type='application/json', headers={'x-paystack-signature': signature},
+    )
+
+
+@override_settings(PAYSTACK_WEBHOOK_SECRET=WEBHOOK_SECRET, EMAIL_DELIVERY_MODE='sync')
+class PaystackWebhookTests(TestCase):
+    def setUp(self):
+        self.transaction = make_transaction(make_seller())
+
+    def post_event(self, event, secret=WEBHOOK_SECRET):
+        return post_webhook(self.client, event, secret)
+
+    def charge_success(self, **data):
+        event = json.loads(json.dumps(CHARGE_SUCCESS))
+        event['data'].update(reference=str(self.transaction.id), **data)
+        return event
+
+    def test_charge_success_marks_paid_once(self):
+        self.assertEqual(self.post_event(self.charge_success()).status_code, 200)
+        self.assertEqual(self.post_event(self.charge_success()).status_code, 200)
+
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'paid')
+        self.assertTrue(self.transaction.logistics_released)
+        self.assertEqual(len(self.transaction.confirmation_code), 6)
+        self.assertIsNotNone(self.transaction.deadline)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_bad_signature_is_rejected(self):
+        response = self.post_event(self.charge_success(), secret='wrong')
+        self.assertEqual(response.status_code, 401)
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'pending')
+
+    def test_unsigned_request_is_rejected(self):
+        response = self.client.post(
+            reverse('paystack_webhook'), json.dumps(self.charge_success()), content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 401)
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'pending')
+
+    @override_settings(PAYSTACK_WEBHOOK_SECRET='', PAYSTACK_SECRET_KEY='')
+    def test_rejected_when_no_secret_is_configured(self):
+        response = self.post_event(self.charge_success(), secret='')
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(PaystackService().verify_webhook_signature(b'{}', ''))
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'pending')
+
+    def test_amount_mismatch_is_ignored(self):
+        self.assertEqual(self.post_event(self.charge_success(amount=100)).status_code, 200)
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'pending')
+
+    def test_callback_skips_verify_after_webhook(self):
+        self.post_event(self.charge_success())
+
+        with mock.patch('escrow.views.paystack_service.verify_payment') as verify_payment:
+            response = self.client.get(reverse('paystack_callback'), {'reference': str(self.transaction.id)})
+
+        verify_payment.assert_not_called()
+        self.assertRedirects(response, reverse('payment_success', args=[self.transaction.id]))
+
+    def test_callback_verifies_when_webhook_is_late(self):
+        with mock.patch(
+            'escrow.views.paystack_service.verify_payment', return_value={'success': True, 'data': {}}
+        ) as verify_payment:
+            self.client.get(reverse('paystack_callback'), {'reference': str(self.transaction.id)})
+
+        verify_payment.assert_called_once_with(str(self.transaction.id))
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'paid')
+
+
+class EscrowTransactionAmountTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller()
+
+    def test_database_amounts_match_python_rounding(self):
+        for price in ['1.00', '0.60', '1.40', '19.99', '12345.67', '100.02']:
+            make_transaction(self.seller, product_price=Decimal(price), logistics_fee=Decimal('0.05'))
+
+        for stored in EscrowTransaction.objects.all():
+            unsaved = EscrowTransaction(price_kobo=stored.price_kobo, logistics_kobo=stored.logistics_kobo)
+            self.assertEqual(stored.platform_fee, unsaved.platform_fee)
+            self.assertEqual(stored.seller_amount, unsaved.seller_amount)
+            self.assertEqual(stored.total_amount, unsaved.total_amount)
+            self.assertEqual(stored.total_kobo, stored.fee_kobo + stored.net_kobo + stored.logistics_kobo)
+
+    def test_amounts_are_exact_kobo(self):
+        transaction = make_transaction(self.seller, product_price='0.29', logistics_fee='1234567.89')
+
+        self.assertEqual((transaction.price_kobo, transaction.logistics_kobo), (29, 123456789))
+        self.assertEqual(transaction.total_kobo, 123456818)
+        # float(0.29) * 100 truncates to 28 kobo
+        self.assertEqual(PaystackService()._initialize_data(transaction)['amount'], 123456818)
+        self.assertEqual(PaystackService()._initialize_data(transaction)['metadata']['product_price_kobo'], 29)
+
+    def test_saved_price_changes_refresh_derived_amounts(self):
+        transaction = make_transaction(self.seller)
+
+        transaction.product_price = Decimal('200.00')
+        transaction.save()
+
+        self.assertEqual(transaction.total_amount, Decimal('1700.00'))
+        self.assertEqual(EscrowTransaction.objects.get(pk=transaction.pk).total_kobo, 170000)
+
+    def test_create_page_rerenders_invalid_amounts_without_a_seller(self):
+        user = User.objects.create_user('newseller', 'new@example.com', 'secret123')
+        self.client.force_login(user)
+        url = reverse('create_payment_link')
+        details = {'product_name': 'Cap', 'seller_phone': '08000000000', 'bank_account': '0123456789'}
+
+        for price in ('-100', 'abc'):
+            response = self.client.post(url, {**details, 'product_price': price, 'logistics_fee': '0'})
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('product_price', response.context['form'].errors)
+        self.assertFalse(Seller.objects.filter(user=user).exists())
+
+        response = self.client.post(url, {**details, 'product_price': '10.50', 'logistics_fee': '1'})
+        transaction = EscrowTransaction.objects.get(seller__user=user)
+        self.assertRedirects(response, reverse('payment_link_detail', args=[transaction.id]))
+        self.assertEqual((transaction.price_kobo, transaction.logistics_kobo), (1050, 100))
+        self.assertEqual(EscrowTransaction.PLATFORM_FEE_PERCENT, Decimal('2.5'))
+
+    def test_negative_amounts_are_refused_by_the_database(self):
+        for amounts in ({'product_price': '-100.01'}, {'logistics_fee': '-0.05'}):
+            with self.subTest(**amounts), self.assertRaises(IntegrityError), db_transaction.atomic():
+                make_transaction(self.seller, **amounts)
+
+    def test_form_takes_naira_with_at_most_two_decimals(self):
+        form = EscrowTransactionForm({'product_name': 'Cap', 'product_price': '10.50', 'logistics_fee': '0'})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.save(commit=False).price_kobo, 1050)
+
+        form = EscrowTransactionForm({'product_name': 'Cap', 'product_price': '10.505', 'logistics_fee': '0'})
+        self.assertIn('product_price', form.errors)
+
+    def test_totals_are_bucketed_by_status_in_one_query(self):
+        make_transaction(self.seller, status='pending')
+        make_transaction(self.seller, status='paid')
+        make_transaction(self.seller, status='confirmed')
+        make_transaction(self.seller, status='confirmed')
+        make_transaction(self.seller, status='refunded')
+        make_transaction(self.seller, status='expired')
+
+        with self.assertNumQueries(1):
+            totals = self.seller.escrowtransaction_set.totals()
+
+        self.assertEqual(totals['pending'], Decimal('9750.00'))
+        self.assertEqual(totals['held'], Decimal('9750.00'))
+        self.assertEqual(totals['released'], Decimal('19500.00'))
+        self.assertEqual(totals['refunded_count'], 2)
+        self.assertEqual(self.seller.total_earnings, Decimal('19500.00'))
+
+
+class SellerDashboardPaginationTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller()
+        self.client.force_login(self.seller.user)
+        now = timezone.now()
+        self.transactions = []
+        for i in range(7):
+            transaction = make_transaction(self.seller, status='paid' if i % 2 else 'pending')
+            # Two rows per timestamp exercise the id tie-breaker.
+            transaction.created_at = now - timedelta(days=i // 2)
+            transaction.save(update_fields=['created_at'])
+            self.transactions.append(transaction)
+
+    def fetch_all(self, **params):
+        ids, cursor = [], None
+        while True:
+            query = dict(params, **({'cursor': cursor} if cursor else {}))
+            page = self.client.get(reverse('seller_transactions'), query).json()
+            ids += [row['id'] for row in page['results']]
+            cursor = page['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_pages_cover_every_row_once_in_order(self):
+        with mock.patch('escrow.views.DASHBOARD_PAGE_SIZE', 3):
+            ids = self.fetch_all()
+
+        expected = EscrowTransaction.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        self.assertEqual(ids, [str(pk) for pk in expected])
+
+    def test_status_and_date_filters(self):
+        paid = self.fetch_all(status='paid')
+        self.assertEqual(len(paid), 3)
+
+        today = timezone.localdate().isoformat()
+        self.assertEqual(len(self.fetch_all(date_from=today, date_to=today)), 2)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('seller_transactions'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_dashboard_renders_first_page(self):
+        with mock.patch('escrow.views.DASHBOARD_PAGE_SIZE', 3):
+            response = self.client.get(reverse('seller_dashboard'))
+        self.assertEqual(len(response.context['transactions']), 3)
+        self.assertIsNotNone(response.context['next_cursor'])
+
+
+class ExpirySweepTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller()
+
+    def paid(self, deadline):
+        return make_transaction(
+            self.seller, status='paid', paid_at=deadline - timedelta(days=3), deadline=deadline,
+            paystack_reference='ref',
+        )
+
+    def test_expire_overdue_in_chunks(self):
+        now = timezone.now()
+        overdue = [self.paid(now - timedelta(hours=i + 1)) for i in range(5)]
+        current = self.paid(now + timedelta(days=1))
+
+        self.assertEqual(expire_overdue(now=now, chunk_size=2), 5)
+
+        self.assertEqual(
+            set(EscrowTransaction.objects.filter(status='expired').values_list('id', flat=True)),
+            {t.id for t in overdue},
+        )
+        current.refresh_from_db()
+        self.assertEqual(current.status, 'paid')
+
+    def test_refund_expired_marks_successes_and_keeps_failures_claimed(self):
+        transactions = [make_transaction(self.seller, status='expired') for _ in range(4)]
+        failing = min(t.id for t in transactions)
+        paystack = mock.Mock()
+        paystack.refund_payment.side_effect = lambda reference, amount: {
+            'success': reference != str(failing), 'message': 'declined',
+        }
+
+        self.assertEqual(refund_expired(chunk_size=3, concurrency=2, paystack_service=paystack), (3, 1))
+
+        paystack.refund_payment.assert_any_call(str(failing), 1000000)
+        unrefunded = EscrowTransaction.objects.get(refunded_at__isnull=True)
+        self.assertEqual(unrefunded.id, failing)
+        self.assertIsNotNone(unrefunded.refund_claimed_at)
+
+        # Still claimed, so an immediate second sweep leaves it alone.
+        self.assertEqual(refund_expired(paystack_service=paystack), (0, 0))
+        self.assertEqual(paystack.refund_payment.call_count, 4)
+
+    def test_retry_after_crash_checks_paystack_instead_of_refunding_twice(self):
+        transaction = make_transaction(self.seller, status='expired')
+        with FakePaystack() as paystack, override_settings(PAYSTACK_BASE_URL=paystack.url):
+            paystack.add_transaction(str(transaction.id), transaction.total_kobo)
+            self.assertEqual(refund_expired(), (1, 0))
+
+            # Crash between Paystack accepting the refund and recording it
+            EscrowTransaction.objects.filter(pk=transaction.pk).update(
+                refunded_at=None, refund_claimed_at=timezone.now() - REFUND_CLAIM_TIMEOUT - timedelta(minutes=1),
+            )
+            self.assertEqual(refund_expired(), (1, 0))
+
+            self.assertEqual(len(paystack.refunds), 1)
+            self.assertEqual(paystack.refunds[0]['amount'], 1000000)
+        transaction.refresh_from_db()
+        self.assertIsNotNone(transaction.refunded_at)
+
+
+class PaystackClientTests(TestCase):
+    def setUp(self):
+        self.paystack = FakePaystack().start()
+        self.addCleanup(self.paystack.stop)
+
+    def make_client(self, **kwargs):
+        kwargs.setdefault('backoff', 0)
+        client = PaystackClient('sk_test', base_url=self.paystack.url, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_payment_round_trip_against_fake_server(self):
+        transaction = make_transaction(make_seller())
+        service = PaystackService(self.make_client())
+
+        result = service.initialize_payment(transaction)
+        self.assertTrue(result['success'])
+        self.assertEqual(self.paystack.transactions[str(transaction.id)]['amount'], 1150000)
+
+        self.assertFalse(service.verify_payment(str(transaction.id))['success'])
+        self.paystack.charge(str(transaction.id))
+        self.assertTrue(service.verify_payment(str(transaction.id))['success'])
+
+    def test_idempotent_calls_are_retried(self):
+        client = self.make_client(max_retries=2)
+        self.paystack.fail_next(2, status=503)
+
+        response = client.get('/transaction/verify/missing')
+
+        self.assertFalse(response['status'])
+        self.assertEqual(len(self.paystack.requests), 3)
+
+    def test_non_idempotent_calls_are_not_retried(self):
+        client = self.make_client(max_retries=2)
+        self.paystack.fail_next(1, status=502)
+
+        with self.assertRaises(PaystackError):
+            client.post('/refund', json={'transaction': 'ref'})
+        self.assertEqual(len(self.paystack.requests), 1)
+
+    def test_read_timeout(self):
+        self.paystack.delay = 0.5
+        client = self.make_client(read_timeout=0.05, max_retries=0)
+
+        with self.assertRaises(PaystackError):
+            client.get('/transaction/verify/ref')
+
+    def test_circuit_opens_and_fails_fast(self):
+        now = [0]
+        client = self.make_client(
+            max_retries=0, breaker=CircuitBreaker(threshold=2, reset_timeout=30, clock=lambda: now[0])
+        )
+        self.paystack.fail_next(2)
+
+        for _ in range(2):
+            with self.assertRaises(PaystackError):
+                client.get('/transaction/verify/ref')
+        with self.assertRaises(CircuitOpenError):
+            client.get('/transaction/verify/ref')
+        self.assertEqual(len(self.paystack.requests), 2)
+
+        now[0] = 31
+        client.get('/transaction/verify/ref')
+        self.assertFalse(client.breaker.is_open)
+
+    def test_unexpected_error_in_trial_call_does_not_wedge_the_circuit(self):
+        now = [0]
+        client = self.make_client(
+            max_retries=0, breaker=CircuitBreaker(threshold=1, reset_timeout=30, clock=lambda: now[0])
+        )
+        self.paystack.fail_next(1)
+        with self.assertRaises(PaystackError):
+            client.get('/transaction/verify/ref')
+
+        now[0] = 31
+        with mock.patch.object(client.session, 'request', side_effect=requests.exceptions.ChunkedEncodingError):
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                client.get('/transaction/verify/ref')
+        self.assertTrue(client.breaker.is_open)
+
+        now[0] = 62
+        client.get('/transaction/verify/ref')
+        self.assertFalse(client.breaker.is_open)
+
+    async def test_cancelled_trial_call_releases_the_circuit(self):
+        now = [0]
+        client = AsyncPaystackClient(
+            'sk_test', base_url=self.paystack.url, max_retries=0,
+            breaker=CircuitBreaker(threshold=1, reset_timeout=30, clock=lambda: now[0]),
+        )
+        self.paystack.fail_next(1)
+        with self.assertRaises(PaystackError):
+            await client.get('/transaction/verify/ref')
+
+        now[0] = 31
+        self.paystack.delay = 1
+        trial = asyncio.ensure_future(client.get('/transaction/verify/ref'))
+        await asyncio.sleep(0.1)
+        trial.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await trial
+
+        self.paystack.delay = 0
+        try:
+            await client.get('/transaction/verify/ref')
+        finally:
+            await client.aclose()
+        self.assertFalse(client.breaker.is_open)
+
+
+@override_settings(EMAIL_DELIVERY_MODE='sync')
+class AsyncPaymentViewTests(TestCase):
+    def setUp(self):
+        self.paystack = FakePaystack().start()
+        self.addCleanup(self.paystack.stop)
+        self.transaction = make_transaction(make_seller())
+        self.factory = AsyncRequestFactory()
+
+    def request(self, method, path, **params):
+        request = getattr(self.factory, method)(path, params)
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        return request
+
+    async def call(self, view, request, **kwargs):
+        client = AsyncPaystackClient('sk_test', base_url=self.paystack.url)
+        try:
+            with mock.patch('escrow.views.paystack_service', PaystackService(async_client=client)):
+                return await view(request, **kwargs)
+        finally:
+            await client.aclose()
+
+    async def test_payment_page_redirects_to_paystack(self):
+        response = await self.call(
+            views.apayment_page, self.request('post', '/pay/'), transaction_id=self.transaction.id
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, f'{self.paystack.url}/checkout/{self.transaction.id}')
+
+    async def test_callback_verifies_and_marks_paid(self):
+        reference = str(self.transaction.id)
+        await self.call(views.apayment_page, self.request('post', '/pay/'), transaction_id=self.transaction.id)
+        self.paystack.charge(reference)
+
+        response = await self.call(
+            views.apaystack_callback, self.request('get', '/paystack/callback/', reference=reference)
+        )
+
+        self.assertEqual(response.url, reverse('payment_success', args=[self.transaction.id]))
+        await self.transaction.arefresh_from_db()
+        self.assertEqual(self.transaction.status, 'paid')
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class EscrowTransitionTests(TestCase):
+    def setUp(self):
+        self.transaction = make_transaction(make_seller())
+
+    def test_mark_paid_is_a_single_conditional_update(self):
+        # savepoint, conditional UPDATE, ledger event, release
+        with self.assertNumQueries(4):
+            self.assertTrue(self.transaction.mark_paid('ref-1'))
+
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'paid')
+        self.assertEqual(self.transaction.paystack_reference, 'ref-1')
+        self.assertEqual(self.transaction.deadline, self.transaction.paid_at + timedelta(days=3))
+
+    def test_only_one_of_two_stale_copies_wins(self):
+        stale = EscrowTransaction.objects.get(pk=self.transaction.pk)
+
+        self.assertTrue(self.transaction.mark_paid('ref-1'))
+        self.assertFalse(stale.mark_paid('ref-2'))
+
+        stale.refresh_from_db()
+        self.assertEqual(stale.paystack_reference, 'ref-1')
+        self.assertEqual(stale.confirmation_code, self.transaction.confirmation_code)
+
+    def test_invalid_transitions_are_rejected(self):
+        self.assertFalse(self.transaction.confirm())
+        self.assertFalse(self.transaction.expire())
+
+        self.transaction.mark_paid('ref')
+        self.assertTrue(self.transaction.confirm())
+        self.assertFalse(self.transaction.refund())
+        self.assertEqual(EscrowTransaction.objects.get(pk=self.transaction.pk).status, 'confirmed')
+
+    def test_confirm_delivery_view(self):
+        self.transaction.mark_paid('ref')
+        url = reverse('confirm_delivery', args=[self.transaction.id])
+
+        wrong_code = str((int(self.transaction.confirmation_code) + 1) % 10 ** 6).zfill(6)
+        self.client.post(url, {'confirmation_code': wrong_code})
+        self.assertEqual(EscrowTransaction.objects.get(pk=self.transaction.pk).status, 'paid')
+
+        response = self.client.post(url, {'confirmation_code': self.transaction.confirmation_code})
+        self.assertRedirects(response, reverse('confirmation_success'))
+        self.transaction.refresh_from_db()
+        self.assertTrue(self.transaction.product_released)
+
+
+class TransactionCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.transaction = make_transaction(make_seller())
+
+    def test_repeat_page_views_skip_the_database(self):
+        url = reverse('payment_page', args=[self.transaction.id])
+        self.client.get(url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Sneakers')
+
+    def test_transitions_invalidate_snapshot(self):
+        self.assertEqual(EscrowTransaction.get_cached(self.transaction.id).status, 'pending')
+
+        self.transaction.mark_paid('ref')
+
+        cached = EscrowTransaction.get_cached(self.transaction.id)
+        self.assertEqual(cached.status, 'paid')
+        self.assertEqual(cached.confirmation_code, self.transaction.confirmation_code)
+
+    def test_bulk_expiry_invalidates_snapshot(self):
+        self.transaction.mark_paid('ref')
+        EscrowTransaction.get_cached(self.transaction.id)
+
+        expire_overdue(now=self.transaction.deadline + timedelta(seconds=1))
+
+        self.assertEqual(EscrowTransaction.get_cached(self.transaction.id).status, 'expired')
+
+
+class ReadReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReadReplicaRouter()
+        databases = mock.patch('core.db_router.connections', mock.Mock(databases={'default': {}, 'replica': {}}))
+        databases.start()
+        self.addCleanup(databases.stop)
+
+    def test_reads_use_primary_by_default(self):
+        self.assertEqual(self.router.db_for_read(EscrowTransaction), 'default')
+
+    def test_replica_only_for_escrow_reads_when_enabled(self):
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(EscrowTransaction), 'replica')
+            self.assertEqual(self.router.db_for_read(User), 'default')
+            self.assertEqual(self.router.db_for_write(EscrowTransaction), 'default')
+
+    async def test_middleware_routes_async_requests_without_a_thread(self):
+        async def view(request):
+            return HttpResponse(self.router.db_for_read(EscrowTransaction))
+
+        middleware = ReplicaRoutingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        factory = AsyncRequestFactory()
+        dashboard = await middleware(factory.get('/dashboard/'))
+        payment = await middleware(factory.get('/pay/'))
+        self.assertEqual(dashboard.content, b'replica')
+        self.assertEqual(payment.content, b'default')
+
+
+class LifecycleBenchmarkTests(TestCase):
+    def test_query_counts_stay_within_baseline(self):
+        summary = run_benchmark(iterations=3)
+
+        self.assertEqual(summary['errors'], [])
+        self.assertEqual(query_regressions(summary, load_baseline()), [])
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        for metric in metrics.REGISTRY:
+            metric.clear()
+        self.transaction = make_transaction(make_seller())
+
+    def test_views_record_latency_queries_and_templates(self):
+        self.client.get(reverse('payment_page', args=[self.transaction.id]))
+
+        body = scrape_metrics(self.client)
+        self.assertIn('escrow_http_request_duration_seconds_count{view="payment_page",method="GET",status="200"} 1', body)
+        self.assertIn('escrow_http_request_queries_count{view="payment_page"} 1', body)
+        self.assertIn('escrow_template_render_duration_seconds_count{template="escrow/payment_page.html"} 1', body)
+
+    def test_external_calls_are_timed(self):
+        with FakePaystack() as paystack:
+            client = PaystackClient('sk_test', base_url=paystack.url)
+            self.addCleanup(client.close)
+            PaystackService(client).verify_payment('missing')
+
+        body = scrape_metrics(self.client)
+        self.assertIn(
+            'escrow_external_call_duration_seconds_count{service="paystack",operation="verify",outcome="ok"} 1', body
+        )
+
+    async def test_concurrent_async_requests_count_their_own_queries(self):
+        async def view(request):
+            for _ in range(int(request.GET['queries'])):
+                await EscrowTransaction.objects.acount()
+                await asyncio.sleep(0)
+            match = mock.Mock(view_name=f"view{request.GET['queries']}")
+            request.resolver_match = match
+            return HttpResponse()
+
+        middleware = metrics.MetricsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        factory = AsyncRequestFactory()
+        await asyncio.gather(
+            middleware(factory.get('/', {'queries': 1})), middleware(factory.get('/', {'queries': 10})),
+        )
+
+        body = metrics.REQUEST_QUERIES.render()
+        self.assertIn('escrow_http_request_queries_sum{view="view1"} 1.0', body)
+        self.assertIn('escrow_http_request_queries_sum{view="view10"} 10.0', body)
+
+    def test_metrics_endpoint_is_closed_without_a_token_unless_debugging(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_unknown_methods_share_one_label(self):
+        self.client.generic('BREW', reverse('payment_page', args=[self.transaction.id]))
+        self.client.generic('PROPFIND', reverse('payment_page', args=[self.transaction.id]))
+
+        body = scrape_metrics(self.client)
+        self.assertIn('_count{view="payment_page",method="other",status="200"} 2', body)
+        self.assertNotIn('BREW', body)
+
+    @override_settings(METRICS_SLOW_REQUEST_QUERIES=1)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('core.metrics.slow', 'WARNING') as logs:
+            self.client.get(reverse('payment_page', args=[self.transaction.id]))
+
+        self.assertIn('(payment_page)', logs.output[0])
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_metrics_endpoint_requires_token_when_configured(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(ESCROW_BULK_CHUNK_SIZE=2)
+class BulkPaymentLinkTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller()
+        self.client.force_login(self.seller.user)
+
+    def upload(self, body, content_type):
+        response = self.client.post(reverse('bulk_create_payment_links'), body, content_type=content_type)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_rows_are_created_in_chunks_with_per_row_results(self):
+        body = 'product_name,product_price,logistics_fee,buyer_email\n' + ''.join(
+            f'Item {i},100{i}.00,500.00,buyer{i}@example.com\n' for i in range(5)
+        ) + 'Broken,not-a-price,500.00,\n'
+
+        # session, user and seller, then savepoint, inserts and release per chunk
+        with self.assertNumQueries(3 + 4 * 3):
+            rows = list(csv.DictReader(io.StringIO(self.upload(body, 'text/csv'))))
+
+        self.assertEqual([row['status'] for row in rows], ['created'] * 5 + ['error'])
+        self.assertIn('product_price', json.loads(rows[5]['errors']))
+        created = EscrowTransaction.objects.get(pk=rows[0]['id'])
+        self.assertEqual((created.seller, created.product_name), (self.seller, 'Item 0'))
+        self.assertEqual(rows[0]['payment_url'], f'http://testserver/pay/{created.id}/')
+
+    def test_negative_amounts_are_rejected(self):
+        body = '\n'.join([
+            json.dumps({'product_name': 'Phone', 'product_price': '-100', 'logistics_fee': 2000}),
+            json.dumps({'product_name': 'Case', 'product_price': 3000, 'logistics_fee': '-5'}),
+        ])
+
+        rows = [json.loads(line) for line in self.upload(body, 'application/x-ndjson').splitlines()]
+
+        self.assertEqual([row['status'] for row in rows], ['error', 'error'])
+        self.assertIn('product_price', rows[0]['errors'])
+        self.assertIn('logistics_fee', rows[1]['errors'])
+        self.assertFalse(EscrowTransaction.objects.exists())
+
+    def test_jsonl_upload_and_row_limit(self):
+        body = '\n'.join([
+            json.dumps({'product_name': 'Phone', 'product_price': 50000, 'logistics_fee': 2000}),
+            'not json',
+            json.dumps({'product_name': 'Case', 'product_price': 3000, 'logistics_fee': 500}),
+        ])
+
+        with override_settings(ESCROW_BULK_MAX_ROWS=2):
+            results = [json.loads(line) for line in self.upload(body, 'application/x-ndjson').splitlines()]
+
+        self.assertEqual([(r['row'], r['status']) for r in results], [(1, 'created'), (2, 'error'), (3, 'error')])
+        self.assertEqual(EscrowTransaction.objects.filter(seller=self.seller).count(), 1)
+
+
+class TransactionExportTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller()
+        self.paid = make_transaction(self.seller, product_price=Decimal('999.99'), status='paid')
+        self.pending = make_transaction(self.seller)
+        make_transaction(make_seller('other'))
+
+    def test_seller_csv_export_streams_own_rows_with_amounts(self):
+        self.client.force_login(self.seller.user)
+
+        response = self.client.get(reverse('export_transactions'), {'status': 'paid'})
+
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['id'] for row in rows], [str(self.paid.id)])
+        self.assertEqual(
+            (rows[0]['total_amount'], rows[0]['platform_fee'], rows[0]['seller_amount']),
+            (str(self.paid.total_amount), str(self.paid.platform_fee), str(self.paid.seller_amount)),
+        )
+
+    def test_csv_export_neutralises_formulas_but_jsonl_keeps_raw_text(self):
+        EscrowTransaction.objects.filter(pk=self.paid.pk).update(
+            product_name='=HYPERLINK("http://evil.example","click")', buyer_email='@SUM(A1)'
+        )
+        self.client.force_login(self.seller.user)
+
+        response = self.client.get(reverse('export_transactions'), {'status': 'paid'})
+        row = next(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(row['product_name'], '\'=HYPERLINK("http://evil.example","click")')
+        self.assertEqual(row['buyer_email'], "'@SUM(A1)")
+
+        response = self.client.get(reverse('export_transactions'), {'status': 'paid', 'format': 'jsonl'})
+        row = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(row['product_name'], '=HYPERLINK("http://evil.example","click")')
+
+    def test_ledger_export_is_staff_only_and_filters_by_seller(self):
+        self.client.force_login(self.seller.user)
+        self.assertEqual(self.client.get(reverse('export_ledger')).status_code, 302)
+
+        User.objects.filter(pk=self.seller.user.pk).update(is_staff=True)
+        response = self.client.get(reverse('export_ledger'), {'seller': self.seller.pk, 'format': 'jsonl'})
+
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual({row['id'] for row in rows}, {str(self.paid.id), str(self.pending.id)})
+
+
+@override_settings(PAYSTACK_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class SellerPayoutTests(TestCase):
+    def setUp(self):
+        self.paystack = FakePaystack().start()
+        self.addCleanup(self.paystack.stop)
+        self.service = PaystackService(PaystackClient('sk_test', base_url=self.paystack.url, backoff=0))
+        self.addCleanup(self.service.client.close)
+
+        self.seller = make_seller()
+        Seller.objects.filter(pk=self.seller.pk).update(recipient_code='RCP_seller')
+        # Paid: logistics released. Confirmed: logistics and product released.
+        make_transaction(self.seller, status='paid', logistics_released=True)
+        make_transaction(self.seller, status='confirmed', logistics_released=True, product_released=True)
+        make_transaction(self.seller)
+        make_transaction(make_seller('no-recipient'), status='paid', logistics_released=True)
+
+    def test_released_funds_are_paid_in_one_transfer_per_seller(self):
+        self.assertEqual(run_payouts(paystack_service=self.service), (1, 1, 0))
+
+        payout = Payout.objects.get()
+        # Two logistics fees plus the confirmed product net of the 2.5% fee
+        self.assertEqual(payout.amount, Decimal('1500.00') * 2 + Decimal('9750.00'))
+        self.assertEqual(payout.status, 'processing')
+        self.assertEqual(self.paystack.transfers[str(payout.id)]['amount'], 1275000)
+        self.assertEqual(self.paystack.requests.count(('POST', '/transfer/bulk')), 1)
+
+        # Nothing new is released, so a second run transfers nothing.
+        self.assertEqual(run_payouts(paystack_service=self.service), (0, 0, 0))
+
+        post_webhook(self.client, {'event': 'transfer.success', 'data': {'reference': str(payout.id)}})
+        payout.refresh_from_db()
+        self.assertEqual(payout.status, 'paid')
+
+    def test_failed_submission_is_retried_under_the_same_reference(self):
+        self.paystack.fail_next(3, status=500)
+        self.assertEqual(run_payouts(paystack_service=self.service), (1, 0, 1))
+
+        self.assertEqual(run_payouts(paystack_service=self.service), (0, 1, 0))
+        self.assertEqual(list(self.paystack.transfers), [str(Payout.objects.get().id)])
+
+    def test_failed_transfer_releases_transactions_for_the_next_run(self):
+        run_payouts(paystack_service=self.service)
+        failed = Payout.objects.get()
+
+        post_webhook(self.client, {'event': 'transfer.failed', 'data': {'reference': str(failed.id), 'reason': 'Bank error'}})
+        run_payouts(paystack_service=self.service)
+
+        failed.refresh_from_db()
+        self.assertEqual((failed.status, failed.failure_reason), ('failed', 'Bank error'))
+        retry = Payout.objects.exclude(pk=failed.pk).get()
+        self.assertEqual((retry.amount, retry.status), (failed.amount, 'processing'))
+
+    def test_seller_without_recipient_is_registered_before_payout(self):
+        newcomer = make_seller('newcomer')
+        Seller.objects.filter(pk=newcomer.pk).update(bank_name=' Access Bank ')
+        make_transaction(newcomer, status='paid', logistics_released=True)
+
+        self.assertEqual(run_payouts(paystack_service=self.service), (2, 2, 0))
+
+        newcomer.refresh_from_db()
+        recipient = self.paystack.recipients[('0123456789', '044')]
+        self.assertEqual(newcomer.recipient_code, recipient['recipient_code'])
+        self.assertEqual(recipient['name'], 'newcomer')
+        payout = Payout.objects.get(seller=newcomer)
+        self.assertEqual(self.paystack.transfers[str(payout.id)]['recipient'], newcomer.recipient_code)
+        # Sellers whose bank cannot be matched stay unpaid until they fix it.
+        self.assertFalse(Payout.objects.filter(seller__user__username='no-recipient').exists())
+
+        # The recipient is only created once.
+        make_transaction(newcomer, status='paid', logistics_released=True)
+        run_payouts(paystack_service=self.service)
+        self.assertEqual(self.paystack.requests.count(('POST', '/transferrecipient')), 1)
+
+
+class TransactionLedgerTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller()
+        self.transactions = [make_transaction(self.seller, product_price=Decimal(price)) for price in ('1000.00', '2500.50', '999.99')]
+
+    def assertBalanceMatchesRows(self):
+        self.assertEqual(seller_balance(self.seller.pk), EscrowTransaction.objects.filter(seller=self.seller).totals())
+
+    def test_every_transition_appends_an_event(self):
+        first, second, third = self.transactions
+        first.mark_paid('ref-1')
+        first.confirm()
+        second.mark_paid('ref-2')
+        EscrowTransaction.objects.filter(pk=second.pk).update(deadline=timezone.now() - timedelta(days=1))
+        expire_overdue()
+
+        history = list(first.events.order_by('id').values_list('from_status', 'to_status'))
+        self.assertEqual(history, [('', 'pending'), ('pending', 'paid'), ('paid', 'confirmed')])
+        self.assertEqual(second.events.latest('id').to_status, 'expired')
+        self.assertBalanceMatchesRows()
+
+        with self.assertRaises(ValueError):
+            first.events.first().save()
+
+    def test_balance_reads_snapshot_plus_recent_events(self):
+        first, second, _ = self.transactions
+        first.mark_paid('ref-1')
+        self.assertEqual(take_balance_snapshots(now=timezone.now() + timedelta(minutes=5)), 1)
+        second.mark_paid('ref-2')
+        first.confirm()
+
+        snapshot = SellerBalanceSnapshot.objects.get()
+        self.assertEqual((snapshot.pending_count, snapshot.held_count), (2, 1))
+        with self.assertNumQueries(2):
+            balance = seller_balance(self.seller.pk)
+        self.assertEqual(balance, EscrowTransaction.objects.filter(seller=self.seller).totals())
+
+    def test_amount_edits_append_adjustments(self):
+        first, second, _ = self.transactions
+        first.mark_paid('ref-1')
+        take_balance_snapshots(now=timezone.now() + timedelta(minutes=5))
+
+        first.refresh_from_db()
+        first.product_price = Decimal('4000.00')
+        first.save()
+        second.product_price = Decimal('10.00')
+        second.status = 'paid'
+        second.save()
+
+        self.assertEqual(
+            list(first.events.order_by('id').values_list('from_status', 'to_status', 'net_kobo'))[-2:],
+            [('paid', '', 97500), ('', 'paid', 390000)],
+        )
+        self.assertBalanceMatchesRows()
+
+    def test_deletes_append_compensating_events(self):
+        first, second, third = self.transactions
+        first.mark_paid('ref-1')
+        take_balance_snapshots(now=timezone.now() + timedelta(minutes=5))
+
+        first.delete()
+        EscrowTransaction.objects.filter(pk=second.pk).delete()
+
+        self.assertEqual(
+            list(TransactionEvent.objects.filter(to_status='').values_list('from_status', 'net_kobo')),
+            [('paid', 97500), ('pending', second.net_kobo)],
+        )
+        self.assertBalanceMatchesRows()
+
+        # The seller's whole ledger goes with them.
+        self.seller.user.delete()
+        self.assertFalse(TransactionEvent.objects.exists())
+
+    def test_snapshots_skip_events_that_may_still_be_committing(self):
+        self.assertEqual(take_balance_snapshots(), 0)
+        self.assertFalse(SellerBalanceSnapshot.objects.exists())
+        self.assertEqual(TransactionEvent.objects.filter(seller=self.seller).count(), 3)
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        get_limiter().clear()
+        self.addCleanup(get_limiter().clear)
+        self.transaction = make_transaction(make_seller(), status='paid', confirmation_code='123456')
+
+    def test_sliding_window(self):
+        limiter = LocMemRateLimiter()
+        self.assertEqual(parse_rate('5/15m'), (5, 900))
+
+        self.assertEqual(limiter.hit('k', 2, 60, now=0), (True, 0))
+        self.assertEqual(limiter.hit('k', 2, 60, now=30), (True, 0))
+        self.assertEqual(limiter.hit('k', 2, 60, now=45), (False, 15))
+        self.assertEqual(limiter.hit('k', 2, 60, now=61), (True, 0))
+
+    def test_confirmation_code_guessing_is_cut_off_per_transaction(self):
+        url = reverse('confirm_delivery', args=[self.transaction.id])
+        for _ in range(5):
+            self.assertEqual(self.client.post(url, {'confirmation_code': '000000'}).status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.post(url, {'confirmation_code': '123456'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+        # The page itself and other transactions are unaffected.
+        self.assertEqual(self.client.get(url).status_code, 200)
+        other = make_transaction(self.transaction.seller, status='paid', confirmation_code='654321')
+        response = self.client.post(reverse('confirm_delivery', args=[other.id]), {'confirmation_code': '654321'})
+        self.assertEqual(response.status_code, 302)
+
+    def test_sign_in_is_limited_per_account_before_hashing(self):
+        url = reverse('signin')
+        for _ in range(5):
+            self.client.post(url, {'email': 'seller@example.com', 'password': 'wrong'})
+
+        with mock.patch('escrow.views.authenticate') as authenticate:
+            response = self.client.post(url, {'email': 'Seller@Example.com', 'password': 'secret123'})
+        self.assertEqual(response.status_code, 429)
+        authenticate.assert_not_called()
+
+        response = self.client.post(url, {'email': 'someone@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(RATELIMIT_IP_META='HTTP_X_FORWARDED_FOR', RATELIMIT_TRUSTED_PROXIES=2)
+    def test_client_ip_ignores_spoofed_forwarded_for_entries(self):
+        factory = RequestFactory()
+        spoofed = factory.get('/', HTTP_X_FORWARDED_FOR='6.6.6.6, 203.0.113.7, 10.0.0.2')
+        direct = factory.get('/', HTTP_X_FORWARDED_FOR='203.0.113.7, 10.0.0.2')
+        short = factory.get('/', HTTP_X_FORWARDED_FOR='203.0.113.7')
+
+        self.assertEqual(client_ip(spoofed), '203.0.113.7')
+        self.assertEqual(client_ip(direct), '203.0.113.7')
+        self.assertEqual(client_ip(short), '203.0.113.7')
+
+
+class EmailSignInTests(TestCase):
+    def setUp(self):
+        self.seller = make_seller()
+
+    def test_sign_in_with_email_is_one_indexed_lookup(self):
+        with self.assertNumQueries(1):
+            user = authenticate(email='SELLER@example.com', password='secret123')
+        self.assertEqual(user, self.seller.user)
+        self.assertIsNone(authenticate(email='seller@example.com', password='wrong'))
+        self.assertIsNone(authenticate(email='nobody@example.com', password='secret123'))
+
+        response = self.client.post(reverse('signin'), {'email': 'seller@example.com', 'password': 'secret123'})
+        self.assertRedirects(response, reverse('home'))
+
+    def test_emails_are_unique_case_insensitively(self):
+        with self.assertRaises(IntegrityError), db_transaction.atomic():
+            User.objects.create_user(username='copy', email='Seller@Example.com')
+        # Accounts without an email are not constrained.
+        User.objects.create_user(username='admin1')
+        User.objects.create_user(username='admin2')
+
+        response = self.client.post(reverse('register_seller'), {
+            'username': 'copy', 'email': 'SELLER@example.com', 'password': 'secret123', 'password2': 'secret123',
+        })
+        self.assertContains(response, 'Email already registered.')
+
+
+class PublicPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_anonymous_home_is_rendered_once(self):
+        with self.assertTemplateUsed('escrow/home.html'):
+            first = self.client.get(reverse('home'))
+        with self.assertTemplateNotUsed('escrow/home.html'), self.assertNumQueries(0):
+            second = self.client.get(reverse('home'))
+
+        self.assertEqual(first.content, second.content)
+        self.assertIn('Cookie', second['Vary'])
+
+    def test_signed_in_users_and_flash_messages_bypass_the_page_cache(self):
+        self.client.get(reverse('confirmation_success'))
+
+        transaction = make_transaction(make_seller(), status='paid', confirmation_code='123456')
+        response = self.client.post(
+            reverse('confirm_delivery', args=[transaction.id]), {'confirmation_code': '123456'}, follow=True
+        )
+        self.assertContains(response, 'Delivery confirmed!')
+
+        self.client.force_login(transaction.seller.user)
+        self.assertContains(self.client.get(reverse('home')), 'Logout')
+        self.client.logout()
+        self.assertNotContains(self.client.get(reverse('home')), 'Logout')
+
+    def test_render_benchmark_covers_each_layer(self):
+        results = run_render_benchmark(iterations=2)
+        self.assertEqual(list(results), [name for name, *_ in RENDER_SCENARIOS])
+
+
+class BuyerSessionTests(TestCase):
+    def test_buyer_flash_messages_do_not_touch_the_session_table(self):
+        transaction = make_transaction(make_seller(), status='paid')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('payment_page', args=[transaction.id]), follow=True)
+        self.assertContains(response, 'This payment link has already been used.')
+
+        self.assertFalse([q for q in queries if 'django_session' in q['sql']])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+
+    def test_expired_sessions_are_cleared(self):
+        Session.objects.create(session_key='expired', session_data='', expire_date=timezone.now() - timedelta(days=1))
+        Session.objects.create(session_key='current', session_data='', expire_date=timezone.now() + timedelta(days=1))
+
+        clear_expired_sessions()
+
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['current'])
+
+
+class TransactionAdminTests(TestCase):
+    def setUp(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'secret123')
+        self.client.force_login(admin_user)
+        self.sellers = [make_seller(f'seller{i}') for i in range(5)]
+
+    def seed(self, count):
+        EscrowTransaction.objects.bulk_create(
+            EscrowTransaction(
+                seller=self.sellers[i % len(self.sellers)], product_name=f'Item {i}',
+                product_price=Decimal(1000 + i), logistics_fee=Decimal('500.00'),
+            )
+            for i in range(count)
+        )
+
+    def changelist_queries(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:escrow_escrowtransaction_changelist'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_changelist_query_count_does_not_grow_with_rows(self):
+        self.seed(5)
+        few, _ = self.changelist_queries()
+        self.seed(250)
+        many, response = self.changelist_queries()
+
+        self.assertEqual(many, few)
+        self.assertEqual(len(response.context['cl'].result_list), 100)
+        self.assertEqual(self.changelist_queries(q='Item 1')[0], few)
+
+    def test_total_amount_column_sorts_in_the_database(self):
+        self.seed(3)
+
+        _, response = self.changelist_queries(o='-4')
+
+        totals = [row.total_amount for row in response.context['cl'].result_list]
+        self.assertEqual(totals, [Decimal('1502.00'), Decimal('1501.00'), Decimal('1500.00')])
+
+    def test_date_hierarchy_drilldown(self):
+        self.seed(3)
+        today = timezone.now()
+
+        _, response = self.changelist_queries(created_at__year=today.year, created_at__month=today.month)
+
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+    def estimated_count(self, queryset, reltuples):
+        """Paginator count as if on PostgreSQL with pg_class.reltuples = reltuples"""
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value.fetchone.return_value = (reltuples,)
+        postgres = mock.Mock(vendor='postgresql', cursor=mock.Mock(return_value=cursor))
+        with mock.patch('escrow.admin.connections', {'default': postgres}):
+            with CaptureQueriesContext(connection) as queries:
+                count = EstimatedCountPaginator(queryset.order_by('-created_at', '-id'), 100).count
+        return count, cursor.__enter__.return_value, [q['sql'] for q in queries.captured_queries]
+
+    def test_large_unfiltered_table_uses_the_planner_estimate(self):
+        count, cursor, queries = self.estimated_count(EscrowTransaction.objects.all(), 2_500_000)
+
+        self.assertEqual(count, 2_500_000)
+        self.assertEqual(queries, [])
+        sql, params = cursor.execute.call_args.args
+        self.assertIn('reltuples', sql)
+        self.assertEqual(params, ['escrow_escrowtransaction'])
+
+    def test_small_or_filtered_tables_are_counted_exactly(self):
+        self.seed(3)
+
+        count, _, queries = self.estimated_count(EscrowTransaction.objects.all(), 3)
+        self.assertEqual(count, 3)
+        self.assertIn('COUNT(*)', queries[0])
+
+        count, cursor, queries = self.estimated_count(EscrowTransaction.objects.filter(status='pending'), 2_500_000)
+        self.assertEqual(count, 3)
+        cursor.execute.assert_not_called()
+        self.assertIn('COUNT(*)', queries[0])
+
+
+class CeleryQueueTests(TestCase):
+    def setUp(self):
+        metrics.TASK_RUNS.clear()
+        self.transaction = make_transaction(make_seller())
+        self.paystack = mock.Mock()
+        patcher = mock.patch('escrow.payments.PaystackService', return_value=self.paystack)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tasks_are_routed_to_their_queues(self):
+        queues = task_queues()
+        self.assertEqual(queues['escrow.tasks.verify_payment'], 'payments')
+        self.assertEqual(queues['escrow.tasks.drain_email_outbox'], 'email')
+        self.assertEqual(queues['escrow.tasks.sweep_expired_escrows'], 'sweeps')
+        self.assertNotIn('exports', set(queues.values()))
+        self.assertTrue(verify_payment.acks_late)
+
+    @override_settings(EMAIL_DELIVERY_MODE='sync')
+    def test_verify_payment_is_idempotent(self):
+        self.paystack.verify_payment.return_value = {'success': True, 'data': {}}
+
+        self.assertTrue(verify_payment.delay(str(self.transaction.id)).get())
+        self.assertIsNone(verify_payment.delay(str(self.transaction.id)).get())
+
+        self.paystack.verify_payment.assert_called_once_with(str(self.transaction.id))
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'paid')
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(ESCROW_VERIFY_RETRY_DELAY=0)
+    def test_verify_payment_retries_until_paystack_confirms(self):
+        self.paystack.verify_payment.side_effect = [
+            {'success': False, 'message': 'pending'}, {'success': True, 'data': {}},
+        ]
+
+        # Eager retries only re-run in place when errors are not propagated.
+        self.assertTrue(verify_payment.apply(args=[str(self.transaction.id)], throw=False).get())
+
+        self.assertEqual(self.paystack.verify_payment.call_count, 2)
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'paid')
+
+    def test_failed_callback_verification_queues_background_check(self):
+        with mock.patch(
+            'escrow.views.paystack_service.verify_payment', return_value={'success': False, 'message': 'timeout'}
+        ), mock.patch('escrow.views.verify_payment.apply_async') as apply_async:
+            self.client.get(reverse('paystack_callback'), {'reference': str(self.transaction.id)})
+
+        apply_async.assert_called_once_with(args=[str(self.transaction.id)], countdown=settings.ESCROW_VERIFY_RETRY_DELAY)
+
+    def test_callback_survives_an_unreachable_broker(self):
+        url = reverse('paystack_callback')
+        with mock.patch(
+            'escrow.views.paystack_service.verify_payment', return_value={'success': False, 'message': 'timeout'}
+        ), mock.patch('escrow.views.verify_payment.apply_async', side_effect=OSError('broker down')):
+            with self.assertLogs('escrow.views', 'WARNING'):
+                response = self.client.get(url, {'reference': str(self.transaction.id)})
+
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+
+    async def test_async_callback_survives_an_unreachable_broker(self):
+        request = AsyncRequestFactory().get('/', {'reference': str(self.transaction.id)})
+        with mock.patch(
+            'escrow.views.paystack_service.averify_payment', return_value={'success': False, 'message': 'timeout'}
+        ), mock.patch('escrow.views.verify_payment.apply_async', side_effect=OSError('broker down')), \
+                mock.patch('escrow.views.messages'):
+            with self.assertLogs('escrow.views', 'WARNING'):
+                response = await views.apaystack_callback(request)
+
+        self.assertEqual(response.url, reverse('home'))
+
+    def test_task_runs_are_counted_per_queue(self):
+        self.paystack.verify_payment.return_value = {'success': True, 'data': {}}
+        verify_payment.delay(str(self.transaction.id))
+
+        body = scrape_metrics(self.client)
+        self.assertIn(
+            'escrow_celery_task_runs_total{queue="payments",task="escrow.tasks.verify_payment",outcome="success"} 1',
+            body,
+        )
+
+
+class PaymentInitializationTests(TestCase):
+    def setUp(self):
+        self.paystack = FakePaystack().start()
+        self.addCleanup(self.paystack.stop)
+        self.transaction = make_transaction(make_seller())
+
+    def test_repeat_posts_reuse_the_first_checkout_link(self):
+        url = reverse('payment_page', args=[self.transaction.id])
+        with override_settings(PAYSTACK_BASE_URL=self.paystack.url):
+            first = self.client.post(url)
+            second = self.client.post(url)
+
+        checkout_url = f'{self.paystack.url}/checkout/{self.transaction.id}'
+        self.assertRedirects(first, checkout_url, fetch_redirect_response=False)
+        self.assertRedirects(second, checkout_url, fetch_redirect_response=False)
+        self.assertEqual(self.paystack.requests.count(('POST', '/transaction/initialize')), 1)
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.paystack_access_code, f'access-{self.transaction.id}')
+
+
+class ConcurrentPaymentInitializationTests(TransactionTestCase):
+    def test_concurrent_initializations_make_one_paystack_call(self):
+        transaction = make_transaction(make_seller())
+        started, finish = threading.Event(), threading.Event()
+
+        def slow_initialize(transaction):
+            started.set()
+            finish.wait(5)
+            return {'success': True, 'authorization_url': 'https://checkout.test/abc', 'access_code': 'abc'}
+
+        paystack_service = mock.Mock()
+        paystack_service.initialize_payment.side_effect = slow_initialize
+        results = []
+
+        def initialize():
+            try:
+                results.append(initialize_payment(EscrowTransaction.get_cached(transaction.id), paystack_service))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=initialize) for _ in range(3)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        finish.set()
+        for thread in threads:
+            thread.join(10)
+
+        paystack_service.initialize_payment.assert_called_once()
+        self.assertEqual([r['authorization_url'] for r in results], ['https://checkout.test/abc'] * 3)
+
+
+@override_settings(EMAIL_DELIVERY_MODE='sync')
+class PaystackReconciliationTests(TestCase):
+    def setUp(self):
+        self.paystack = FakePaystack().start()
+        self.addCleanup(self.paystack.stop)
+        settings_override = override_settings(PAYSTACK_BASE_URL=self.paystack.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.seller = make_seller()
+
+    def charged(self, **kwargs):
+        transaction = make_transaction(self.seller, **kwargs)
+        self.paystack.add_transaction(str(transaction.id), transaction.total_kobo)
+        return transaction
+
+    def test_missed_charges_are_marked_paid_page_by_page(self):
+        missed = [self.charged() for _ in range(3)]
+        already_paid = self.charged()
+        already_paid.mark_paid(str(already_paid.id))
+        unpaid = make_transaction(self.seller)
+        EscrowTransaction.get_cached(missed[0].id)
+
+        with CaptureQueriesContext(connection) as queries:
+            report = reconcile(per_page=2)
+
+        self.assertEqual(report, {'checked': 4, 'applied': 3, 'mismatches': [], 'error': None})
+        self.assertEqual(self.paystack.requests.count(('GET', '/transaction')), 2)
+        # Per page: one in_bulk lookup, then lock, update and event insert
+        statements = [q['sql'] for q in queries.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(statements), 8)
+        for transaction in missed:
+            transaction.refresh_from_db()
+            self.assertEqual(transaction.status, 'paid')
+            self.assertEqual(transaction.paystack_reference, str(transaction.id))
+            self.assertEqual(len(transaction.confirmation_code), 6)
+            self.assertEqual(transaction.deadline, transaction.paid_at + EscrowTransaction.CONFIRMATION_WINDOW)
+            self.assertTrue(transaction.logistics_released)
+        self.assertEqual(EscrowTransaction.get_cached(missed[0].id).status, 'paid')
+        self.assertEqual(TransactionEvent.objects.filter(to_status='paid').count(), 4)
+        self.assertEqual(len(mail.outbox), 3)
+        unpaid.refresh_from_db()
+        self.assertEqual(unpaid.status, 'pending')
+
+        self.assertEqual(reconcile(per_page=2)['applied'], 0)
+
+    def test_mismatched_charges_are_reported_not_applied(self):
+        underpaid = make_transaction(self.seller)
+        self.paystack.add_transaction(str(underpaid.id), underpaid.total_kobo - 100)
+        self.paystack.add_transaction('not-ours', 5000)
+        self.paystack.add_transaction('1f0e6a4c-0000-4000-8000-000000000000', 5000)
+
+        report = reconcile()
+
+        self.assertEqual(report['applied'], 0)
+        self.assertEqual(
+            sorted((m['reference'], m['problem']) for m in report['mismatches']),
+            sorted([
+                (str(underpaid.id), 'amount'),
+                ('not-ours', 'unknown'),
+                ('1f0e6a4c-0000-4000-8000-000000000000', 'unknown'),
+            ]),
+        )
+        underpaid.refresh_from_db()
+        self.assertEqual(underpaid.status, 'pending')
+
+    def test_charges_outside_the_window_are_left_alone(self):
+        old = make_transaction(self.seller)
+        self.paystack.add_transaction(
+            str(old.id), old.total_kobo, created_at=timezone.now() - timedelta(hours=30),
+        )
+
+        self.assertEqual(reconcile()['checked'], 0)
+        self.assertEqual(reconcile(start=timezone.now() - timedelta(days=2))['applied'], 1)
+
+    def test_command_reports_and_fails_when_paystack_is_down(self):
+        self.charged()
+        out = io.StringIO()
+        call_command('reconcile_paystack', '--hours', '1', stdout=out)
+        self.assertIn('marked 1 transaction(s) paid', out.getvalue())
+
+        self.paystack.fail_next(status=400)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_paystack', stdout=io.StringIO())
@@ -1,16 +1,28 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI the payment flow can run as native async views.
+if settings.ASYNC_PAYMENT_VIEWS:
+    payment_page, paystack_callback = views.apayment_page, views.apaystack_callback
+else:
+    payment_page, paystack_callback = views.payment_page, views.paystack_callback
+
 urlpatterns = [
     path('', views.home, name='home'),
     path('register/', views.SignUp, name='register_seller'),
     path('login/', views.SignIn, name='signin'),
     path('logout/', views.SignOut, name='logout'),
     path('dashboard/', views.seller_dashboard, name='seller_dashboard'),
+    path('dashboard/transactions/', views.seller_transactions, name='seller_transactions'),
+    path('dashboard/export/', views.export_transactions, name='export_transactions'),
+    path('dashboard/ledger/export/', views.export_ledger, name='export_ledger'),
     path('create/', views.create_payment_link, name='create_payment_link'),
+    path('create/bulk/', views.bulk_create_payment_links, name='bulk_create_payment_links'),
     path('link/<uuid:transaction_id>/', views.payment_link_detail, name='payment_link_detail'),
-    path('pay/<uuid:transaction_id>/', views.payment_page, name='payment_page'),
-    path('paystack/callback/', views.paystack_callback, name='paystack_callback'),
+    path('pay/<uuid:transaction_id>/', payment_page, name='payment_page'),
+    path('paystack/callback/', paystack_callback, name='paystack_callback'),
+    path('paystack/webhook/', views.paystack_webhook, name='paystack_webhook'),
     path('success/<uuid:transaction_id>/', views.payment_success, name='payment_success'),
     path('confirm/<uuid:transaction_id>/', views.confirm_delivery, name='confirm_delivery'),
     path('confirmed/', views.confirmation_success, name='confirmation_success'),
@@ -1,31 +1,51 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.messages import get_messages
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth import authenticate, login, logout
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.utils import timezone
-from escrow.forms import UserRegForm
+from django.conf import settings
+from django.urls import reverse
+from django.db import IntegrityError, transaction as db_transaction
+from escrow.forms import EscrowTransactionForm, UserRegForm, TransactionFilterForm
+from .backends import users_with_email
+from .bulk import RESULT_FIELDS, create_payment_links, iter_rows, upload_format
+from .exports import EXPORT_FIELDS, export_dicts, export_rows
+from .ledger import seller_balance
 from .models import EscrowTransaction, Seller
-import random
-import string
+from .pagination import keyset_page
+from .payments import ainitialize_payment, finalize_payment, initialize_payment
+from .payouts import settle_payout
+from .streaming import csv_lines, jsonl_lines
+from .tasks import verify_payment
+import json
+import logging
+import uuid
 from django.contrib.auth import get_user_model
+from core.pagecache import cache_anonymous_page
+from core.ratelimit import client_ip, post_field, ratelimit, view_kwarg
 from services.paystack import PaystackService
-from services.email_service import send_confirmation_code_email
+from services.email_service import aqueue_confirmation_code_email
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 paystack_service = PaystackService()
 
 
+HOME_CARDS = [
+    {'title': 'Trust-first checkout', 'copy': 'Crystal clear breakdown (product, logistics, rules) on every link so buyers feel safe instantly.'},
+    {'title': 'Escrow lock', 'copy': 'Funds stay in escrow until buyer confirms delivery. No shortcuts. No early withdrawals.'},
+    {'title': 'Logistics protected', 'copy': 'Logistics fee releases the moment payment hits, so riders and sellers never lose cash on failed deliveries.'}
+]
+
+@cache_anonymous_page
 def home(request):
-    cards= [
-        {'title': 'Trust-first checkout', 'copy': 'Crystal clear breakdown (product, logistics, rules) on every link so buyers feel safe instantly.'},
-        {'title': 'Escrow lock', 'copy': 'Funds stay in escrow until buyer confirms delivery. No shortcuts. No early withdrawals.'},
-        {'title': 'Logistics protected', 'copy': 'Logistics fee releases the moment payment hits, so riders and sellers never lose cash on failed deliveries.'}
-    ]
-    return render(request, 'escrow/home.html', {'cards': cards})
+    return render(request, 'escrow/home.html', {'cards': HOME_CARDS})
 
 @login_required
 def create_payment_link(request):
@@ -37,11 +57,7 @@ def create_payment_link(request):
         seller = None
     
     if request.method == 'POST':
-        product_name = request.POST.get('product_name')
-        product_price = request.POST.get('product_price')
-        logistics_fee = request.POST.get('logistics_fee')
-        buyer_phone = request.POST.get('buyer_phone', '')
-        buyer_email = request.POST.get('buyer_email', '')
+        form = EscrowTransactionForm(request.POST)
         
         # Create or update seller profile
         if not seller:
@@ -51,44 +67,97 @@ def create_payment_link(request):
             
             if not phone or not bank_account:
                 messages.error(request, 'Phone and bank account are required for first transaction.')
-                return render(request, 'escrow/create_link.html', {'show_seller_form': True})
-            
-            seller = Seller.objects.create(
-                user=request.user,
-                phone=phone,
-                bank_account=bank_account,
-                bank_name=bank_name
-            )
+                return render(request, 'escrow/create_link.html', {'form': form, 'show_seller_form': True})
+        
+        if not form.is_valid():
+            return render(request, 'escrow/create_link.html', {
+                'form': form,
+                'seller': seller,
+                'show_seller_form': seller is None,
+            })
         
-        transaction = EscrowTransaction.objects.create(
-            seller=seller,
-            product_name=product_name,
-            product_price=product_price,
-            logistics_fee=logistics_fee,
-            buyer_phone=buyer_phone,
-            buyer_email=buyer_email
-        )
+        # The seller profile is only kept if the link is created with it.
+        with db_transaction.atomic():
+            if not seller:
+                seller = Seller.objects.create(
+                    user=request.user,
+                    phone=phone,
+                    bank_account=bank_account,
+                    bank_name=bank_name
+                )
+            form.instance.seller = seller
+            transaction = form.save()
         
         messages.success(request, 'Payment link created successfully!')
         return redirect('payment_link_detail', transaction_id=transaction.id)
     
     context = {
+        'form': EscrowTransactionForm(),
         'seller': seller,
         'show_seller_form': seller is None
     }
     return render(request, 'escrow/create_link.html', context)
 
+@login_required
+@require_POST
+def bulk_create_payment_links(request):
+    """Create payment links from a CSV or JSON Lines upload.
+
+    Send the rows as a multipart `file` field or as the raw request body.
+    Results stream back in the same format, one line per input row.
+    """
+    try:
+        seller = Seller.objects.get(user=request.user)
+    except Seller.DoesNotExist:
+        return JsonResponse({'error': 'Create your first payment link to set up your seller account.'}, status=400)
+    
+    upload = request.FILES.get('file')
+    if upload:
+        stream, fmt = upload, upload_format(upload.content_type, upload.name)
+    else:
+        stream, fmt = request, upload_format(request.content_type)
+    
+    results = create_payment_links(seller, iter_rows(stream, fmt))
+    
+    def absolute(result):
+        if result['payment_url']:
+            result['payment_url'] = request.build_absolute_uri(result['payment_url'])
+        return result
+    
+    results = map(absolute, results)
+    if fmt == 'csv':
+        lines = csv_lines(RESULT_FIELDS, (
+            [result['row'], result['status'], result['id'], result['payment_url'],
+             json.dumps(result['errors']) if result['errors'] else '']
+            for result in results
+        ))
+        return StreamingHttpResponse(lines, content_type='text/csv')
+    return StreamingHttpResponse(jsonl_lines(results), content_type='application/x-ndjson')
+
+def _get_transaction_or_404(transaction_id):
+    """Cached transaction lookup for the public buyer pages"""
+    try:
+        return EscrowTransaction.get_cached(transaction_id)
+    except EscrowTransaction.DoesNotExist:
+        raise Http404('No EscrowTransaction matches the given query.')
+
+async def _aget_transaction_or_404(transaction_id):
+    try:
+        return await EscrowTransaction.aget_cached(transaction_id)
+    except EscrowTransaction.DoesNotExist:
+        raise Http404('No EscrowTransaction matches the given query.')
+
 def payment_page(request, transaction_id):
     """Buyer payment page - initialize Paystack payment"""
-    transaction = get_object_or_404(EscrowTransaction, id=transaction_id)
+    transaction = _get_transaction_or_404(transaction_id)
     
     if transaction.status != 'pending':
         messages.info(request, 'This payment link has already been used.')
         return redirect('payment_success', transaction_id=transaction.id)
     
     if request.method == 'POST':
-        # Initialize payment with Paystack
-        result = paystack_service.initialize_payment(transaction)
+        # Initialize payment with Paystack, or reuse the earlier checkout link
+        result = initialize_payment(transaction, paystack_service)
         
         if result['success']:
             # Redirect to Paystack payment page
@@ -101,52 +170,148 @@ def payment_page(request, transaction_id):
     }
     return render(request, 'escrow/payment_page.html', context)
 
+def _schedule_verification(transaction):
+    """Keep checking an unverified payment in the background.
+
+    A broker outage must not turn the buyer's redirect into a 500; the
+    periodic reconciliation still finds the charge if this is lost.
+    """
+    try:
+        verify_payment.apply_async(args=[str(transaction.id)], countdown=settings.ESCROW_VERIFY_RETRY_DELAY)
+    except Exception as e:
+        logger.warning('Could not schedule payment verification for %s: %s', transaction.id, e)
+
 def paystack_callback(request):
     """Handle Paystack payment callback"""
     reference = request.GET.get('reference')
     
-    if not reference:
+    try:
+        transaction_id = uuid.UUID(reference or '')
+    except ValueError:
         messages.error(request, 'Invalid payment reference.')
         return redirect('home')
     
-    # Verify payment with Paystack
-    result = paystack_service.verify_payment(reference)
+    transaction = get_object_or_404(EscrowTransaction, id=transaction_id)
     
-    if result['success']:
-        # Get transaction
-        transaction = get_object_or_404(EscrowTransaction, id=reference)
+    # The webhook usually finalizes the payment before the buyer is redirected
+    # back; only ask Paystack directly when it has not arrived yet.
+    if transaction.status == 'pending':
+        result = paystack_service.verify_payment(reference)
         
-        # Generate confirmation code
-        confirmation_code = ''.join(random.choices(string.digits, k=6))
+        if not result['success']:
+            # Paystack may be slow to settle or briefly unreachable; keep
+            # checking in the background so a real payment is not lost.
+            _schedule_verification(transaction)
+            messages.error(request, f"Payment verification failed: {result['message']}")
+            return redirect('home')
         
-        # Update transaction
-        transaction.confirmation_code = confirmation_code
-        transaction.status = 'paid'
-        transaction.paid_at = timezone.now()
-        transaction.paystack_reference = reference
-        transaction.logistics_released = True  # Release logistics fee immediately
-        transaction.save()
+        finalize_payment(transaction, reference)
+    
+    messages.success(request, 'Payment successful! Check your email for the confirmation code.')
+    return redirect('payment_success', transaction_id=transaction.id)
+
+@csrf_exempt
+@require_POST
+def paystack_webhook(request):
+    """Receive Paystack events and finalize successful charges"""
+    if not paystack_service.webhook_secret():
+        logger.error('Rejecting Paystack webhook: no PAYSTACK_WEBHOOK_SECRET or PAYSTACK_SECRET_KEY configured')
+        return HttpResponse(status=503)
+    
+    signature = request.headers.get('x-paystack-signature')
+    if not paystack_service.verify_webhook_signature(request.body, signature):
+        return HttpResponse(status=401)
+    
+    try:
+        event = json.loads(request.body)
+    except ValueError:
+        return HttpResponse(status=400)
+    
+    data = event.get('data') or {}
+    if event.get('event') in ('transfer.success', 'transfer.failed', 'transfer.reversed'):
+        settle_payout(data.get('reference'), event['event'] == 'transfer.success', data.get('reason') or '')
+        return HttpResponse(status=200)
+    
+    if event.get('event') != 'charge.success':
+        return HttpResponse(status=200)
+    
+    reference = data.get('reference', '')
+    try:
+        transaction = EscrowTransaction.objects.get(id=uuid.UUID(reference))
+    except (ValueError, EscrowTransaction.DoesNotExist):
+        # Not one of ours; acknowledge so Paystack stops retrying.
+        return HttpResponse(status=200)
+    
+    expected_amount = transaction.total_kobo
+    if data.get('status') != 'success' or data.get('amount') != expected_amount:
+        logger.warning('Ignoring charge.success for %s: status=%s amount=%s expected=%s',
+                       reference, data.get('status'), data.get('amount'), expected_amount)
+        return HttpResponse(status=200)
+    
+    finalize_payment(transaction, reference)
+    return HttpResponse(status=200)
+
+async def apayment_page(request, transaction_id):
+    """Async payment_page for ASGI deployments.
+
+    Waiting on Paystack suspends the coroutine instead of holding a worker
+    thread, so one process can have many initializations in flight.
+    """
+    transaction = await _aget_transaction_or_404(transaction_id)
+    
+    if transaction.status != 'pending':
+        messages.info(request, 'This payment link has already been used.')
+        return redirect('payment_success', transaction_id=transaction.id)
+    
+    if request.method == 'POST':
+        result = await ainitialize_payment(transaction, paystack_service)
         
-        # Set deadline (2 days + 1 day grace)
-        transaction.set_deadline()
+        if result['success']:
+            return redirect(result['authorization_url'])
+        else:
+            messages.error(request, f"Payment initialization failed: {result['message']}")
+    
+    context = {
+        'transaction': transaction,
+    }
+    return await sync_to_async(render)(request, 'escrow/payment_page.html', context)
+
+async def apaystack_callback(request):
+    """Async paystack_callback for ASGI deployments"""
+    reference = request.GET.get('reference')
+    
+    try:
+        transaction_id = uuid.UUID(reference or '')
+    except ValueError:
+        messages.error(request, 'Invalid payment reference.')
+        return redirect('home')
+    
+    transaction = await aget_object_or_404(EscrowTransaction, id=transaction_id)
+    
+    if transaction.status == 'pending':
+        result = await paystack_service.averify_payment(reference)
         
-        # Send confirmation code via email
-        send_confirmation_code_email(transaction)
+        if not result['success']:
+            await sync_to_async(_schedule_verification)(transaction)
+            messages.error(request, f"Payment verification failed: {result['message']}")
+            return redirect('home')
         
-        messages.success(request, 'Payment successful! Check your email for the confirmation code.')
-        return redirect('payment_success', transaction_id=transaction.id)
-    else:
-        messages.error(request, f"Payment verification failed: {result['message']}")
-        return redirect('home')
+        if await sync_to_async(transaction.mark_paid)(reference):
+            await aqueue_confirmation_code_email(transaction)
+    
+    messages.success(request, 'Payment successful! Check your email for the confirmation code.')
+    return redirect('payment_success', transaction_id=transaction.id)
 
 def payment_success(request, transaction_id):
     """Payment success page"""
-    transaction = get_object_or_404(EscrowTransaction, id=transaction_id)
+    transaction = _get_transaction_or_404(transaction_id)
     return render(request, 'escrow/payment_success.html', {'transaction': transaction})
 
+@ratelimit('confirm-ip', client_ip, '30/h')
+@ratelimit('confirm-transaction', view_kwarg('transaction_id'), '5/15m')
 def confirm_delivery(request, transaction_id):
     """Buyer confirms delivery with code"""
-    transaction = get_object_or_404(EscrowTransaction, id=transaction_id)
+    transaction = _get_transaction_or_404(transaction_id)
     
     if transaction.status not in ['paid']:
         messages.info(request, 'This transaction cannot be confirmed.')
@@ -156,17 +321,18 @@ def confirm_delivery(request, transaction_id):
         entered_code = request.POST.get('confirmation_code')
         
         if entered_code == transaction.confirmation_code:
-            transaction.status = 'confirmed'
-            transaction.confirmed_at = timezone.now()
-            transaction.product_released = True  # Release product payment to seller
-            transaction.save()
-            messages.success(request, 'Delivery confirmed! Payment released to seller.')
-            return redirect('confirmation_success')
+            if transaction.confirm():  # Release product payment to seller
+                messages.success(request, 'Delivery confirmed! Payment released to seller.')
+                return redirect('confirmation_success')
+            # Lost a race with another confirmation or the expiry sweep
+            messages.info(request, 'This transaction cannot be confirmed.')
+            return redirect('home')
         else:
             messages.error(request, 'Invalid confirmation code.')
     
     return render(request, 'escrow/confirm_delivery.html', {'transaction': transaction})
 
+@cache_anonymous_page
 def confirmation_success(request):
     """Confirmation success page"""
     return render(request, 'escrow/confirmation_success.html')
@@ -216,7 +382,7 @@ def SignUp(request):
         if User.objects.filter(username=username).exists():
             messages.error(request, 'Username already exists.')
             has_error = True
-        if User.objects.filter(email=email).exists():
+        if email and users_with_email(email).exists():
             messages.error(request, 'Email already registered.')
             has_error = True
             
@@ -225,13 +391,20 @@ def SignUp(request):
             has_error = True
       
         if not has_error:
-            user = User.objects.create_user(username=username, email=email, password=password)
-            messages.success(request, 'User registered successfully!')
-            return redirect('login')
+            try:
+                user = User.objects.create_user(username=username, email=email, password=password)
+            except IntegrityError:
+                # Lost a race with a concurrent sign-up for the same username or email
+                messages.error(request, 'Username or email already registered.')
+            else:
+                messages.success(request, 'User registered successfully!')
+                return redirect('login')
     
     return render(request, 'escrow/signup.html')
 
 
+@ratelimit('signin-ip', client_ip, '20/15m')
+@ratelimit('signin-account', post_field('email'), '5/15m')
 def SignIn(request):
     if request.method == 'GET':
         storage = get_messages(request)
@@ -240,17 +413,12 @@ def SignIn(request):
     elif request.method == 'POST':
         email = request.POST.get('email')
         password = request.POST.get('password')
-        try:
-            user = User.objects.get(email=email)
-            authenticated_user = authenticate(request, username=user.username, password=password)
-            if authenticated_user is not None:
-                login(request, authenticated_user)
-                messages.success(request, 'Logged in successfully!')
-                return redirect('home')
-            else:
-                messages.error(request, 'Invalid email or password.')
-        except User.DoesNotExist:
-            user = None
+        authenticated_user = authenticate(request, email=email, password=password)
+        if authenticated_user is not None:
+            login(request, authenticated_user)
+            messages.success(request, 'Logged in successfully!')
+            return redirect('home')
+        else:
             messages.error(request, 'Invalid email or password.')
 
     return render(request, 'escrow/login.html')
@@ -262,18 +430,111 @@ def SignOut(request):
     messages.success(request, 'Logged out successfully!')
     return redirect('home')
 
+DASHBOARD_PAGE_SIZE = 25
+
+def _dashboard_page(request, seller):
+    """Filtered keyset page of a seller's transactions for the dashboard"""
+    filter_form = TransactionFilterForm(request.GET or None)
+    transactions = EscrowTransaction.objects.filter(seller=seller)
+    if filter_form.is_bound and filter_form.is_valid():
+        transactions = filter_form.filter(transactions)
+    
+    rows, next_cursor = keyset_page(
+        transactions, request.GET.get('cursor'), DASHBOARD_PAGE_SIZE
+    )
+    return filter_form, rows, next_cursor
+
 @login_required
 def seller_dashboard(request):
-    """Simple seller dashboard showing all transactions"""
+    """Seller dashboard showing the newest page of transactions"""
     try:
         seller = Seller.objects.get(user=request.user)
-        transactions = EscrowTransaction.objects.filter(seller=seller).order_by('-created_at')
-        
-        context = {
-            'seller': seller,
-            'transactions': transactions,
-        }
-        return render(request, 'escrow/seller_dashboard.html', context)
     except Seller.DoesNotExist:
         messages.info(request, 'Please create your first payment link to set up your seller account.')
-        return redirect('create_payment_link')
\ No newline at end of file
+        return redirect('create_payment_link')
+    
+    try:
+        filter_form, transactions, next_cursor = _dashboard_page(request, seller)
+    except ValueError:
+        return redirect('seller_dashboard')
+    
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    
+    context = {
+        'seller': seller,
+        'transactions': transactions,
+        'totals': seller_balance(seller.pk),
+        'filter_form': filter_form,
+        'filter_query': query.urlencode(),
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'escrow/seller_dashboard.html', context)
+
+@login_required
+def seller_transactions(request):
+    """JSON page of seller transactions for dashboard infinite scroll"""
+    seller = get_object_or_404(Seller, user=request.user)
+    
+    try:
+        filter_form, transactions, next_cursor = _dashboard_page(request, seller)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+    
+    if filter_form.is_bound and not filter_form.is_valid():
+        return JsonResponse({'errors': filter_form.errors}, status=400)
+    
+    return JsonResponse({
+        'results': [
+            {
+                'id': str(transaction.id),
+                'product_name': transaction.product_name,
+                'product_price': str(transaction.product_price),
+                'platform_fee': str(transaction.platform_fee),
+                'seller_amount': str(transaction.seller_amount),
+                'status': transaction.status,
+                'status_display': transaction.get_status_display(),
+                'created_at': transaction.created_at.isoformat(),
+                'link_url': reverse('payment_link_detail', args=[transaction.id])
+                            if transaction.status == 'pending' else None,
+            }
+            for transaction in transactions
+        ],
+        'next_cursor': next_cursor,
+    })
+
+def _export_response(request, transactions, filename):
+    """Stream the filtered transactions as CSV (default) or ?format=jsonl"""
+    filter_form = TransactionFilterForm(request.GET)
+    if not filter_form.is_valid():
+        return JsonResponse({'errors': filter_form.errors}, status=400)
+    transactions = filter_form.filter(transactions)
+    # Pin the database now: the body is read after the replica-routing
+    # middleware has returned.
+    transactions = transactions.using(transactions.db)
+    
+    if request.GET.get('format') == 'jsonl':
+        response = StreamingHttpResponse(jsonl_lines(export_dicts(transactions)), content_type='application/x-ndjson')
+        extension = 'jsonl'
+    else:
+        response = StreamingHttpResponse(csv_lines(EXPORT_FIELDS, export_rows(transactions)), content_type='text/csv')
+        extension = 'csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
+
+@login_required
+def export_transactions(request):
+    """Export the signed-in seller's transactions"""
+    seller = get_object_or_404(Seller, user=request.user)
+    return _export_response(request, EscrowTransaction.objects.filter(seller=seller), 'transactions')
+
+@staff_member_required
+def export_ledger(request):
+    """Export transactions across all sellers for finance, optionally ?seller=<id>"""
+    transactions = EscrowTransaction.objects.all()
+    seller_id = request.GET.get('seller')
+    if seller_id:
+        if not seller_id.isdigit():
+            return JsonResponse({'errors': {'seller': ['Enter a seller id.']}}, status=400)
+        transactions = transactions.filter(seller_id=seller_id)
+    return _export_response(request, transactions, 'ledger')
@@ -1,13 +1,24 @@
-from django.core.mail import send_mail
+from collections import deque
+from contextlib import contextmanager
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
 
-def send_confirmation_code_email(transaction):
-    """Send confirmation code to buyer via email"""
+from core.metrics import observe
+
+logger = logging.getLogger(__name__)
+
+
+def build_confirmation_code_email(transaction):
+    """Build the confirmation code email for a paid transaction"""
     if not transaction.buyer_email:
-        return False
-    
+        return None
+
     subject = f'Your Confirmation Code - {transaction.product_name}'
-    
+
     message = f"""
 Hello,
 
@@ -25,16 +36,209 @@ To confirm delivery, visit: {settings.SITE_URL}/confirm/{transaction.id}/
 
 Thank you for using our secure escrow service!
 """
-    
+    return EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [transaction.buyer_email])
+
+
+def send_confirmation_code_email(transaction):
+    """Send confirmation code to buyer via email"""
+    email = build_confirmation_code_email(transaction)
+    if email is None:
+        return False
+
     try:
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [transaction.buyer_email],
-            fail_silently=False,
-        )
+        with observe('smtp', 'send'):
+            email.send(fail_silently=False)
         return True
     except Exception as e:
         print(f"Failed to send email: {e}")
         return False
+
+
+def send_confirmation_code_emails(transactions, connection=None):
+    """Send confirmation codes for many transactions over one SMTP connection.
+
+    Returns the number of messages sent. Connection errors propagate so the
+    caller can retry the whole batch.
+    """
+    emails = [email for email in map(build_confirmation_code_email, transactions) if email]
+    if not emails:
+        return 0
+
+    connection = connection or get_connection(fail_silently=False)
+    with observe('smtp', 'send_batch'):
+        return connection.send_messages(emails) or 0
+
+
+class LocMemOutbox:
+    """In-process outbox used by tests and single-process development"""
+
+    def __init__(self):
+        self._items = deque()
+        self._processing = []
+        self._lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+
+    def push(self, *items):
+        with self._lock:
+            self._items.extend(items)
+
+    def pop_batch(self, size):
+        with self._lock:
+            batch = [self._items.popleft() for _ in range(min(size, len(self._items)))]
+            self._processing.extend(batch)
+            return batch
+
+    def ack(self, *items):
+        with self._lock:
+            for item in items:
+                self._processing.remove(item)
+
+    def requeue(self, items):
+        with self._lock:
+            for item in items:
+                self._processing.remove(item)
+            self._items.extendleft(reversed(items))
+
+    def recover(self):
+        self.requeue(list(self._processing))
+
+    @contextmanager
+    def draining(self, ttl):
+        if not self._drain_lock.acquire(blocking=False):
+            yield False
+            return
+        try:
+            self.recover()
+            yield True
+        finally:
+            self._drain_lock.release()
+
+    def claim_drain(self, ttl):
+        return True
+
+    def __len__(self):
+        return len(self._items)
+
+
+class RedisOutbox:
+    """Outbox backed by a redis list shared between web and worker processes.
+
+    Popped ids are moved onto a processing list and only dropped from it
+    once their email is sent, so a drain that dies mid-batch leaves them
+    for the next drain to recover.
+    """
+
+    key = 'escrow:email-outbox'
+    processing_key = f'{key}:processing'
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def push(self, *items):
+        self.client.rpush(self.key, *items)
+
+    def pop_batch(self, size):
+        pipe = self.client.pipeline(transaction=False)
+        for _ in range(size):
+            pipe.lmove(self.key, self.processing_key, 'LEFT', 'RIGHT')
+        return [item.decode() for item in pipe.execute() if item is not None]
+
+    def ack(self, *items):
+        pipe = self.client.pipeline(transaction=False)
+        for item in items:
+            pipe.lrem(self.processing_key, 1, item)
+        pipe.execute()
+
+    def requeue(self, items):
+        if not items:
+            return
+        pipe = self.client.pipeline()
+        for item in items:
+            pipe.lrem(self.processing_key, 1, item)
+        pipe.lpush(self.key, *reversed(items))
+        pipe.execute()
+
+    def recover(self):
+        """Put ids left behind by a dead drain back in front of the queue"""
+        while self.client.lmove(self.processing_key, self.key, 'RIGHT', 'LEFT') is not None:
+            pass
+
+    @contextmanager
+    def draining(self, ttl):
+        """Hold the drain lock for up to ttl seconds; yields False if another drain has it.
+
+        Whoever takes the lock owns the processing list, so anything still
+        on it was abandoned and goes back on the queue.
+        """
+        from redis.exceptions import LockError
+
+        lock = self.client.lock(f'{self.key}:lock', timeout=ttl)
+        if not lock.acquire(blocking=False):
+            yield False
+            return
+        try:
+            self.recover()
+            yield True
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                pass
+
+    def claim_drain(self, ttl):
+        """Only one drain needs to be scheduled per batch window"""
+        return bool(self.client.set(f'{self.key}:drain', 1, nx=True, ex=max(ttl, 1)))
+
+    def __len__(self):
+        return self.client.llen(self.key)
+
+
+_outboxes = {}
+
+
+def get_outbox():
+    url = settings.EMAIL_OUTBOX_URL
+    if url not in _outboxes:
+        _outboxes[url] = LocMemOutbox() if url.startswith('locmem://') else RedisOutbox(url)
+    return _outboxes[url]
+
+
+def queue_confirmation_code_email(transaction):
+    """Hand the confirmation code email to the background mailer.
+
+    Falls back to sending inline when EMAIL_DELIVERY_MODE is 'sync' or the
+    outbox cannot be reached, so a buyer never loses their code.
+    """
+    if not transaction.buyer_email:
+        return False
+
+    if settings.EMAIL_DELIVERY_MODE == 'sync':
+        return send_confirmation_code_email(transaction)
+
+    from escrow.tasks import drain_email_outbox
+
+    try:
+        outbox = get_outbox()
+        outbox.push(str(transaction.id))
+    except Exception as e:
+        logger.warning('Email outbox unavailable, sending inline: %s', e)
+        return send_confirmation_code_email(transaction)
+
+    try:
+        if outbox.claim_drain(settings.EMAIL_BATCH_DELAY):
+            drain_email_outbox.apply_async(countdown=settings.EMAIL_BATCH_DELAY)
+    except Exception as e:
+        # The message is safely queued; the periodic drain will pick it up.
+        logger.warning('Could not schedule email outbox drain: %s', e)
+    return True
+
+
+async def aqueue_confirmation_code_email(transaction):
+    """Async variant of queue_confirmation_code_email for ASGI views.
+
+    The outbox push (or inline SMTP fallback) runs on a worker thread so it
+    never blocks the event loop.
+    """
+    return await sync_to_async(queue_confirmation_code_email)(transaction)
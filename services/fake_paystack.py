@@ -0,0 +1,266 @@
+"""
+Local stand-in for the Paystack API, for tests and benchmarks.
+
+Runs a real HTTP server on 127.0.0.1 so the pooled client, timeouts and
+retries are exercised exactly as in production:
+
+    with FakePaystack() as paystack, override_settings(PAYSTACK_BASE_URL=paystack.url):
+        ...
+        paystack.charge(reference)  # simulate the buyer paying
+"""
+
+from datetime import datetime, timezone
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import re
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+BANKS = [
+    {'name': 'Access Bank', 'slug': 'access-bank', 'code': '044'},
+    {'name': 'Guaranty Trust Bank', 'slug': 'guaranty-trust-bank', 'code': '058'},
+    {'name': 'Zenith Bank', 'slug': 'zenith-bank', 'code': '057'},
+]
+
+
+class FakePaystack:
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.transactions = {}
+        self.refunds = []
+        self._refunds = []
+        self.transfers = {}
+        self.recipients = {}
+        self.requests = []
+        self._failures = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        fake = self
+
+        class Handler(FakePaystackHandler):
+            paystack = fake
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def fail_next(self, count=1, status=500):
+        """Answer the next `count` requests with an HTTP error"""
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def add_transaction(self, reference, amount, status='success', email='buyer@example.com', created_at=None):
+        """Register a transaction as if it had been initialized (and paid)"""
+        with self._lock:
+            self.transactions[reference] = {
+                'id': len(self.transactions) + 1,
+                'reference': reference,
+                'amount': amount,
+                'status': status,
+                'customer': {'email': email},
+                'metadata': None,
+                'createdAt': _timestamp(created_at),
+            }
+
+    def charge(self, reference, status='success'):
+        """Record the buyer completing (or failing) checkout"""
+        with self._lock:
+            self.transactions[reference]['status'] = status
+            self.transactions[reference]['paid_at'] = _timestamp() if status == 'success' else None
+
+    def handle(self, method, path, query, body):
+        """Return (status, payload) for one API call"""
+        with self._lock:
+            self.requests.append((method, path))
+            if self._failures:
+                return self._failures.pop(0), {'status': False, 'message': 'Injected failure'}
+
+        if self.delay:
+            time.sleep(self.delay)
+
+        with self._lock:
+            if method == 'POST' and path == '/transaction/initialize':
+                return self._initialize(body)
+            if method == 'GET' and path == '/transaction':
+                return self._list(parse_qs(query))
+            match = re.fullmatch(r'/transaction/verify/(.+)', path)
+            if method == 'GET' and match:
+                return self._verify(unquote(match.group(1)))
+            if method == 'POST' and path == '/refund':
+                return self._refund(body)
+            if method == 'GET' and path == '/refund':
+                return self._list_refunds(parse_qs(query))
+            if method == 'GET' and path == '/bank':
+                return 200, {'status': True, 'message': 'Banks retrieved', 'data': [dict(bank) for bank in BANKS]}
+            if method == 'POST' and path == '/transferrecipient':
+                return self._create_recipient(body)
+            if method == 'POST' and path == '/transfer/bulk':
+                return self._bulk_transfer(body)
+        return 404, {'status': False, 'message': 'Not found'}
+
+    def _initialize(self, body):
+        reference = body['reference']
+        if reference in self.transactions:
+            return 400, {'status': False, 'message': 'Duplicate Transaction Reference'}
+
+        self.transactions[reference] = {
+            'id': len(self.transactions) + 1,
+            'reference': reference,
+            'amount': body['amount'],
+            'status': 'abandoned',
+            'customer': {'email': body['email']},
+            'metadata': body.get('metadata'),
+            'createdAt': _timestamp(),
+        }
+        return 200, {
+            'status': True,
+            'message': 'Authorization URL created',
+            'data': {
+                'authorization_url': f'{self.url}/checkout/{reference}',
+                'access_code': f'access-{reference}',
+                'reference': reference,
+            },
+        }
+
+    def _list(self, query):
+        # Newest first, filtered on creation time like the real endpoint
+        start = _parse(query.get('from'))
+        end = _parse(query.get('to'))
+        status = (query.get('status') or [None])[0]
+        per_page = int((query.get('perPage') or ['50'])[0])
+        page = int((query.get('page') or ['1'])[0])
+
+        matching = [
+            dict(transaction)
+            for transaction in sorted(self.transactions.values(), key=lambda t: t['id'], reverse=True)
+            if (status is None or transaction['status'] == status)
+            and (start is None or _parse([transaction['createdAt']]) >= start)
+            and (end is None or _parse([transaction['createdAt']]) <= end)
+        ]
+        skipped = (page - 1) * per_page
+        return 200, {
+            'status': True,
+            'message': 'Transactions retrieved',
+            'data': matching[skipped:skipped + per_page],
+            'meta': {
+                'total': len(matching),
+                'skipped': skipped,
+                'perPage': per_page,
+                'page': page,
+                'pageCount': max(1, -(-len(matching) // per_page)),
+            },
+        }
+
+    def _verify(self, reference):
+        transaction = self.transactions.get(reference)
+        if transaction is None:
+            return 400, {'status': False, 'message': 'Transaction reference not found'}
+        return 200, {'status': True, 'message': 'Verification successful', 'data': dict(transaction)}
+
+    def _refund(self, body):
+        transaction = self.transactions.get(body['transaction'])
+        if transaction is None or transaction['status'] != 'success':
+            return 400, {'status': False, 'message': 'Transaction has not been charged'}
+
+        refund = {
+            'id': len(self.refunds) + 1,
+            'transaction': transaction['id'],
+            'amount': body.get('amount', transaction['amount']),
+            'status': 'pending',
+        }
+        self.refunds.append(body)
+        self._refunds.append(refund)
+        return 200, {
+            'status': True,
+            'message': 'Refund has been queued for processing',
+            'data': {'transaction': transaction, 'amount': refund['amount']},
+        }
+
+    def _list_refunds(self, query):
+        transaction = int((query.get('transaction') or ['0'])[0])
+        return 200, {
+            'status': True,
+            'message': 'Refunds retrieved',
+            'data': [dict(refund) for refund in self._refunds if refund['transaction'] == transaction],
+        }
+
+    def _create_recipient(self, body):
+        if body.get('bank_code') not in {bank['code'] for bank in BANKS}:
+            return 400, {'status': False, 'message': 'Unknown bank code'}
+
+        # The same account always maps to the same recipient, as on Paystack.
+        account = (body['account_number'], body['bank_code'])
+        if account not in self.recipients:
+            self.recipients[account] = dict(body, recipient_code=f'RCP_{len(self.recipients) + 1}')
+        return 201, {'status': True, 'message': 'Transfer recipient created', 'data': self.recipients[account]}
+
+    def _bulk_transfer(self, body):
+        # A repeated reference returns the original transfer instead of paying twice.
+        queued = []
+        for transfer in body['transfers']:
+            if transfer['reference'] not in self.transfers:
+                self.transfers[transfer['reference']] = dict(
+                    transfer, transfer_code=f'TRF_{len(self.transfers) + 1}', status='received'
+                )
+            queued.append(self.transfers[transfer['reference']])
+        return 200, {'status': True, 'message': f'{len(queued)} transfers queued.', 'data': queued}
+
+
+def _timestamp(when=None):
+    return (when or datetime.now(timezone.utc)).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def _parse(values):
+    return datetime.fromisoformat(values[0]) if values else None
+
+
+class FakePaystackHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    paystack = None
+
+    def _dispatch(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        url = urlsplit(self.path)
+        status, payload = self.paystack.handle(method, url.path, url.query, body)
+
+        content = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up waiting, e.g. a read timeout under test.
+            self.close_connection = True
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def log_message(self, format, *args):
+        pass
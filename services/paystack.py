@@ -1,63 +1,220 @@
-from paystackapi.paystack import Paystack
-from paystackapi.transaction import Transaction
 from django.conf import settings
 from django.urls import reverse
+from urllib.parse import quote
 import hmac
 import hashlib
 import json
 
+from core.metrics import observe
+from .paystack_client import get_async_client, get_client
+
 class PaystackService:
-    def __init__(self):
-        self.paystack = Paystack(secret_key=settings.PAYSTACK_SECRET_KEY)
+    def __init__(self, client=None, async_client=None):
+        self._client = client
+        self._async_client = async_client
+    
+    @property
+    def client(self):
+        """Injected client, or the shared pooled client for current settings"""
+        return self._client or get_client()
+    
+    @property
+    def async_client(self):
+        """Injected async client, or the shared one for the running event loop"""
+        return self._async_client or get_async_client()
+    
+    def _initialize_data(self, transaction):
+        # Paystack takes whole kobo, which is how amounts are stored
+        return {
+            'email': transaction.buyer_email or 'buyer@example.com',
+            'amount': transaction.price_kobo + transaction.logistics_kobo,
+            'reference': str(transaction.id),  
+            'callback_url': f"{settings.SITE_URL}/paystack/callback/",
+            'metadata': {
+                'transaction_id': str(transaction.id),
+                'product_name': transaction.product_name,
+                'seller_id': transaction.seller_id,
+                'product_price_kobo': transaction.price_kobo,
+                'logistics_fee_kobo': transaction.logistics_kobo,
+            }
+        }
+    
+    def _initialize_result(self, response):
+        if response['status']:
+            return {
+                'success': True,
+                'authorization_url': response['data']['authorization_url'],
+                'access_code': response['data']['access_code'],
+                'reference': response['data']['reference']
+            }
+        else:
+            return {
+                'success': False,
+                'message': response.get('message', 'Payment initialization failed')
+            }
+    
+    def _verify_result(self, response):
+        if response['status'] and response['data']['status'] == 'success':
+            return {
+                'success': True,
+                'data': response['data']
+            }
+        else:
+            return {
+                'success': False,
+                'message': 'Payment verification failed'
+            }
     
     def initialize_payment(self, transaction):
         try:
+            data = self._initialize_data(transaction)
+            with observe('paystack', 'initialize'):
+                response = self.client.post('/transaction/initialize', json=data)
+            return self._initialize_result(response)
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error initializing payment: {str(e)}'
+            }
+    
+    async def ainitialize_payment(self, transaction):
+        """Async variant of initialize_payment for ASGI views"""
+        try:
+            data = self._initialize_data(transaction)
+            with observe('paystack', 'initialize'):
+                response = await self.async_client.post('/transaction/initialize', json=data)
+            return self._initialize_result(response)
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error initializing payment: {str(e)}'
+            }
+    
+    def verify_payment(self, reference):
+        """Verify payment with Paystack"""
+        try:
+            with observe('paystack', 'verify'):
+                response = self.client.get(f'/transaction/verify/{quote(reference)}')
+            return self._verify_result(response)
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error verifying payment: {str(e)}'
+            }
+    
+    async def averify_payment(self, reference):
+        """Async variant of verify_payment for ASGI views"""
+        try:
+            with observe('paystack', 'verify'):
+                response = await self.async_client.get(f'/transaction/verify/{quote(reference)}')
+            return self._verify_result(response)
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error verifying payment: {str(e)}'
+            }
+    
+    def list_transactions(self, start, end, page=1, per_page=100, status='success'):
+        """One page of charges created between start and end, newest first"""
+        try:
+            params = {
+                'from': start.isoformat(), 'to': end.isoformat(),
+                'status': status, 'page': page, 'perPage': per_page,
+            }
+            with observe('paystack', 'list'):
+                response = self.client.get('/transaction', params=params)
             
-            total_amount = float(transaction.product_price) + float(transaction.logistics_fee)
-            # Convert to kobo (multiply by 100)
-            amount_in_kobo = int(total_amount * 100)
+            if response['status']:
+                return {
+                    'success': True,
+                    'data': response['data'],
+                    'meta': response.get('meta') or {}
+                }
+            else:
+                return {
+                    'success': False,
+                    'message': response.get('message', 'Listing transactions failed')
+                }
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error listing transactions: {str(e)}'
+            }
+    
+    def refund_payment(self, reference, amount_in_kobo=None):
+        """Refund a successful charge, in full or for amount_in_kobo"""
+        try:
+            data = {'transaction': reference}
+            if amount_in_kobo is not None:
+                data['amount'] = amount_in_kobo
             
-            data = {
-                'email': transaction.buyer_email or 'buyer@example.com',
-                'amount': amount_in_kobo,
-                'reference': str(transaction.id),  
-                'callback_url': f"{settings.SITE_URL}/paystack/callback/",
-                'metadata': {
-                    'transaction_id': str(transaction.id),
-                    'product_name': transaction.product_name,
-                    'seller_id': transaction.seller.id,
-                    'product_price': float(transaction.product_price),
-                    'logistics_fee': float(transaction.logistics_fee),
+            with observe('paystack', 'refund'):
+                response = self.client.post('/refund', json=data)
+            
+            if response['status']:
+                return {
+                    'success': True,
+                    'data': response['data']
                 }
+            else:
+                return {
+                    'success': False,
+                    'message': response.get('message', 'Refund failed')
+                }
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error refunding payment: {str(e)}'
             }
+    
+    def find_refunds(self, reference):
+        """Refunds already made against a charge.
+        
+        Paystack lists refunds by transaction id, so the reference is
+        verified first to look the id up.
+        """
+        try:
+            with observe('paystack', 'verify'):
+                charge = self.client.get(f'/transaction/verify/{quote(reference)}')
+            if not charge['status']:
+                return {
+                    'success': False,
+                    'message': charge.get('message', 'Verification failed')
+                }
             
-            response = Transaction.initialize(**data)
+            with observe('paystack', 'list_refunds'):
+                response = self.client.get('/refund', params={'transaction': charge['data']['id']})
             
             if response['status']:
                 return {
                     'success': True,
-                    'authorization_url': response['data']['authorization_url'],
-                    'access_code': response['data']['access_code'],
-                    'reference': response['data']['reference']
+                    'data': response['data']
                 }
             else:
                 return {
                     'success': False,
-                    'message': response.get('message', 'Payment initialization failed')
+                    'message': response.get('message', 'Listing refunds failed')
                 }
                 
         except Exception as e:
             return {
                 'success': False,
-                'message': f'Error initializing payment: {str(e)}'
+                'message': f'Error listing refunds: {str(e)}'
             }
     
-    def verify_payment(self, reference):
-        """Verify payment with Paystack"""
+    def list_banks(self):
+        """Nigerian banks Paystack can transfer to, with their bank codes"""
         try:
-            response = Transaction.verify(reference=reference)
+            with observe('paystack', 'list_banks'):
+                response = self.client.get('/bank', params={'country': 'nigeria', 'perPage': 100})
             
-            if response['status'] and response['data']['status'] == 'success':
+            if response['status']:
                 return {
                     'success': True,
                     'data': response['data']
@@ -65,23 +222,91 @@ class PaystackService:
             else:
                 return {
                     'success': False,
-                    'message': 'Payment verification failed'
+                    'message': response.get('message', 'Listing banks failed')
                 }
                 
         except Exception as e:
             return {
                 'success': False,
-                'message': f'Error verifying payment: {str(e)}'
+                'message': f'Error listing banks: {str(e)}'
+            }
+    
+    def create_transfer_recipient(self, name, account_number, bank_code):
+        """Register a bank account as a transfer recipient.
+        
+        Paystack returns the existing recipient for an account it already
+        knows, so the call is safe to retry.
+        """
+        try:
+            data = {
+                'type': 'nuban', 'name': name, 'account_number': account_number,
+                'bank_code': bank_code, 'currency': 'NGN',
+            }
+            with observe('paystack', 'create_recipient'):
+                response = self.client.post('/transferrecipient', json=data, idempotent=True)
+            
+            if response['status']:
+                return {
+                    'success': True,
+                    'data': response['data']
+                }
+            else:
+                return {
+                    'success': False,
+                    'message': response.get('message', 'Creating transfer recipient failed')
+                }
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error creating transfer recipient: {str(e)}'
             }
     
+    def bulk_transfer(self, transfers):
+        """Queue transfers to recipients in one call.
+        
+        Each transfer carries a unique reference, so Paystack will not pay
+        the same reference twice and the call is safe to retry.
+        """
+        try:
+            data = {'currency': 'NGN', 'source': 'balance', 'transfers': transfers}
+            with observe('paystack', 'bulk_transfer'):
+                response = self.client.post('/transfer/bulk', json=data, idempotent=True)
+            
+            if response['status']:
+                return {
+                    'success': True,
+                    'data': response['data']
+                }
+            else:
+                return {
+                    'success': False,
+                    'message': response.get('message', 'Bulk transfer failed')
+                }
+                
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Error submitting transfers: {str(e)}'
+            }
+    
+    @staticmethod
+    def webhook_secret():
+        return settings.PAYSTACK_WEBHOOK_SECRET or settings.PAYSTACK_SECRET_KEY
+    
     def verify_webhook_signature(self, payload, signature):
-        if not settings.PAYSTACK_WEBHOOK_SECRET:
-            return True 
+        """Check the x-paystack-signature header (HMAC-SHA512 of the raw body).
+        
+        Fails closed: without a configured secret nothing verifies.
+        """
+        secret = self.webhook_secret()
+        if not secret:
+            return False
             
         expected_signature = hmac.new(
-            settings.PAYSTACK_WEBHOOK_SECRET.encode('utf-8'),
+            secret.encode('utf-8'),
             payload,
             hashlib.sha512
         ).hexdigest()
         
-        return hmac.compare_digest(expected_signature, signature)
\ No newline at end of file
+        return hmac.compare_digest(expected_signature, signature or '')
\ No newline at end of file
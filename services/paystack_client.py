@@ -0,0 +1,260 @@
+import asyncio
+from contextlib import contextmanager
+import random
+import threading
+import time
+import weakref
+
+from django.conf import settings
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PaystackError(Exception):
+    """Paystack could not be reached or kept failing"""
+
+
+class CircuitOpenError(PaystackError):
+    """Paystack has been failing; calls are short-circuited until reset"""
+
+
+class CircuitBreaker:
+    """Fail fast after `threshold` consecutive failures.
+
+    While open, calls raise CircuitOpenError without touching the network.
+    After `reset_timeout` seconds one trial call is let through; success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if self._trial_running or self.clock() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError('Paystack circuit is open')
+            self._trial_running = True
+
+    @contextmanager
+    def attempt(self):
+        """Admit one call, settling the breaker if an exception escapes it.
+
+        The caller records success or failure for the outcomes it handles.
+        Any other error counts as a failure; cancellation or an interrupt
+        just gives up a half-open trial, since Paystack did nothing wrong.
+        """
+        self.before_call()
+        try:
+            yield
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            self.release_trial()
+            raise
+
+    def release_trial(self):
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+            self._trial_running = False
+
+
+class BasePaystackClient:
+    """Settings and retry policy shared by the sync and async clients.
+
+    Every call has connect/read timeouts. Idempotent calls are retried with
+    exponential backoff and full jitter on connection errors, timeouts, 429
+    and 5xx responses. Responses are returned as decoded JSON; 4xx bodies
+    are returned as-is since Paystack explains the error in them.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, secret_key, base_url='https://api.paystack.co', connect_timeout=3.05,
+                 read_timeout=10, max_retries=2, backoff=0.25, pool_size=20, breaker=None):
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+        self.headers = {
+            'Authorization': f'Bearer {secret_key}',
+            'Content-Type': 'application/json',
+        }
+
+    def _attempts(self, idempotent):
+        return self.max_retries + 1 if idempotent else 1
+
+    def _retry_delay(self, attempt):
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+
+class PaystackClient(BasePaystackClient):
+    """Paystack API client over a pooled, keep-alive requests.Session"""
+
+    def __init__(self, secret_key, **kwargs):
+        super().__init__(secret_key, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(self.headers)
+
+    def get(self, path, params=None):
+        return self.request('GET', path, params=params, idempotent=True)
+
+    def post(self, path, json=None, idempotent=False):
+        return self.request('POST', path, json=json, idempotent=idempotent)
+
+    def request(self, method, path, params=None, json=None, idempotent=False):
+        attempts = self._attempts(idempotent)
+
+        for attempt in range(attempts):
+            with self.breaker.attempt():
+                try:
+                    response = self.session.request(
+                        method, f'{self.base_url}{path}', params=params, json=json,
+                        timeout=(self.connect_timeout, self.read_timeout),
+                    )
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = PaystackError(f'{method} {path} failed: {e}')
+                else:
+                    if response.status_code not in self.RETRY_STATUSES:
+                        data = response.json()
+                        self.breaker.record_success()
+                        return data
+                    error = PaystackError(f'{method} {path} returned HTTP {response.status_code}')
+
+                self.breaker.record_failure()
+            if attempt + 1 < attempts:
+                time.sleep(self._retry_delay(attempt))
+
+        raise error
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncPaystackClient(BasePaystackClient):
+    """Paystack API client over a pooled httpx.AsyncClient, for ASGI views.
+
+    Thousands of calls can be in flight on one event loop; pool_size caps
+    the number of open connections to Paystack.
+    """
+
+    def __init__(self, secret_key, **kwargs):
+        super().__init__(secret_key, **kwargs)
+        self.session = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=self.headers,
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+        )
+
+    async def get(self, path, params=None):
+        return await self.request('GET', path, params=params, idempotent=True)
+
+    async def post(self, path, json=None, idempotent=False):
+        return await self.request('POST', path, json=json, idempotent=idempotent)
+
+    async def request(self, method, path, params=None, json=None, idempotent=False):
+        attempts = self._attempts(idempotent)
+
+        for attempt in range(attempts):
+            # A buyer disconnecting mid-call cancels the task; attempt() then
+            # releases a half-open trial instead of leaving it claimed.
+            with self.breaker.attempt():
+                try:
+                    response = await self.session.request(method, path, params=params, json=json)
+                except httpx.TransportError as e:
+                    error = PaystackError(f'{method} {path} failed: {e!r}')
+                else:
+                    if response.status_code not in self.RETRY_STATUSES:
+                        data = response.json()
+                        self.breaker.record_success()
+                        return data
+                    error = PaystackError(f'{method} {path} returned HTTP {response.status_code}')
+
+                self.breaker.record_failure()
+            if attempt + 1 < attempts:
+                await asyncio.sleep(self._retry_delay(attempt))
+
+        raise error
+
+    async def aclose(self):
+        await self.session.aclose()
+
+
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def _client_options():
+    return (
+        settings.PAYSTACK_SECRET_KEY,
+        settings.PAYSTACK_BASE_URL,
+        settings.PAYSTACK_CONNECT_TIMEOUT,
+        settings.PAYSTACK_READ_TIMEOUT,
+        settings.PAYSTACK_MAX_RETRIES,
+    )
+
+
+def _make_client(client_class, options):
+    secret_key, base_url, connect_timeout, read_timeout, max_retries = options
+    return client_class(
+        secret_key,
+        base_url=base_url,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        max_retries=max_retries,
+        breaker=CircuitBreaker(
+            threshold=settings.PAYSTACK_BREAKER_THRESHOLD,
+            reset_timeout=settings.PAYSTACK_BREAKER_RESET_TIMEOUT,
+        ),
+    )
+
+
+def get_client():
+    """Process-wide client for the current settings, so connections are reused"""
+    options = _client_options()
+    with _clients_lock:
+        if options not in _clients:
+            _clients[options] = _make_client(PaystackClient, options)
+        return _clients[options]
+
+
+def get_async_client():
+    """Async client for the current settings, shared per running event loop"""
+    options = _client_options()
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    if options not in clients:
+        clients[options] = _make_client(AsyncPaystackClient, options)
+    return clients[options]